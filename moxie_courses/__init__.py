@@ -4,7 +4,7 @@ from flask.helpers import make_response
 from moxie import oauth
 from moxie.core.representations import HALRepresentation
 from .views import (Bookings, ListAllSubjects, SearchCourses, CourseDetails,
-        PresentationBooking)
+        PresentationBooking, export_catalog)
 
 CURIE_ENDPOINT = "http://moxie-courses.readthedocs.org/en/latest/http_api/courses.html#{rel}"
 
@@ -24,6 +24,7 @@ def create_blueprint(blueprint_name, conf):
             view_func=CourseDetails.as_view('course'))
     courses_blueprint.add_url_rule('/presentation/<path:id>/booking',
             view_func=PresentationBooking.as_view('presentation_booking'))
+    courses_blueprint.add_url_rule('/export', view_func=export_catalog)
     oauth.attach_oauth(courses_blueprint)
 
     return courses_blueprint
@@ -40,6 +41,7 @@ def get_routes():
                             templated=True, title='Search')
     representation.add_link('hl:course', '{bp}course/{{id}}'.format(bp=path),
                             templated=True, title='Course details')
+    representation.add_link('hl:export', '{bp}export'.format(bp=path), title="Export")
     response = make_response(representation.as_json(), 200)
     response.headers['Content-Type'] = "application/json"
     return response
@@ -0,0 +1,3 @@
+"""Benchmarks, not part of the test suite. Each module can be run
+with e.g. python -m moxie_courses.benchmarks.parsers
+"""
@@ -0,0 +1,132 @@
+"""Generate synthetic XCRI-CAP (oxcap) catalogs of any size, with all the
+elements captured by the importer (see PARSE_STRUCTURE)
+"""
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+HEADER = """<?xml version="1.0" encoding="utf-8"?>
+<xcri:catalog xmlns:xcri="http://xcri.org/profiles/1.2/catalog" xmlns:oxcap="http://purl.ox.ac.uk/oxcap/ns/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:mlo="http://purl.org/net/mlo" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" generated="2012-11-14T10:23:08+00:00">
+    <dc:identifier>https://data.ox.ac.uk/id/courses/synthetic-catalogue</dc:identifier>
+    <dc:title>Synthetic course catalogue</dc:title>
+"""
+
+FOOTER = """</xcri:catalog>
+"""
+
+PROVIDER = """    <xcri:provider>
+        <dc:identifier xmlns:ns="https://data.ox.ac.uk/id/notation/" xsi:type="ns:division">{code}</dc:identifier>
+        <dc:identifier>http://oxpoints.oucs.ox.ac.uk/id/{code}</dc:identifier>
+        <dc:title>{title}</dc:title>
+        <mlo:url>http://www.example.org/{code}/</mlo:url>
+"""
+
+COURSE = """        <xcri:course oxcap:visibility="PB">
+            <dc:identifier xmlns:ns="https://data.ox.ac.uk/id/notation/" xsi:type="ns:daisy-course">{code}</dc:identifier>
+            <dc:identifier>https://course.data.ox.ac.uk/id/synthetic/course/{id}</dc:identifier>
+            <dc:identifier>{id}</dc:identifier>
+            <dc:title>{title}</dc:title>
+            <dc:description>{description}</dc:description>
+{subjects}"""
+
+SUBJECT = """            <dc:subject>{subject}</dc:subject>
+"""
+
+PRESENTATION = """            <xcri:presentation oxcap:status="AC">
+                <dc:identifier xmlns:ns="https://data.ox.ac.uk/id/notation/" xsi:type="ns:daisy-presentation">{id}</dc:identifier>
+                <dc:identifier>https://course.data.ox.ac.uk/id/synthetic/presentation/{id}</dc:identifier>
+                <dc:title>{title}</dc:title>
+                <mlo:start dtf="{start}">{start}</mlo:start>
+                <xcri:end dtf="{end}">{end}</xcri:end>
+                <xcri:applyFrom dtf="{apply_from}">{apply_from}</xcri:applyFrom>
+                <xcri:applyUntil dtf="{apply_until}">{apply_until}</xcri:applyUntil>
+                <mlo:places>{places}</mlo:places>
+                <xcri:attendanceMode identifier="CM">Campus</xcri:attendanceMode>
+                <xcri:attendancePattern identifier="DT">Daytime</xcri:attendancePattern>
+                <xcri:studyMode identifier="PT">Part Time</xcri:studyMode>
+                <oxcap:bookingEndpoint>https://weblearn.ox.ac.uk/course-signup/rest/course/{code}</oxcap:bookingEndpoint>
+                <xcri:venue>
+                    <xcri:provider>
+                        <dc:identifier xmlns:ns="https://data.ox.ac.uk/id/notation/" xsi:type="ns:oxpoints">{venue}</dc:identifier>
+                        <dc:identifier>http://oxpoints.oucs.ox.ac.uk/id/{venue}</dc:identifier>
+                        <dc:title>Venue {venue}</dc:title>
+                    </xcri:provider>
+                </xcri:venue>
+                <oxcap:memberApplyTo>http://courses.example.org/detail/{code}</oxcap:memberApplyTo>
+            </xcri:presentation>
+"""
+
+SUBJECTS = ['Graduate Training', 'Career Development', 'Communication skills',
+            'Research Methods', 'Technical skills', 'Teaching and Academic Skills',
+            'Qualitative', 'Quantitative', 'Languages', 'Digital Humanities']
+
+WORDS = ('research workshop introduction advanced students staff methods data '
+         'analysis humanities sciences writing publishing digital tools session '
+         'practical seminar skills career academic').split()
+
+
+def generate_catalog(f, presentations, providers=10, presentations_per_course=3,
+                     seed=0):
+    """Write a catalog to a file
+    :param f: file-like object
+    :param presentations: number of presentations
+    :param providers: (optional) number of providers
+    :param presentations_per_course: (optional) number of presentations of each course
+    :param seed: (optional) seed of the random generator, same seed gives the same catalog
+    """
+    rand = random.Random(seed)
+    first_day = date(2012, 1, 1)
+    courses = max(presentations // presentations_per_course, 1)
+    presentation_id = 0
+    f.write(HEADER)
+    for course_id in range(courses):
+        provider = course_id * providers // courses
+        if course_id == 0 or provider != (course_id - 1) * providers // courses:
+            if course_id:
+                f.write("    </xcri:provider>\n")
+            f.write(PROVIDER.format(code='P{0}'.format(provider),
+                                    title='Division {0}'.format(provider)))
+        code = 'C{0:08d}'.format(course_id)
+        title = ' '.join(rand.choice(WORDS) for i in range(4)).capitalize()
+        subjects = ''.join(SUBJECT.format(subject=subject)
+                           for subject in rand.sample(SUBJECTS, rand.randint(0, 3)))
+        f.write(COURSE.format(code=code, id=course_id, title=escape(title),
+                              description=escape(' '.join(rand.choice(WORDS) for i in range(60))),
+                              subjects=subjects))
+        # last course gets the remaining presentations
+        count = presentations_per_course
+        if course_id == courses - 1:
+            count = presentations - presentation_id
+        for i in range(count):
+            start = first_day + timedelta(days=rand.randint(0, 1500))
+            f.write(PRESENTATION.format(
+                id=presentation_id, code=code, title=escape(title),
+                start=start.isoformat(),
+                end=(start + timedelta(days=rand.randint(0, 5))).isoformat(),
+                apply_from=(start - timedelta(days=60)).isoformat(),
+                apply_until=(start - timedelta(days=rand.randint(1, 14))).isoformat(),
+                places=rand.randint(5, 50),
+                venue=rand.randint(1, 500)))
+            presentation_id += 1
+        f.write("        </xcri:course>\n")
+    f.write("    </xcri:provider>\n")
+    f.write(FOOTER)
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('presentations', type=int)
+    args.add_argument('--providers', type=int, default=10)
+    args.add_argument('--presentations-per-course', type=int, default=3)
+    args.add_argument('--seed', type=int, default=0)
+    args.add_argument('--output', type=argparse.FileType('w'), default=sys.stdout)
+    ns = args.parse_args()
+    generate_catalog(ns.output, ns.presentations, providers=ns.providers,
+                     presentations_per_course=ns.presentations_per_course,
+                     seed=ns.seed)
+
+
+if __name__ == '__main__':
+    main()
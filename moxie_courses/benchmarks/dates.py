@@ -0,0 +1,51 @@
+"""Compare conversion of dates by dateutil/strptime with moxie_courses.dates
+in both directions (XCRI to Solr, Solr to datetime)
+"""
+import argparse
+import random
+import timeit
+from datetime import date, datetime, timedelta
+
+from dateutil import parser
+
+from moxie_courses import dates
+
+
+def sample(size, distinct):
+    """List of dates as found in XCRI feeds, with repetitions
+    :param size: number of dates
+    :param distinct: number of distinct dates
+    """
+    first = date(2012, 1, 1)
+    values = [(first + timedelta(days=i)).isoformat() for i in range(distinct)]
+    return [random.choice(values) for i in range(size)]
+
+
+def run(name, func, values, rounds):
+    best = min(timeit.repeat(lambda: [func(v) for v in values], number=1, repeat=rounds))
+    print("{0:<40} {1:>10.2f}".format(name, best / len(values) * 1000000))
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--size', type=int, default=20000)
+    args.add_argument('--distinct', type=int, default=500)
+    args.add_argument('--rounds', type=int, default=5)
+    ns = args.parse_args()
+
+    xcri_dates = sample(ns.size, ns.distinct)
+    solr_dates = [dates.xcri_to_solr(v) for v in xcri_dates]
+
+    print("{0:<40} {1:>10}".format('conversion', 'us/date'))
+    run('xcri -> solr: dateutil', lambda v: parser.parse(v).strftime(dates.SOLR_DATE_FORMAT),
+        xcri_dates, ns.rounds)
+    run('xcri -> solr: fast path (no cache)', dates.xcri_to_solr.__wrapped__, xcri_dates, ns.rounds)
+    run('xcri -> solr: memoized', dates.xcri_to_solr, xcri_dates, ns.rounds)
+    run('solr -> datetime: strptime', lambda v: datetime.strptime(v, dates.SOLR_DATE_FORMAT),
+        solr_dates, ns.rounds)
+    run('solr -> datetime: fast path (no cache)', dates.solr_to_datetime.__wrapped__, solr_dates, ns.rounds)
+    run('solr -> datetime: memoized', dates.solr_to_datetime, solr_dates, ns.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure responses per second when serialising a page of search results
+(35 courses by default) to HAL+JSON with representation objects
+(HALCourseRepresentation for each course, url_for for each link) and with
+the single-pass serializer (HALCoursesSerializer), and check that both
+produce the same bytes.
+"""
+import argparse
+import json
+import timeit
+from itertools import groupby
+from operator import itemgetter
+
+from flask import Blueprint, Flask
+
+from moxie_courses import create_blueprint, solr
+from moxie_courses.benchmarks.mapper import solr_documents
+from moxie_courses.representations import (HALCoursesSerializer, HALCourseRepresentation,
+                                           HALRepresentation)
+from moxie_courses.providers.weblearn import WebLearnProvider
+from moxie_courses.services import CourseService
+
+
+def create_app():
+    """Flask application with the courses blueprint and a places blueprint
+    (used for links to venues), the course service uses the WebLearn provider
+    """
+    app = Flask(__name__)
+    app.register_blueprint(create_blueprint('courses', {}), url_prefix='/courses')
+    places = Blueprint('places', __name__)
+    places.add_url_rule('/<path:ident>', 'poidetail', lambda ident: ident)
+    app.register_blueprint(places, url_prefix='/places')
+    service = CourseService()
+    service.providers = [WebLearnProvider('https://weblearn.ox.ac.uk/course-signup/')]
+    service._build_routes()
+    return app, service
+
+
+def page_courses(size, presentations_per_course=3):
+    """Courses of a page of search results, with their presentations
+    :param size: number of courses
+    :return list of LazyCourse
+    """
+    documents = solr_documents(size * presentations_per_course)
+    return [solr.presentations_to_lazy_course(list(presentations))
+            for course, presentations
+            in groupby(documents, itemgetter('course_identifier'))][:size]
+
+
+def objects_page(courses, bookable):
+    """Courses serialised with representation objects"""
+    return [HALCourseRepresentation(course, '.course', bookable).as_dict() for course in courses]
+
+
+def serializer_page(courses, bookable):
+    """Courses serialised in one pass"""
+    serializer = HALCoursesSerializer('.course')
+    return [serializer.course(course, bookable) for course in courses]
+
+
+def response(courses, service, page):
+    """Body of the response, as in HALCoursesRepresentation"""
+    bookable = service.bookable(p for course in courses for p in course.presentations)
+    representation = HALRepresentation({'query': 'history'})
+    representation.add_embed('courses', page(courses, bookable))
+    return json.dumps(representation.as_dict())
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--courses', type=int, default=35)
+    args.add_argument('--presentations', type=int, default=3,
+                      help="Number of presentations per course")
+    args.add_argument('--rounds', type=int, default=20)
+    ns = args.parse_args()
+
+    app, service = create_app()
+    courses = page_courses(ns.courses, ns.presentations)
+    with app.test_request_context('/courses/search?q=history'):
+        objects = response(courses, service, objects_page)
+        single_pass = response(courses, service, serializer_page)
+        print("{0} courses, {1} presentations, identical output: {2}".format(
+            len(courses), sum(len(c.presentations) for c in courses), objects == single_pass))
+        print("{0:<24} {1:>12}".format('serializer', 'responses/s'))
+        for name, page in [('representation objects', objects_page),
+                           ('single pass', serializer_page)]:
+            best = min(timeit.repeat(lambda: response(courses, service, page),
+                                     number=10, repeat=ns.rounds)) / 10
+            print("{0:<24} {1:>12.0f}".format(name, 1 / best))
+
+
+if __name__ == '__main__':
+    main()
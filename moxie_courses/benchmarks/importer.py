@@ -0,0 +1,99 @@
+"""Benchmark the XCRI import (parse, transform, index into a mock search
+service) on synthetic catalogs of increasing size. Results are printed
+and can be written as JSON to compare releases.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+from moxie_courses.benchmarks.catalog import generate_catalog
+from moxie_courses.importers.xcri_ox import HANDLERS, XcriOxImporter
+
+
+class MockSearchService(object):
+    """Search service serializing documents like a Solr client would,
+    without sending them anywhere
+    """
+
+    def index(self, documents, params=None):
+        json.dumps(documents)
+
+    def commit(self):
+        pass
+
+
+def measure(path, parser, queue):
+    """Import a catalog in its own process so that peak memory can be measured
+    """
+    indexer = MockSearchService()
+    with open(path) as f:
+        metrics = XcriOxImporter(indexer, f, handler=HANDLERS[parser]).run()
+    stages = metrics.stages
+    queue.put({'wall': metrics.wall, 'cpu': metrics.cpu,
+               'parse': stages['parse'].wall,
+               'transform': stages['transform'].wall,
+               'index': stages['index'].wall,
+               'indexed': metrics.counts['indexed'],
+               'peak_rss_kb': metrics.peak_rss_kb})
+
+
+def run(path, parser):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(path, parser, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--sizes', default='1000,10000,100000',
+                      help="Number of presentations, comma separated")
+    args.add_argument('--parsers', default=','.join(sorted(HANDLERS)))
+    args.add_argument('--output', help="Write the report as JSON to this file")
+    ns = args.parse_args()
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': []}
+    tmp_dir = tempfile.mkdtemp()
+    print("{0:>8} {1:<10} {2:>14} {3:>14} {4:>14} {5:>14} {6:>10}".format(
+        'size', 'parser', 'parse docs/s', 'transform/s', 'index/s', 'total/s', 'RSS (MB)'))
+    try:
+        for size in [int(s) for s in ns.sizes.split(',')]:
+            path = os.path.join(tmp_dir, 'catalog-{0}.xml'.format(size))
+            with open(path, 'w') as f:
+                generate_catalog(f, size)
+            for parser in ns.parsers.split(','):
+                result = run(path, parser)
+                result.update({
+                    'presentations': size,
+                    'parser': parser,
+                    'catalog_bytes': os.path.getsize(path),
+                    'parse_docs_per_s': size / result['parse'],
+                    'transform_docs_per_s': size / result['transform'],
+                    'index_docs_per_s': size / result['index'],
+                    'total_docs_per_s': size / result['wall'],
+                })
+                report['results'].append(result)
+                print("{0:>8} {1:<10} {2:>14.0f} {3:>14.0f} {4:>14.0f} {5:>14.0f} {6:>10.1f}".format(
+                    size, parser, result['parse_docs_per_s'], result['transform_docs_per_s'],
+                    result['index_docs_per_s'], result['total_docs_per_s'],
+                    result['peak_rss_kb'] / 1024.0))
+            os.remove(path)
+    finally:
+        shutil.rmtree(tmp_dir)
+    if ns.output:
+        with open(ns.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
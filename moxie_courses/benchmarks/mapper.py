@@ -0,0 +1,65 @@
+"""Measure the cost per document of mapping Solr responses of 1,000
+documents to domain objects, as done when searching (one presentation
+per course), showing a course (all its presentations) and booking
+(one presentation at a time), and of mapping then serialising search
+results with eager and lazy objects
+"""
+import argparse
+import timeit
+from StringIO import StringIO
+
+from moxie_courses import solr
+from moxie_courses.benchmarks.catalog import generate_catalog
+from moxie_courses.domain import Course, Presentation
+from moxie_courses.importers.xcri_ox import XcriOxImporter
+from moxie_courses.representations import CourseRepresentation
+
+
+def solr_documents(size):
+    """Documents as returned by Solr for a synthetic catalog
+    :param size: number of documents
+    :return list of dicts
+    """
+    catalog = StringIO()
+    generate_catalog(catalog, size)
+    catalog.seek(0)
+    importer = XcriOxImporter(None, catalog)
+    return [dict(document) for document in importer.transform(importer.parse())]
+
+
+def run(name, func, documents, rounds):
+    best = min(timeit.repeat(lambda: func(documents), number=1, repeat=rounds))
+    print("{0:<40} {1:>10.2f}".format(name, best / len(documents) * 1000000))
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--size', type=int, default=1000)
+    args.add_argument('--rounds', type=int, default=20)
+    ns = args.parse_args()
+
+    documents = solr_documents(ns.size)
+    # one course with all the presentations
+    course_documents = [dict(document, course_identifier='C') for document in documents]
+
+    print("{0:<40} {1:>10}".format('mapping', 'us/doc'))
+    run('objects only (no fields decoded)',
+        lambda docs: [Presentation(doc['presentation_identifier'], Course(doc['course_identifier']))
+                      for doc in docs], documents, ns.rounds)
+    run('search (course per document)',
+        lambda docs: [solr.presentations_to_course_object([doc]) for doc in docs],
+        documents, ns.rounds)
+    run('course details (one course)', solr.presentations_to_course_object,
+        course_documents, ns.rounds)
+    run('booking (presentation per document)',
+        lambda docs: [solr.presentation_to_presentation_object(doc) for doc in docs],
+        documents, ns.rounds)
+    for name, mapper in [('eager', solr.presentations_to_course_object),
+                         ('lazy', solr.presentations_to_lazy_course)]:
+        run('search + representation ({0})'.format(name),
+            lambda docs: [CourseRepresentation(mapper([doc])).as_dict() for doc in docs],
+            documents, ns.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure the memory used per presentation when the whole catalog is
+loaded in-process as domain objects (Course/Presentation), on top of the
+documents returned by Solr. Each size is measured in its own process.
+Resident memory is read from /proc (Linux).
+"""
+import argparse
+import gc
+import multiprocessing
+import resource
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+from moxie_courses import solr
+from moxie_courses.benchmarks.mapper import solr_documents
+
+
+def rss_bytes():
+    """Current resident memory of the process"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def object_size(obj):
+    """Size of an object and of its __dict__ if it has one, in bytes"""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def measure(size, queue):
+    documents = solr_documents(size)
+    gc.collect()
+    before = rss_bytes()
+    courses = [solr.presentations_to_course_object(list(presentations))
+               for course, presentations in groupby(documents, itemgetter('course_identifier'))]
+    gc.collect()
+    after = rss_bytes()
+    presentation = courses[0].presentations[0]
+    queue.put({'courses': len(courses),
+               'rss_bytes_per_presentation': float(after - before) / size,
+               'presentation_bytes': object_size(presentation),
+               'course_bytes': object_size(courses[0])})
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--sizes', default='10000,100000',
+                      help="Number of presentations, comma separated")
+    ns = args.parse_args()
+
+    print("{0:>8} {1:>8} {2:>18} {3:>14} {4:>10}".format(
+        'size', 'courses', 'RSS B/presentation', 'Presentation B', 'Course B'))
+    for size in [int(s) for s in ns.sizes.split(',')]:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=measure, args=(size, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print("{0:>8} {1:>8} {2:>18.0f} {3:>14} {4:>10}".format(
+            size, result['courses'], result['rss_bytes_per_presentation'],
+            result['presentation_bytes'], result['course_bytes']))
+
+
+if __name__ == '__main__':
+    main()
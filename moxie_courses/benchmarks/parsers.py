@@ -0,0 +1,63 @@
+"""Compare the SAX and iterparse XCRI parsers on the same catalog
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from moxie_courses.benchmarks.catalog import generate_catalog
+from moxie_courses.importers.xcri_ox import HANDLERS
+
+def parse(name, path, queue):
+    """Parse a catalog with the given handler, in its own process
+    so that peak memory can be measured
+    """
+    handler = HANDLERS[name]()
+    with open(path) as f:
+        start_wall, start_cpu = time.time(), time.clock()
+        count = 0
+        for presentation in handler.iter_presentations(f):
+            count += 1
+        wall, cpu = time.time() - start_wall, time.clock() - start_cpu
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((count, wall, cpu, max_rss))
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('xcri_file', nargs='?',
+                      help="XCRI catalog, defaults to a synthetic catalog")
+    args.add_argument('--presentations', type=int, default=10000,
+                      help="Number of presentations of the synthetic catalog")
+    args.add_argument('--rounds', type=int, default=3)
+    ns = args.parse_args()
+
+    path = ns.xcri_file
+    if not path:
+        fd, path = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        with open(path, 'w') as f:
+            generate_catalog(f, ns.presentations)
+    print("Catalog: {path} ({size:.1f} MB)".format(path=path,
+        size=os.path.getsize(path) / 1024.0 / 1024.0))
+    print("{0:<10} {1:>13} {2:>9} {3:>9} {4:>13} {5:>13}".format(
+        'parser', 'presentations', 'wall (s)', 'cpu (s)', 'docs/s', 'peak RSS (MB)'))
+    try:
+        for name in sorted(HANDLERS):
+            for i in range(ns.rounds):
+                queue = multiprocessing.Queue()
+                process = multiprocessing.Process(target=parse, args=(name, path, queue))
+                process.start()
+                count, wall, cpu, max_rss = queue.get()
+                process.join()
+                print("{0:<10} {1:>13} {2:>9.3f} {3:>9.3f} {4:>13.0f} {5:>13.1f}".format(
+                    name, count, wall, cpu, count / wall, max_rss / 1024.0))
+    finally:
+        if not ns.xcri_file:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
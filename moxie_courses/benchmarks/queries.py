@@ -0,0 +1,185 @@
+"""Replay a log of queries (searches, listings of subjects and of courses)
+against a stand-in of Solr's caches and show their hit rates, with the
+restriction to future presentations in `q` (as before) and in a filter
+query with NOW rounded to different units. The stand-in models the
+filterCache (one entry per fq) and the queryResultCache (one entry per q,
+fq and sort), both LRU, after resolving NOW at the time of each query.
+
+A log can be given as a file of tab-separated lines: ISO 8601 time, kind
+of query (search, subjects or course) and its argument (text or course
+identifier). A synthetic log is generated otherwise.
+"""
+import argparse
+import random
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from moxie_courses.queries import (search_courses_query, subjects_query,
+                                   course_presentations_query)
+
+NOW = re.compile(r'NOW(?:/(SECOND|MINUTE|HOUR|DAY))?')
+ROUNDING = {
+    None: {},
+    'SECOND': {'microsecond': 0},
+    'MINUTE': {'second': 0, 'microsecond': 0},
+    'HOUR': {'minute': 0, 'second': 0, 'microsecond': 0},
+    'DAY': {'hour': 0, 'minute': 0, 'second': 0, 'microsecond': 0},
+}
+
+
+class LRUCache(object):
+    """Keys of an LRU cache, counting hits"""
+
+    def __init__(self, size):
+        self.size = size
+        self.keys = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def lookup(self, key):
+        """Look a key up, adding it if it is missing"""
+        self.lookups += 1
+        if key in self.keys:
+            self.hits += 1
+            del self.keys[key]
+        elif len(self.keys) >= self.size:
+            self.keys.popitem(last=False)
+        self.keys[key] = True
+
+    @property
+    def hit_rate(self):
+        return float(self.hits) / self.lookups if self.lookups else 0.0
+
+
+class SolrStandIn(object):
+    """Caches of Solr, see the module documentation"""
+
+    def __init__(self, filter_cache_size=512, result_cache_size=512):
+        self.filter_cache = LRUCache(filter_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self.filters = set()
+
+    def search(self, query, now):
+        """Run a query
+        :param query: parameters of the query
+        :param now: time of the query (datetime)
+        """
+        filters = query.get('fq', [])
+        if not isinstance(filters, list):
+            filters = [filters]
+        filters = tuple(sorted(resolve(fq, now) for fq in filters))
+        for fq in filters:
+            self.filter_cache.lookup(fq)
+            self.filters.add(fq)
+        self.result_cache.lookup((resolve(query['q'], now), filters, query.get('sort')))
+
+
+def resolve(expression, now):
+    """Replace NOW (possibly rounded) by the time it stands for"""
+    return NOW.sub(lambda m: now.replace(**ROUNDING[m.group(1)]).isoformat(), expression)
+
+
+def legacy_query(kind, argument):
+    """Queries as built before filter queries: restriction in `q`"""
+    if kind == 'search':
+        return {'q': argument + ' AND NOT presentation_start:[* TO NOW]'}
+    elif kind == 'subjects':
+        return {'q': 'NOT presentation_start:[* TO NOW]'}
+    return {'q': '*:*', 'fq': 'course_identifier:{0}'.format(argument),
+            'sort': 'presentation_start asc'}
+
+
+def rounded_query(rounding):
+    """Queries as built by moxie_courses.queries"""
+    def query(kind, argument):
+        if kind == 'search':
+            return search_courses_query(argument, rounding=rounding)
+        elif kind == 'subjects':
+            return subjects_query(rounding=rounding)
+        return course_presentations_query(argument)
+    return query
+
+
+def zipf_sampler(items):
+    """Function picking an item, items being weighted by 1/rank"""
+    cumulative = []
+    total = 0.0
+    for rank in range(1, len(items) + 1):
+        total += 1.0 / rank
+        cumulative.append(total)
+    return lambda: items[bisect_left(cumulative, random.random() * total)]
+
+
+def synthetic_log(size, hours=24, terms=500, courses=2000, seed=1):
+    """Queries spread over some hours: 70% searches, 20% listings of
+    subjects, 10% listings of courses, search terms and courses being
+    picked following Zipf's law
+    :return list of (time, kind, argument) sorted by time
+    """
+    random.seed(seed)
+    start = datetime(2013, 1, 14, 9, 0)
+    span = hours * 3600
+    term = zipf_sampler(['term{0}'.format(i) for i in range(terms)])
+    course = zipf_sampler(['course{0}'.format(i) for i in range(courses)])
+    log = []
+    for _ in range(size):
+        when = start + timedelta(seconds=random.random() * span)
+        kind = random.random()
+        if kind < 0.7:
+            log.append((when, 'search', term()))
+        elif kind < 0.9:
+            log.append((when, 'subjects', ''))
+        else:
+            log.append((when, 'course', course()))
+    log.sort()
+    return log
+
+
+def read_log(f):
+    """Read a log of queries, see the module documentation"""
+    log = []
+    for line in f:
+        when, kind, argument = line.rstrip('\n').split('\t')
+        log.append((datetime.strptime(when[:19], '%Y-%m-%dT%H:%M:%S'), kind, argument))
+    return log
+
+
+def replay(log, query, filter_cache_size, result_cache_size):
+    """Replay a log against a new stand-in
+    :param query: function building the query for a kind and argument
+    :return SolrStandIn
+    """
+    solr = SolrStandIn(filter_cache_size, result_cache_size)
+    for when, kind, argument in log:
+        solr.search(query(kind, argument), when)
+    return solr
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument('--log', type=argparse.FileType('r'), help="Log of queries")
+    args.add_argument('--size', type=int, default=100000,
+                      help="Number of queries of the synthetic log")
+    args.add_argument('--hours', type=int, default=24,
+                      help="Time span of the synthetic log")
+    args.add_argument('--filter-cache-size', type=int, default=512)
+    args.add_argument('--result-cache-size', type=int, default=512)
+    ns = args.parse_args()
+
+    log = read_log(ns.log) if ns.log else synthetic_log(ns.size, hours=ns.hours)
+    print("{0} queries".format(len(log)))
+    print("{0:<24} {1:>14} {2:>14} {3:>10}".format(
+        'time restriction', 'filterCache', 'resultCache', 'filters'))
+    strategies = [('NOW in q', legacy_query)]
+    strategies += [('fq ' + ('NOW/' + r if r else 'NOW'), rounded_query(r))
+                   for r in (None, 'MINUTE', 'HOUR', 'DAY')]
+    for name, query in strategies:
+        solr = replay(log, query, ns.filter_cache_size, ns.result_cache_size)
+        print("{0:<24} {1:>13.1%} {2:>13.1%} {3:>10}".format(
+            name, solr.filter_cache.hit_rate, solr.result_cache.hit_rate, len(solr.filters)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""In-process read replica of the catalog, to answer listings of subjects
+and presentations of a course without querying Solr (which is still used
+for full-text search).
+"""
+import logging
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from threading import Lock
+
+from moxie.core.search import SearchServerException
+
+from moxie_courses.dates import SOLR_DATE_FORMAT
+from moxie_courses.domain import Subject
+from moxie_courses.queries import all_presentations_query, rounded_now
+
+logger = logging.getLogger(__name__)
+
+
+def solr_now(rounding=None):
+    """Current time as Solr's NOW, formatted like dates of documents
+    :param rounding: (optional) unit the current time is rounded down to,
+                     as in queries (see queries.solr_now)
+    """
+    return time.strftime(SOLR_DATE_FORMAT, time.gmtime(rounded_now(rounding)))
+
+
+def future_presentations(documents, now=None):
+    """Presentations starting after now or without a start
+    :param documents: list of documents
+    :param now: (optional) current time formatted as in Solr
+    :return list of documents
+    """
+    now = now or solr_now()
+    return [d for d in documents
+            if not d.get('presentation_start') or d['presentation_start'] > now]
+
+
+def _sort_by_start(documents):
+    """Sort documents by presentation_start, documents without a start last
+    :param documents: list of documents
+    :return (documents, sorted list of starts of the documents that have one)
+    """
+    dated = sorted((d for d in documents if d.get('presentation_start')),
+                   key=lambda d: d['presentation_start'])
+    undated = [d for d in documents if not d.get('presentation_start')]
+    return dated + undated, [d['presentation_start'] for d in dated]
+
+
+class Catalog(object):
+    """Read-only copy of the catalog (documents as indexed in Solr) with
+    indexes: course identifier -> presentations, subject -> courses and
+    sorted arrays of presentation_start. Dates are compared as strings, as
+    Solr formats them with a fixed width. "Future" presentations are those
+    starting after now or without a start, like NOT presentation_start:[* TO NOW]
+    (now being rounded as in queries, see CourseService).
+    """
+
+    def __init__(self, documents):
+        """
+        :param documents: iterable of documents from Solr
+        """
+        by_course = defaultdict(list)
+        subject_courses = defaultdict(set)
+        subject_documents = defaultdict(list)
+        self.size = 0
+        for document in documents:
+            course = document['course_identifier']
+            by_course[course].append(document)
+            for subject in document.get('course_subject', ()):
+                subject_courses[subject].add(course)
+                subject_documents[subject].append(document)
+            self.size += 1
+        # course identifier -> (presentations sorted by start, their starts)
+        self.courses = dict((course, _sort_by_start(presentations))
+                            for course, presentations in by_course.items())
+        # subject -> set of course identifiers
+        self.subject_courses = dict(subject_courses)
+        # subject -> (number of presentations, their sorted starts)
+        self.subject_starts = dict(
+            (subject, (len(presentations), _sort_by_start(presentations)[1]))
+            for subject, presentations in subject_documents.items())
+        # starts of all presentations
+        self.starts = sorted(start for presentations, starts in self.courses.values()
+                             for start in starts)
+
+    def count_presentations(self, all=False, now=None):
+        """Number of presentations
+        :param all: (optional) count ALL presentations, by default only
+                    presentations that start in the future
+        :param now: (optional) current time formatted as in Solr
+        """
+        if all:
+            return self.size
+        return self.size - bisect_right(self.starts, now or solr_now())
+
+    def subjects(self, all=False, now=None):
+        """List subjects with their number of presentations
+        :param all: (optional) count ALL presentations, by default only
+                    presentations that start in the future
+        :param now: (optional) current time formatted as in Solr
+        :return list of Subject sorted by title, subjects without
+                presentations are left out
+        """
+        now = now or solr_now()
+        subjects = []
+        for title in sorted(self.subject_starts):
+            count, starts = self.subject_starts[title]
+            if not all:
+                count -= bisect_right(starts, now)
+            if count:
+                subjects.append(Subject(title, count))
+        return subjects
+
+    def courses_for_subject(self, subject):
+        """Identifiers of courses having a subject
+        :param subject: title of the subject
+        :return set of course identifiers
+        """
+        return self.subject_courses.get(subject, set())
+
+    def presentations(self, course_identifier, all=False, now=None):
+        """Presentations of a course sorted by start
+        :param course_identifier: ID of the course
+        :param all: (optional) list ALL presentations, by default only
+                    presentations that start in the future
+        :param now: (optional) current time formatted as in Solr
+        :return list of documents
+        """
+        try:
+            presentations, starts = self.courses[course_identifier]
+        except KeyError:
+            return []
+        if all:
+            return presentations
+        return presentations[bisect_right(starts, now or solr_now()):]
+
+
+class CatalogReplica(object):
+    """Catalog loaded from the search service, shared by the threads of a
+    process. It is reloaded when the import generation changes (checked at
+    most every check_interval seconds) or when it is older than max_age
+    seconds. Requests keep being answered from the previous copy while it
+    is reloaded.
+    """
+    _instances = {}
+    _instances_lock = Lock()
+
+    def __init__(self, searcher, max_age=600, page_size=1000, generation=None,
+                 check_interval=1):
+        """
+        :param searcher: search service
+        :param max_age: (optional) time in seconds after which the catalog is reloaded
+        :param page_size: (optional) number of documents fetched per query
+        :param generation: (optional) function returning the import generation
+        :param check_interval: (optional) minimum time in seconds between
+                               two checks of the import generation
+        """
+        self.searcher = searcher
+        self.max_age = max_age
+        self.page_size = page_size
+        self.generation = generation
+        self.check_interval = check_interval
+        self.catalog = None
+        self.loaded = 0
+        self.loaded_generation = None
+        self.checked = 0
+        self.lock = Lock()
+
+    @classmethod
+    def get_instance(cls, searcher, **kwargs):
+        """Replica shared by all the services of the process
+        (one per configuration)
+        """
+        key = tuple(sorted(kwargs.items()))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(searcher, **kwargs)
+            return cls._instances[key]
+
+    def get(self):
+        """Current catalog, loaded or reloaded if needed
+        :return Catalog
+        :raise SearchServerException: if the catalog has never been loaded
+                                      and the search server fails
+        """
+        if self.catalog is None:
+            with self.lock:
+                if self.catalog is None:
+                    self.refresh()
+        elif self.outdated() and self.lock.acquire(False):
+            # only one thread reloads, others use the current copy
+            try:
+                self.refresh()
+            finally:
+                self.lock.release()
+        return self.catalog
+
+    def outdated(self):
+        """True if the catalog is too old or an import has been committed"""
+        now = time.time()
+        if now - self.loaded > self.max_age:
+            return True
+        if self.generation is not None and now - self.checked > self.check_interval:
+            self.checked = now
+            return self.generation() != self.loaded_generation
+        return False
+
+    def refresh(self):
+        """Load the catalog from the search service, the previous copy is
+        kept if the search server fails
+        """
+        start = time.time()
+        generation = self.generation() if self.generation is not None else None
+        try:
+            catalog = Catalog(self._documents())
+        except SearchServerException:
+            if self.catalog is None:
+                raise
+            logger.error("Couldn't reload the catalog, keeping the previous copy",
+                         exc_info=True)
+            return
+        self.catalog = catalog
+        self.loaded = self.checked = time.time()
+        self.loaded_generation = generation
+        logger.info("Loaded {0} presentations in {1:.2f}s".format(
+            catalog.size, self.loaded - start))
+
+    def _documents(self):
+        """All documents from the search service, page by page"""
+        start = 0
+        while True:
+            results = self.searcher.search(all_presentations_query(),
+                                           start=start, count=self.page_size)
+            for document in results.results:
+                yield document
+            if len(results.results) < self.page_size:
+                return
+            start += self.page_size
@@ -0,0 +1,111 @@
+"""Conversion of dates from the XCRI feed to Solr, and from Solr to datetime.
+Dates are nearly always in the same couple of formats, these are converted
+without going through dateutil or strptime. Conversions are memoized as the
+same dates are repeated across presentations.
+"""
+import re
+from datetime import datetime
+from functools import wraps
+
+from dateutil import parser
+from dateutil.tz import tzutc
+
+SOLR_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# 2012-06-15, 2012-06-15T09:30:00 or 2012-06-15T09:30:00Z
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:T(\d{2}):(\d{2}):(\d{2})Z?)?$')
+
+
+def memoize(maxsize=4096):
+    """Memoize a function of one (hashable) argument in a bounded cache.
+    Entries are kept in two generations: when the current generation is
+    full it replaces the previous one, and entries that have not been used
+    during a whole generation are discarded (approximating LRU without
+    having to reorder entries on every hit).
+    :param maxsize: maximum number of entries
+    """
+    def decorator(func):
+        generation_size = max(maxsize // 2, 1)
+        cache = {'current': {}, 'previous': {}}
+
+        @wraps(func)
+        def wrapper(value):
+            current = cache['current']
+            try:
+                return current[value]
+            except KeyError:
+                pass
+            try:
+                result = cache['previous'][value]
+            except KeyError:
+                result = func(value)
+            if len(current) >= generation_size:
+                cache['previous'] = current
+                current = cache['current'] = {}
+            current[value] = result
+            return result
+
+        def cache_clear():
+            cache['current'] = {}
+            cache['previous'] = {}
+
+        wrapper.cache_clear = cache_clear
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+@memoize()
+def xcri_to_solr(value):
+    """Transforms a date from the XCRI feed (e.g. '2008-01-01') to the format
+    expected by Solr ('2008-01-01T00:00:00Z')
+    :param value: date as a string
+    :return date formatted as 2008-01-01T00:00:00Z
+    :raise ValueError: if the date can't be parsed
+    """
+    match = ISO_DATE.match(value)
+    if not match:
+        return parser.parse(value).strftime(SOLR_DATE_FORMAT)
+    year, month, day, hour, minute, second = match.groups()
+    # raises ValueError for dates out of range, like dateutil would
+    datetime(int(year), int(month), int(day),
+             int(hour or 0), int(minute or 0), int(second or 0))
+    return "{0}-{1}-{2}T{3}:{4}:{5}Z".format(year, month, day,
+        hour or '00', minute or '00', second or '00')
+
+
+def _is_solr_date(value):
+    """True if the date is in the format Solr returns dates in"""
+    return (len(value) == 20 and value[4] == '-' and value[7] == '-'
+            and value[10] == 'T' and value[13] == ':' and value[16] == ':'
+            and value[19] == 'Z')
+
+
+@memoize()
+def solr_to_datetime(value):
+    """Transforms a date from Solr ('2008-01-01T00:00:00Z') to a (naive) datetime
+    :param value: date as a string
+    :return datetime
+    :raise ValueError: if the date can't be parsed
+    """
+    if _is_solr_date(value):
+        return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                        int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    # e.g. milliseconds
+    date = parser.parse(value)
+    if date.tzinfo:
+        date = date.astimezone(tzutc()).replace(tzinfo=None)
+    return date
+
+
+@memoize()
+def solr_to_isoformat(value):
+    """Transforms a date from Solr ('2008-01-01T00:00:00Z') to ISO 8601 as
+    datetime.isoformat() would ('2008-01-01T00:00:00'), without parsing it
+    :param value: date as a string
+    :return date formatted as 2008-01-01T00:00:00
+    :raise ValueError: if the date can't be parsed
+    """
+    if _is_solr_date(value):
+        return value[:19]
+    return solr_to_datetime(value).isoformat()
@@ -1,7 +1,12 @@
 from datetime import datetime
 
+from moxie_courses.dates import solr_to_isoformat
+
 
 class Course(object):
+    __slots__ = ('id', 'title', 'description', 'provider', 'subjects',
+                 'presentations')
+
     def __init__(self, id, title="", description="", provider="",
             subjects=None, presentations=None):
         self.id = id
@@ -11,8 +16,25 @@ class Course(object):
         self.subjects = subjects or []
         self.presentations = presentations or []
 
+    def __getstate__(self):
+        # objects with __slots__ can only be pickled with protocol 2
+        # otherwise, and caches might use protocol 0. Subclasses (e.g.
+        # LazyCourse) also have attributes in their __dict__
+        state = dict((name, getattr(self, name)) for name in Course.__slots__)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
 
 class Presentation(object):
+    __slots__ = ('id', 'course', 'start', 'end', 'location', 'apply_link',
+                 'booking_endpoint', 'apply_from', 'apply_until', '_date_apply',
+                 'attendance_mode', 'attendance_pattern', 'study_mode',
+                 'booking_status', 'booking_id')
+
     def __init__(self, id, course, start=None, end=None, location="",
             apply_link="", booking_endpoint="",
             apply_from=None, apply_until=None, date_apply=None,
@@ -27,19 +49,121 @@ class Presentation(object):
         self.booking_endpoint = booking_endpoint
         self.apply_from = apply_from
         self.apply_until = apply_until
-        self.date_apply = date_apply or datetime.now()
+        self._date_apply = date_apply
         self.attendance_mode = attendance_mode
         self.attendance_pattern = attendance_pattern
         self.study_mode = study_mode
         self.booking_status = booking_status
         self.booking_id = booking_id
 
+    def __getstate__(self):
+        # see Course.__getstate__
+        state = dict((name, getattr(self, name)) for name in Presentation.__slots__)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def date_apply(self):
+        """Date at which the presentation would be booked, defaults to
+        the first time it is needed
+        """
+        if self._date_apply is None:
+            self._date_apply = datetime.now()
+        return self._date_apply
+
+    @date_apply.setter
+    def date_apply(self, value):
+        self._date_apply = value
+
     @property
     def bookable(self):
         if self.apply_from and self.apply_until and self.booking_endpoint:
             return self.apply_from < self.date_apply < self.apply_until
         return False
 
+    def isoformat(self, name):
+        """Date attribute formatted as ISO 8601
+        :param name: name of the attribute (e.g. start)
+        :return date as a string or None if it is not set
+        """
+        value = getattr(self, name)
+        return value.isoformat() if value else None
+
+
+class lazy_field(object):
+    """Attribute of a LazyPresentation decoded from its document on first
+    access, using `fields` of the instance: attribute -> (field of the
+    document, function decoding the value). Missing fields are None.
+    """
+
+    def __init__(self, name):
+        self.__name__ = name
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        field, decoder = obj.fields[self.__name__]
+        value = obj.document.get(field)
+        if value is not None:
+            value = decoder(value)
+        obj.__dict__[self.__name__] = value
+        return value
+
+
+class LazyCourse(Course):
+    """Course wrapping a document from Solr. Attributes are set by the
+    mapper (see moxie_courses.solr), class attributes are their default
+    values. Courses from course documents (search results) also have the
+    start of their next presentation and their number of presentations in
+    the future (see solr.course_document_to_course).
+    """
+    title = ""
+    description = ""
+    provider = ""
+    next_start = None
+    future_presentations = None
+
+    def __init__(self, id, document):
+        self.id = id
+        self.document = document
+        self.subjects = []
+        self.presentations = []
+
+
+class LazyPresentation(Presentation):
+    """Presentation wrapping a document from Solr, see LazyCourse. Dates are
+    decoded on first access, isoformat() passes them through as strings.
+    """
+    start = lazy_field('start')
+    end = lazy_field('end')
+    apply_from = lazy_field('apply_from')
+    apply_until = lazy_field('apply_until')
+    location = ""
+    apply_link = ""
+    booking_endpoint = ""
+    attendance_mode = None
+    attendance_pattern = None
+    study_mode = None
+    booking_status = None
+    booking_id = None
+
+    def __init__(self, id, course, document, fields):
+        self.id = id
+        self.course = course
+        self.document = document
+        self.fields = fields
+        self._date_apply = None
+
+    def isoformat(self, name):
+        if name in self.__dict__:
+            return super(LazyPresentation, self).isoformat(name)
+        value = self.document.get(self.fields[name][0])
+        return solr_to_isoformat(value) if value else None
+
 
 class Subject(object):
     def __init__(self, title, count=None):
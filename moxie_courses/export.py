@@ -0,0 +1,42 @@
+"""Export of the whole catalog, one course at a time with all its
+presentations (e.g. as newline-delimited JSON, see
+representations.course_lines). Solr is paged through with a cursor,
+which (unlike start) costs the same for every page, and presentations
+are sorted by course so that a course is complete as soon as the next
+one starts: memory does not depend on the size of the catalog.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from moxie_courses.queries import export_query
+from moxie_courses.solr import presentations_to_lazy_course
+
+
+def export_documents(search_service, page_size=1000):
+    """All presentations sorted by course, a page at a time
+    :param search_service: search service
+    :param page_size: (optional) number of documents fetched per query
+    :return generator of documents
+    """
+    cursor = '*'
+    while True:
+        # start must be 0 when paging with a cursor
+        results = search_service.search(export_query(cursor), start=0, count=page_size)
+        for document in results.results:
+            yield document
+        next_cursor = results.as_dict.get('nextCursorMark')
+        # the same cursor is returned once all documents have been read
+        if next_cursor is None or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def export_courses(search_service, page_size=1000):
+    """All courses with their presentations
+    :param search_service: search service
+    :param page_size: (optional) see export_documents
+    :return generator of LazyCourse
+    """
+    documents = export_documents(search_service, page_size)
+    for course, presentations in groupby(documents, itemgetter('course_identifier')):
+        yield presentations_to_lazy_course(list(presentations))
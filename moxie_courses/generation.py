@@ -0,0 +1,47 @@
+"""Import generation: a token changed every time an import is committed to
+the index. Including it in cache keys lets anything derived from the index
+be cached for a long time without being served stale after an import.
+The token, and the time of the import, are kept in the shared cache so
+that web processes see imports run by workers.
+"""
+import time
+import uuid
+
+from moxie.core.cache import cache
+
+GENERATION_KEY = 'moxie_courses.import_generation'
+IMPORTED_KEY = 'moxie_courses.import_time'
+# long but explicit: the meaning of 0/None differs between cache backends
+GENERATION_TIMEOUT = 7 * 24 * 3600
+
+
+def current_generation():
+    """Current import generation
+    :return token as a string
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # first use, or the token has been evicted: start a new generation
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=GENERATION_TIMEOUT)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def last_import():
+    """Time of the last import
+    :return seconds since the epoch
+    """
+    imported = cache.get(IMPORTED_KEY)
+    if imported is None:
+        # unknown (first use or evicted): content may have changed until now
+        cache.add(IMPORTED_KEY, time.time(), timeout=GENERATION_TIMEOUT)
+        imported = cache.get(IMPORTED_KEY)
+    return imported
+
+
+def bump_generation():
+    """Start a new import generation, called when an import is committed
+    """
+    # time first: the generation is never newer than the time of the import
+    cache.set(IMPORTED_KEY, time.time(), timeout=GENERATION_TIMEOUT)
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, timeout=GENERATION_TIMEOUT)
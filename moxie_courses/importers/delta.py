@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(document):
+    """Content hash of a document ready to be indexed
+    :param document: dict
+    :return hexadecimal digest as a string
+    """
+    serialized = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def feed_path(prefix, url):
+    """Path of a file specific to one feed
+    :param prefix: path of the files, completed with a hash of the URL
+    :param url: URL of the feed
+    :return path as a string
+    """
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return '{prefix}.{digest}'.format(prefix=prefix, digest=digest)
+
+
+class JSONFileStore(object):
+    """Keep a dict from one import to the next one in a JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Get the dict saved by the previous import
+        :return dict, empty if there is no previous import
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning("Unreadable file, ignoring previous import",
+                    extra={'path': self.path})
+            return {}
+
+    def save(self, data):
+        """Replace the stored dict
+        :param data: dict
+        """
+        tmp_path = '{path}.tmp'.format(path=self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, self.path)
+
+
+class FingerprintStore(JSONFileStore):
+    """Keep fingerprints of the documents sent to the search index by the
+    last import, as a JSON file mapping presentation_identifier to hash
+    """
+
+    @classmethod
+    def for_feed(cls, prefix, url):
+        """Get the store of one feed, each feed has its own file
+        :param prefix: path of the files, completed with a hash of the URL
+        :param url: URL of the feed
+        :return FingerprintStore
+        """
+        return cls(feed_path(prefix, url))
@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import closing
+
+import requests
+
+from moxie_courses.importers.delta import JSONFileStore
+
+logger = logging.getLogger(__name__)
+
+
+class FeedState(JSONFileStore):
+    """Keep validators (ETag, Last-Modified and SHA-256 of the body) of the
+    feeds that have been successfully imported, by URL
+    """
+
+    def get(self, url):
+        """Validators of the last successful import of a feed
+        :param url: URL of the feed
+        :return dict, empty if the feed has never been imported
+        """
+        return self.load().get(url, {})
+
+    def update(self, feed):
+        """Record a feed as successfully imported
+        :param feed: Feed object
+        """
+        states = self.load()
+        states[feed.url] = feed.validators
+        self.save(states)
+
+
+class Feed(object):
+    """Feed downloaded to a temporary file
+    """
+
+    def __init__(self, url, path, etag=None, last_modified=None, sha256=None):
+        self.url = url
+        self.path = path
+        self.validators = {'etag': etag, 'last_modified': last_modified,
+                           'sha256': sha256}
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def close(self):
+        """Remove the temporary file"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def fetch_feed(url, state=None, force_update=False, chunk_size=65536, timeout=600):
+    """Download a feed unless it hasn't changed since its last successful
+    import. The server is asked with If-None-Match / If-Modified-Since, if
+    it sends the whole feed anyway its SHA-256 is compared to the last one.
+    :param url: URL of the feed
+    :param state: (optional) FeedState, the feed is always downloaded if None
+    :param force_update: (optional) ignore the state of the last import
+    :param chunk_size: (optional) size of the chunks written to disk
+    :param timeout: (optional) timeout of the request in seconds
+    :return Feed object, or None if the feed is unchanged
+    """
+    previous = {}
+    if state is not None and not force_update:
+        previous = state.get(url)
+    headers = {}
+    if previous.get('etag'):
+        headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        headers['If-Modified-Since'] = previous['last_modified']
+
+    # streamed so that the feed is written to disk as it is downloaded,
+    # the connection is released whatever happens
+    with closing(requests.get(url, headers=headers, timeout=timeout,
+                              stream=True)) as response:
+        if response.status_code == 304:
+            logger.info("Feed not modified", extra={'url': url})
+            return None
+        response.raise_for_status()
+
+        sha256 = hashlib.sha256()
+        fd, path = tempfile.mkstemp(suffix='.xml')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size):
+                    sha256.update(chunk)
+                    f.write(chunk)
+        except:
+            os.remove(path)
+            raise
+        headers = response.headers
+    digest = sha256.hexdigest()
+    if digest == previous.get('sha256'):
+        logger.info("Feed identical to the last import", extra={'url': url})
+        os.remove(path)
+        return None
+    return Feed(url, path, etag=headers.get('ETag'),
+                last_modified=headers.get('Last-Modified'),
+                sha256=digest)
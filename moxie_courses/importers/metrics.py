@@ -0,0 +1,135 @@
+import resource
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+STAGES = ('fetch', 'parse', 'transform', 'index', 'delete', 'commit')
+
+
+def peak_rss_kb():
+    """Peak resident memory of the current process (in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StageMetrics(object):
+    """Time spent in one stage of the import and what it processed
+    """
+
+    def __init__(self):
+        self.wall = 0.0     # wall time in seconds
+        self.cpu = 0.0      # CPU time in seconds
+        self.count = 0      # number of documents processed
+        self.bytes = 0      # number of bytes read
+
+    def add(self, wall, cpu, count=0, bytes=0):
+        self.wall += wall
+        self.cpu += cpu
+        self.count += count
+        self.bytes += bytes
+
+    def merge(self, other):
+        self.add(other.wall, other.cpu, other.count, other.bytes)
+
+    def as_dict(self):
+        return {
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'count': self.count,
+            'bytes': self.bytes,
+            'docs_per_s': self.count / self.wall if self.wall else None,
+        }
+
+
+class ImportMetrics(object):
+    """Metrics of an import, returned by the importers: time spent in each
+    stage, number of presentations indexed, unchanged... and presentations
+    skipped or that couldn't be indexed, by reason.
+    """
+
+    def __init__(self):
+        self.stages = dict((stage, StageMetrics()) for stage in STAGES)
+        self.counts = Counter()     # e.g. indexed, unchanged, deleted
+        self.skipped = Counter()    # presentations not transformed, by reason
+        self.failed = Counter()     # presentations not indexed/deleted, by reason
+        self.feeds = {}             # URL -> metrics of the feed as a dict
+        self.started = time.time()
+        self.wall = 0.0
+        self.peak_rss_kb = 0
+
+    @contextmanager
+    def measure(self, stage):
+        """Measure the time spent in a block of code
+        :param stage: name of the stage
+        """
+        start_wall, start_cpu = time.time(), time.clock()
+        try:
+            yield
+        finally:
+            self.stages[stage].add(time.time() - start_wall, time.clock() - start_cpu)
+
+    def measure_iter(self, stage, iterable):
+        """Measure the time spent getting items from an iterable, counting items
+        :param stage: name of the stage
+        :param iterable: iterable of documents
+        :return generator of documents
+        """
+        metrics = self.stages[stage]
+        iterator = iter(iterable)
+        while True:
+            start_wall, start_cpu = time.time(), time.clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                metrics.add(time.time() - start_wall, time.clock() - start_cpu)
+                return
+            metrics.add(time.time() - start_wall, time.clock() - start_cpu, 1)
+            yield item
+
+    def finish(self):
+        """Record total time and peak memory, at the end of the import
+        """
+        self.wall = time.time() - self.started
+        self.peak_rss_kb = max(self.peak_rss_kb, peak_rss_kb())
+
+    @property
+    def cpu(self):
+        """CPU time spent in all stages, whichever process they ran in"""
+        return sum(metrics.cpu for metrics in self.stages.values())
+
+    def merge(self, other):
+        """Add metrics of another import (e.g. a feed imported by a worker)
+        :param other: ImportMetrics
+        """
+        for stage, metrics in other.stages.items():
+            self.stages[stage].merge(metrics)
+        self.counts.update(other.counts)
+        self.skipped.update(other.skipped)
+        self.failed.update(other.failed)
+        self.peak_rss_kb = max(self.peak_rss_kb, other.peak_rss_kb)
+
+    def as_dict(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'peak_rss_kb': self.peak_rss_kb,
+            'stages': dict((stage, metrics.as_dict()) for stage, metrics in self.stages.items()),
+            'counts': dict(self.counts),
+            'skipped': dict(self.skipped),
+            'failed': dict(self.failed),
+            'feeds': self.feeds,
+        }
+
+
+class CountingReader(object):
+    """File-like object counting bytes read from a file
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes += len(data)
+        return data
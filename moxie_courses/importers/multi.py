@@ -0,0 +1,266 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+import traceback
+try:
+    # celery's fork of multiprocessing, allows using a pool from a worker
+    from billiard import Pool, TimeoutError, cpu_count
+except ImportError:
+    from multiprocessing import Pool, TimeoutError, cpu_count
+
+from moxie_courses.importers.delta import FingerprintStore, feed_path
+from moxie_courses.importers.fetch import fetch_feed, Feed
+from moxie_courses.importers.metrics import ImportMetrics
+from moxie_courses.importers.snapshot import SnapshotWriter, read_snapshot
+from moxie_courses.importers.xcri_ox import XcriOxImporter, XcriOxHandler, check_delta_indexer
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_and_parse(job):
+    """Fetch, parse and transform one feed (in a worker process). Documents
+    are written to a snapshot in a temporary file.
+    :param job: tuple (url, FeedState or None, force_update, handler,
+                directory of the temporary files of the run)
+    :return dict describing the result; 'path' is None if the feed is
+            unchanged or couldn't be imported (then 'error' is set),
+            'metrics' are the ImportMetrics of fetching and parsing the feed
+    """
+    url, state, force_update, handler, tmp_dir = job
+    metrics = ImportMetrics()
+    result = {'url': url, 'path': None, 'count': 0, 'validators': None,
+              'error': None, 'metrics': metrics}
+    feed = None
+    path = None
+    try:
+        with metrics.measure('fetch'):
+            feed = fetch_feed(url, state, force_update)
+        if feed is None:
+            return result
+        metrics.stages['fetch'].bytes += os.path.getsize(feed.path)
+        result['validators'] = feed.validators
+        fd, path = tempfile.mkstemp(suffix='.snapshot', dir=tmp_dir)
+        os.close(fd)
+        with feed.open() as xcri, SnapshotWriter(path) as snapshot:
+            importer = XcriOxImporter(None, xcri, handler=handler, metrics=metrics)
+            for document in importer.transform(importer.parse()):
+                snapshot.write(document)
+        result['count'] = snapshot.count
+        result['path'] = path
+    except Exception:
+        logger.error("Couldn't fetch or parse feed", exc_info=True, extra={'url': url})
+        result['error'] = traceback.format_exc()
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+    finally:
+        if feed is not None:
+            feed.close()
+        metrics.finish()
+    return result
+
+
+class XcriOxMultiImporter(object):
+    """Import several XCRI feeds. Feeds are fetched, parsed and transformed
+    in parallel by a pool of processes; documents of a feed are indexed as
+    soon as it is ready. A feed failing or not being ready before the
+    timeout does not prevent other feeds from being imported.
+    """
+
+    def __init__(self, indexer, urls, processes=None, timeout=3600,
+                 handler=XcriOxHandler, batch_size=500, retries=1,
+                 state=None, fingerprints=None, snapshots=None, force_update=False,
+                 on_commit=None):
+        """
+        :param indexer: search service
+        :param urls: list of URLs of XCRI feeds
+        :param processes: (optional) number of processes, defaults to one per feed (at most one per CPU)
+        :param timeout: (optional) time in seconds after which feeds not ready are abandoned
+        :param handler: (optional) parser, see HANDLERS
+        :param state: (optional) FeedState, unchanged feeds are skipped
+        :param fingerprints: (optional) prefix of the fingerprints files (delta mode)
+        :param snapshots: (optional) prefix of the files to keep snapshots of the
+                          feeds in, once the import has been accepted (see
+                          promote_snapshots)
+        :param force_update: (optional) import feeds even if they haven't changed
+        :param on_commit: (optional) function called once documents have been committed
+        :raise ValueError: in delta mode, if the search service can't delete documents
+        """
+        if fingerprints:
+            # before feeds are fetched, rather than when indexing the first one
+            check_delta_indexer(indexer)
+        self.indexer = indexer
+        self.urls = urls
+        self.processes = processes or min(len(urls), cpu_count())
+        self.timeout = timeout
+        self.handler = handler
+        self.batch_size = batch_size
+        self.retries = retries
+        self.state = state
+        self.fingerprints = fingerprints
+        self.snapshots = snapshots
+        self.force_update = force_update
+        self.on_commit = on_commit
+        self.importers = {}     # URL -> XcriOxImporter of feeds that have been indexed
+        self.failed = []        # URL of feeds that couldn't be imported
+        self.parsed = 0         # number of documents parsed from all feeds
+        # unique keys (presentation_identifier) of the documents indexed, a
+        # presentation can be repeated in a feed or across feeds
+        self.identifiers = set()
+        self.new_snapshots = {}  # URL -> snapshot of feeds indexed, not promoted yet
+        self.tmp_dir = None     # directory of the snapshots written by the run
+        self.metrics = ImportMetrics()
+
+    def run(self):
+        """Import the feeds
+        :return ImportMetrics of all feeds, metrics of each feed are in its 'feeds'
+        """
+        self.tmp_dir = tempfile.mkdtemp(prefix='xcri-snapshots-')
+        jobs = [(url, self.state, self.force_update, self.handler, self.tmp_dir)
+                for url in self.urls]
+        pending = set(self.urls)
+        results = {}
+        pool = Pool(processes=self.processes)
+        try:
+            deadline = time.time() + self.timeout
+            ready = pool.imap_unordered(fetch_and_parse, jobs)
+            for i in range(len(jobs)):
+                try:
+                    result = ready.next(timeout=max(deadline - time.time(), 0))
+                except TimeoutError:
+                    logger.error("Feeds not fetched and parsed before timeout",
+                            extra={'urls': sorted(pending)})
+                    self.failed.extend(sorted(pending))
+                    break
+                pending.discard(result['url'])
+                results[result['url']] = result
+                self._index_feed(result)
+            # presentations that moved from one feed to another are kept
+            seen = set()
+            for importer in self.importers.values():
+                seen.update(importer.current)
+            for importer in self.importers.values():
+                importer.delete_vanished(keep=seen)
+        finally:
+            pool.terminate()
+            self._remove_temporary_files()
+            with self.metrics.measure('commit'):
+                self.indexer.commit()
+            if self.on_commit is not None:
+                self.on_commit()
+        for url, importer in self.importers.items():
+            importer.save_fingerprints()
+            if self.state is not None and not importer.failed_batches:
+                self.state.update(Feed(url, None, **results[url]['validators']))
+        logger.info("Imported {0} feeds ({1} unchanged, {2} failed)".format(
+            len(self.importers), len(self.urls) - len(self.importers) - len(self.failed),
+            len(self.failed)))
+        return self.report(results)
+
+    def report(self, results):
+        """Gather metrics of all feeds
+        :param results: dict of URL -> result of fetch_and_parse
+        :return ImportMetrics
+        """
+        for url in self.urls:
+            if url in self.importers:
+                metrics = self.importers[url].report()
+            elif url in results:
+                metrics = results[url]['metrics']
+            else:
+                self.metrics.feeds[url] = {'error': 'timeout'}
+                continue
+            self.metrics.merge(metrics)
+            feed = metrics.as_dict()
+            del feed['feeds']
+            feed['error'] = results[url]['error']
+            feed['unchanged'] = not feed['error'] and url not in self.importers
+            self.metrics.feeds[url] = feed
+        self.metrics.counts['feeds'] = len(self.urls)
+        self.metrics.counts['feeds_indexed'] = len(self.importers)
+        self.metrics.counts['feeds_failed'] = len(self.failed)
+        self.metrics.finish()
+        return self.metrics
+
+    def _identified(self, documents):
+        """Record the unique keys of documents (see identifiers)"""
+        for document in documents:
+            self.identifiers.add(document['presentation_identifier'])
+            yield document
+
+    def _remove_temporary_files(self):
+        """Delete the snapshots of the run that won't be promoted, including
+        those of workers killed at the deadline
+        """
+        kept = set(self.new_snapshots.values())
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            if path not in kept:
+                os.remove(path)
+        if not kept:
+            os.rmdir(self.tmp_dir)
+
+    def promote_snapshots(self):
+        """Keep the snapshots of the feeds that have been indexed (replacing
+        the previous ones), once the import has been accepted
+        """
+        for url, path in self.new_snapshots.items():
+            shutil.move(path, feed_path(self.snapshots, url))
+            del self.new_snapshots[url]
+
+    def discard_snapshots(self):
+        """Delete the snapshots that have not been promoted, e.g. when the
+        import is rejected (the previous snapshots are kept)
+        """
+        for url, path in self.new_snapshots.items():
+            if os.path.exists(path):
+                os.remove(path)
+            del self.new_snapshots[url]
+        if self.tmp_dir is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @property
+    def complete(self):
+        """True if all feeds have been parsed and indexed without errors"""
+        return not self.failed and not any(importer.failed_batches
+                                           for importer in self.importers.values())
+
+    def _index_feed(self, result):
+        """Index documents of one feed
+        :param result: dict returned by fetch_and_parse
+        """
+        url = result['url']
+        if result['error']:
+            logger.error("Couldn't import feed", extra={'url': url, 'error': result['error']})
+            self.failed.append(url)
+            return
+        stages = result['metrics'].stages
+        if result['path'] is None:
+            logger.info("Feed unchanged since the last import ({0:.1f}s)".format(
+                stages['fetch'].wall), extra={'url': url})
+            return
+        fingerprints = None
+        if self.fingerprints:
+            fingerprints = FingerprintStore.for_feed(self.fingerprints, url)
+        # index and delete stages are added to metrics of the worker
+        importer = XcriOxImporter(self.indexer, None, batch_size=self.batch_size,
+                                  retries=self.retries, fingerprints=fingerprints,
+                                  metrics=result['metrics'])
+        indexed = False
+        try:
+            importer.index(self._identified(importer.with_courses(read_snapshot(result['path']))))
+            indexed = True
+        finally:
+            if indexed and self.snapshots:
+                self.new_snapshots[url] = result['path']
+            else:
+                os.remove(result['path'])
+        self.importers[url] = importer
+        self.parsed += result['count']
+        logger.info("Feed fetched in {0:.1f}s, {1} presentations parsed in {2:.1f}s, "
+                    "{3} indexed in {4:.1f}s ({5} unchanged, {6} batches failed)".format(
+                        stages['fetch'].wall, result['count'],
+                        stages['parse'].wall + stages['transform'].wall,
+                        importer.indexed, stages['index'].wall, importer.unchanged,
+                        importer.failed_batches), extra={'url': url})
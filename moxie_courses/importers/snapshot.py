@@ -0,0 +1,83 @@
+import cPickle
+import gzip
+import os
+import time
+
+SNAPSHOT_FORMAT = 'moxie-courses-snapshot'
+# 2: snapshots only have presentations, course documents are added when
+# they are indexed (see XcriOxImporter.with_courses)
+SNAPSHOT_VERSION = 2
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotWriter(object):
+    """Write transformed documents to a snapshot: a gzipped stream of
+    pickled documents preceded by a header with the format version.
+    The snapshot is only created (or replaced) when the writer is closed,
+    used as a context manager it is discarded if an exception is raised.
+    """
+
+    def __init__(self, path, compresslevel=1):
+        self.path = path
+        self.tmp_path = '{path}.tmp'.format(path=path)
+        self.file = gzip.open(self.tmp_path, 'wb', compresslevel)
+        self.count = 0
+        header = {'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION,
+                  'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+        cPickle.dump(header, self.file, cPickle.HIGHEST_PROTOCOL)
+
+    def write(self, document):
+        cPickle.dump(document, self.file, cPickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def tee(self, documents):
+        """Write documents while passing them through
+        :param documents: iterable of documents
+        :return generator of documents
+        """
+        for document in documents:
+            self.write(document)
+            yield document
+
+    def close(self):
+        self.file.close()
+        os.rename(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_snapshot(path):
+    """Read documents from a snapshot
+    :param path: path of the snapshot
+    :return generator of documents
+    :raise SnapshotError: if the file is not a snapshot in a supported version
+    """
+    with gzip.open(path, 'rb') as f:
+        try:
+            header = cPickle.load(f)
+        except (EOFError, IOError, cPickle.UnpicklingError):
+            raise SnapshotError("{path} is not a snapshot".format(path=path))
+        if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT:
+            raise SnapshotError("{path} is not a snapshot".format(path=path))
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise SnapshotError("Unsupported version {version} of snapshot {path}".format(
+                version=header.get('version'), path=path))
+        while True:
+            try:
+                yield cPickle.load(f)
+            except EOFError:
+                return
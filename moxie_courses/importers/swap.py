@@ -0,0 +1,83 @@
+import logging
+import urlparse
+
+import requests
+
+from moxie.core.search import SearchServerException
+from moxie.core.search.solr import SolrSearch
+
+logger = logging.getLogger(__name__)
+
+
+class StagingValidationError(Exception):
+    pass
+
+
+class SolrCoreSwap(object):
+    """Build the index in a staging core and swap it with the live core
+    (CoreAdmin SWAP) once it has been validated. After a swap the staging
+    core holds the previous index, swapping again is an instant rollback.
+    """
+
+    def __init__(self, server_url, core, staging_core, timeout=60):
+        """
+        :param server_url: URL of Solr, e.g. http://127.0.0.1:8080/solr/
+        :param core: name of the live core
+        :param staging_core: name of the core to build the index in
+        :param timeout: (optional) timeout of CoreAdmin requests in seconds
+        """
+        self.server_url = server_url
+        self.core = core
+        self.staging_core = staging_core
+        self.timeout = timeout
+
+    def staging_searcher(self):
+        """Search service for the staging core, emptied
+        :return SolrSearch
+        """
+        searcher = SolrSearch(self.staging_core, self.server_url)
+        searcher.clear_index()
+        return searcher
+
+    def count(self, searcher):
+        """Number of documents in a core
+        :param searcher: SolrSearch
+        :return int
+        """
+        results = searcher.search({'q': '*:*', 'rows': '0'}, start=0, count=0)
+        return results.as_dict['response']['numFound']
+
+    def validate(self, searcher, expected):
+        """Check that the staging core has the expected number of documents
+        :param searcher: SolrSearch of the staging core
+        :param expected: number of distinct unique keys (presentation_identifier)
+                         of the documents indexed, documents with the same key
+                         replace each other
+        :raise StagingValidationError: if the number of documents differ
+        """
+        count = self.count(searcher)
+        if count != expected:
+            raise StagingValidationError("Staging core has {0} documents, expected {1}".format(
+                count, expected))
+
+    def swap(self):
+        """Swap the staging core with the live core
+        :raise SearchServerException: if Solr couldn't swap cores
+        """
+        url = urlparse.urljoin(self.server_url, 'admin/cores')
+        params = {'action': 'SWAP', 'core': self.core, 'other': self.staging_core,
+                  'wt': 'json'}
+        try:
+            response = requests.get(url, params=params, timeout=self.timeout)
+        except requests.RequestException:
+            logger.error("Couldn't swap cores", exc_info=True)
+            raise SearchServerException()
+        if not response.ok:
+            logger.error("Couldn't swap cores", extra={
+                'status_code': response.status_code,
+                'content': response.text})
+            raise SearchServerException()
+        logger.info("Swapped core {0} with {1}".format(self.core, self.staging_core))
+
+    # the staging core keeps the previous index after a swap
+    rollback = swap
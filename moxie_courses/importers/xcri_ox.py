@@ -1,11 +1,21 @@
+import json
 import logging
-from collections import defaultdict
-from dateutil import parser
+from collections import defaultdict, OrderedDict
+from itertools import chain
 from xml import sax
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
 
 from moxie.core.search import SearchServerException
 from moxie.core.search.solr import SolrSearch
 
+from moxie_courses.dates import xcri_to_solr
+from moxie_courses.importers.delta import fingerprint, FingerprintStore
+from moxie_courses.importers.metrics import CountingReader, ImportMetrics
+from moxie_courses.importers.snapshot import SnapshotWriter, read_snapshot
+
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +61,7 @@ class XcriOxHandler(sax.ContentHandler):
 
     def __init__(self):
         self.presentations = []
+        self.count = 0
         self.element_data = defaultdict(list)
         self.parse = None   # structure that is currently parsed
         self.tag = None     # current name of the key
@@ -103,6 +114,8 @@ class XcriOxHandler(sax.ContentHandler):
     def endElementNS(self, (uri, localname), qname):
         if self.capture_data:
             self.element_data[self.tag].append(self.data)
+            # do not capture whitespace until the end of the parent element
+            self.capture_data = False
         self.data = ''
 
         if localname == 'venue':
@@ -111,6 +124,7 @@ class XcriOxHandler(sax.ContentHandler):
             self.parse = (XCRI_NS, "presentation")
         elif localname == 'presentation':
             self.presentations.append(self.element_data.copy())
+            self.count += 1
 
         if (uri, localname) in PARSE_STRUCTURE and not self.in_venue:
             for key in PARSE_STRUCTURE[(uri, localname)].keys():
@@ -132,7 +146,34 @@ class XcriOxHandler(sax.ContentHandler):
         self.data += data
 
     def endDocument(self):
-        logger.debug("Parsed {0} presentations.".format(len(self.presentations)))
+        logger.debug("Parsed {0} presentations.".format(self.count))
+
+    def iter_presentations(self, xcri_file, buffer_size=8192):
+        """Incrementally parse an XCRI document, yielding every presentation
+        as soon as its closing element has been read
+        :param xcri_file: file-like object
+        :param buffer_size: number of bytes to read for each chunk
+        :return generator of presentations (dict of lists)
+        """
+        parser = sax.make_parser()
+        parser.setContentHandler(self)
+        parser.setFeature(sax.handler.feature_namespaces, 1)
+        buffered_data = xcri_file.read(buffer_size)
+        while buffered_data:
+            parser.feed(buffered_data)
+            for presentation in self.pop_presentations():
+                yield presentation
+            buffered_data = xcri_file.read(buffer_size)
+        parser.close()
+        for presentation in self.pop_presentations():
+            yield presentation
+
+    def pop_presentations(self):
+        """Get presentations parsed since the last call and forget them
+        :return list of presentations
+        """
+        presentations, self.presentations = self.presentations, []
+        return presentations
 
     @classmethod
     def _split_qname(self, qname):
@@ -149,6 +190,177 @@ class XcriOxHandler(sax.ContentHandler):
         return prefix, local
 
 
+def _clark(uri, localname):
+    """Name of an element as used by ElementTree, i.e. {uri}localname
+    """
+    return "{{{uri}}}{localname}".format(uri=uri, localname=localname)
+
+
+def _compile_structure(structure, prefix=None):
+    """Compile a structure (PARSE_STRUCTURE or VENUE_STRUCTURE) to a lookup
+    table usable by XcriOxIterparseHandler, keys of the documents are
+    computed once instead of once per element.
+    :param structure: dict of elements to keep in
+    :param prefix: (optional) prefix of the key, defaults to the name of the structure
+    :return dict of {uri}structure -> {{uri}element: (key, attribute)}
+    """
+    compiled = {}
+    for (uri, localname), elements in structure.items():
+        compiled[_clark(uri, localname)] = dict(
+            (_clark(e_uri, e_localname), ("{element}_{key}".format(
+                element=prefix or localname, key=e_localname), attr))
+            for (e_uri, e_localname), attr in elements.items())
+    return compiled
+
+
+class XcriOxIterparseHandler(object):
+    """Alternative to XcriOxHandler built on ElementTree's iterparse,
+    producing the same presentations. Elements are discarded once the
+    presentation (or course, provider) they belong to has been read so
+    memory does not grow with the size of the catalog.
+    """
+
+    PARSE_STRUCTURE = _compile_structure(PARSE_STRUCTURE)
+    VENUE_STRUCTURE = _compile_structure(VENUE_STRUCTURE, prefix='presentation_venue')
+
+    def __init__(self):
+        self.count = 0
+
+    def iter_presentations(self, xcri_file, buffer_size=8192):
+        """Incrementally parse an XCRI document, yielding every presentation
+        as soon as its closing element has been read
+        :param xcri_file: file-like object
+        :param buffer_size: unused, ElementTree reads the file by chunks
+        :return generator of presentations (dict of lists)
+        """
+        parse_structure = self.PARSE_STRUCTURE
+        venue_structure = self.VENUE_STRUCTURE
+        # data captured for the provider, course and presentation currently parsed
+        layers = {'provider': {}, 'course': {}, 'presentation': {}}
+        layer = None    # layer of the structure that is currently parsed
+        elements = None     # elements to keep in for this structure
+        in_venue = False
+        capture = None  # (element, key) of the element to capture text from
+        stack = []      # open elements, to be able to discard them
+
+        for event, elem in ElementTree.iterparse(xcri_file, events=('start', 'end')):
+            tag = elem.tag
+            localname = tag.rpartition('}')[2]
+            if event == 'start':
+                stack.append(elem)
+                capture = None
+                # dealing with the xcri:provider being in two different
+                # structures (see XcriOxHandler)
+                if tag in parse_structure and not in_venue:
+                    layer = layers[localname]
+                    elements = parse_structure[tag]
+                    continue
+                elif tag in venue_structure and in_venue:
+                    layer = layers['presentation']
+                    elements = venue_structure[tag]
+                    continue
+                if elements is None:
+                    continue
+                if localname == 'venue':
+                    in_venue = True
+                    # nothing to keep until the xcri:provider of the venue
+                    elements = {}
+                elif tag in elements:
+                    key, attr = elements[tag]
+                    if not attr:
+                        capture = (elem, key)
+                        continue
+                    for name, value in elem.attrib.items():
+                        if name.rpartition('}')[2] == attr:
+                            # Use the value of the attribute instead of the element
+                            layer[key] = [value]
+            else:
+                stack.pop()
+                if capture is not None and capture[0] is elem:
+                    layer.setdefault(capture[1], []).append(elem.text or '')
+                    capture = None
+
+                if localname == 'venue':
+                    in_venue = False
+                    # Structure to continue to parse is a presentation
+                    layer = layers['presentation']
+                    elements = parse_structure[_clark(XCRI_NS, 'presentation')]
+                elif localname == 'presentation':
+                    presentation = defaultdict(list)
+                    presentation.update(layers['provider'])
+                    presentation.update(layers['course'])
+                    presentation.update(layers['presentation'])
+                    self.count += 1
+                    yield presentation
+
+                if tag in parse_structure and not in_venue:
+                    layers[localname] = {}
+                    layer = None
+                    elements = None
+                    # everything in this element has been processed
+                    elem.clear()
+                    if stack:
+                        del stack[-1][:]
+        logger.debug("Parsed {0} presentations.".format(self.count))
+
+
+# Parsers that can be used as the handler of XcriOxImporter
+HANDLERS = {
+    'sax': XcriOxHandler,
+    'iterparse': XcriOxIterparseHandler,
+}
+
+
+# Fields of presentation documents copied to course documents
+COURSE_DOCUMENT_FIELDS = ('provider_title', 'course_identifier', 'course_title',
+                          'course_description', 'course_subject')
+# Prefix of the unique key (presentation_identifier) of course documents
+COURSE_DOCUMENT_PREFIX = 'course:'
+
+
+def course_document(presentation, starts):
+    """Course-level document (doc_type course) summarising the presentations
+    of a course, so that courses can be searched without grouping
+    presentations. It has the starts of all presentations (sorted), the
+    next start and the number of future presentations are computed from
+    them when the document is read (feeds that did not change are not
+    reimported). The last start and the number of presentations without a
+    start tell if the course has presentations in the future at any time.
+    :param presentation: one of the presentation documents of the course
+    :param starts: presentation_start of all presentations (None if missing)
+    :return document
+    """
+    document = dict((field, presentation[field]) for field in COURSE_DOCUMENT_FIELDS
+                    if field in presentation)
+    document['presentation_identifier'] = COURSE_DOCUMENT_PREFIX + presentation['course_identifier']
+    document['doc_type'] = 'course'
+    dated = sorted(start for start in starts if start)
+    document['course_presentations_undated'] = len(starts) - len(dated)
+    if dated:
+        document['course_starts'] = dated
+        document['course_last_start'] = dated[-1]
+    return document
+
+
+def check_delta_indexer(indexer):
+    """Delta imports delete presentations that are not in the feed anymore,
+    which needs a search service able to delete documents by ID
+    :param indexer: search service
+    :raise ValueError: if the search service can't delete documents
+    """
+    if not callable(getattr(indexer, 'delete_by_ids', None)):
+        raise ValueError("Delta imports need a search service deleting documents "
+                         "(delete_by_ids), {0} can't".format(type(indexer).__name__))
+
+
+class SkippedPresentation(Exception):
+    """Presentation that can't be imported"""
+
+    def __init__(self, message, reason):
+        super(SkippedPresentation, self).__init__(message)
+        self.reason = reason   # reported in ImportMetrics.skipped
+
+
 class XcriOxImporter(object):
     """Import a feed from an XCRI XML document
     WARNING: as we do need to have ONE unique identifier, preferably not a URI as it needs to be exposed (e.g. GET parameter),
@@ -161,78 +373,268 @@ class XcriOxImporter(object):
     """
 
     def __init__(self, indexer, xcri_file, buffer_size=8192,
-                 handler=XcriOxHandler):
+                 handler=XcriOxHandler, batch_size=500, retries=1,
+                 fingerprints=None, snapshot=None, metrics=None, on_commit=None):
         self.indexer = indexer
         self.xcri_file = xcri_file
         self.buffer_size = buffer_size
         self.handler = handler()
-        self.presentations = []
+        self.batch_size = batch_size
+        self.retries = retries
+        # FingerprintStore, only changes from the previous import are
+        # indexed if this is set (delta mode)
+        self.fingerprints = fingerprints
+        if fingerprints is not None:
+            check_delta_indexer(indexer)
+        # path of the snapshot of transformed documents written by run()
+        self.snapshot = snapshot
         self.ignore_subjects = ['Graduate Training', 'Qualitative', 'Quantitative']
+        self.indexed = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.failed_batches = 0
+        self.previous = {}  # fingerprints from the previous import
+        self.current = {}   # fingerprints of the documents in this import
+        # ImportMetrics, time spent in each stage and skipped presentations
+        self.metrics = metrics or ImportMetrics()
+        # function called once documents have been committed (e.g. bump_generation)
+        self.on_commit = on_commit
 
     def run(self):
-        self.parse()
+        """Import the feed
+        :return ImportMetrics
+        """
+        documents = self.transform(self.parse())
         try:
-            self.indexer.index(self.presentations)
-        except SearchServerException as sse:
-            logger.error("Error when indexing courses", exc_info=True)
+            if self.snapshot:
+                # snapshots only have presentations
+                with SnapshotWriter(self.snapshot) as snapshot:
+                    self.index(self.with_courses(snapshot.tee(documents)))
+            else:
+                self.index(self.with_courses(documents))
+            self.delete_vanished()
         finally:
-            self.indexer.commit()
+            with self.metrics.measure('commit'):
+                self.indexer.commit()
+            if self.on_commit is not None:
+                self.on_commit()
+        self.save_fingerprints()
+        logger.info("Indexed {0} presentations, {1} unchanged, {2} deleted ({3} batches failed)".format(
+            self.indexed, self.unchanged, self.deleted, self.failed_batches))
+        return self.report()
+
+    def report(self):
+        """Metrics of the import, updated with the number of documents
+        indexed, unchanged and deleted so far
+        :return ImportMetrics
+        """
+        self.metrics.counts['indexed'] = self.indexed
+        self.metrics.counts['unchanged'] = self.unchanged
+        self.metrics.counts['deleted'] = self.deleted
+        self.metrics.counts['failed_batches'] = self.failed_batches
+        self.metrics.finish()
+        return self.metrics
+
+    def index(self, documents):
+        """Send documents to the indexer by batches. In delta mode, only
+        documents that changed since the previous import are sent.
+        :param documents: iterable of documents
+        """
+        if self.fingerprints is not None:
+            self.previous = self.fingerprints.load()
+            documents = self._changed_documents(documents, self.previous, self.current)
+        for batch in self._batches(documents):
+            indexed = self._index_batch(batch)
+            if not indexed and self.fingerprints is not None:
+                # forget these documents so they are sent again next time
+                for document in batch:
+                    del self.current[document['presentation_identifier']]
+
+    def delete_vanished(self, keep=()):
+        """In delta mode, delete presentations from the previous import
+        that have not been seen by index()
+        :param keep: (optional) identifiers not to delete (e.g. found in another feed)
+        """
+        if self.fingerprints is not None:
+            self._delete_vanished(self.previous, self.current, keep)
+
+    def save_fingerprints(self):
+        """In delta mode, record fingerprints of the documents seen by index()
+        """
+        if self.fingerprints is not None:
+            self.fingerprints.save(self.current)
 
     def parse(self):
-        parser = sax.make_parser()
-        parser.setContentHandler(self.handler)
-        parser.setFeature(sax.handler.feature_namespaces, 1)
-        parser.parse(self.xcri_file)
-        #buffered_data = self.xcri_file.read(self.buffer_size)
-        #while buffered_data:
-        #    parser.feed(buffered_data)
-        #    buffered_data = self.xcri_file.read(self.buffer_size)
-        #parser.close()
-
-        # transformations
-        for p in self.handler.presentations:
+        """Parse the XCRI document
+        :return generator of presentations as parsed by the handler
+        """
+        xcri_file = self.xcri_file
+        if isinstance(xcri_file, basestring):
+            xcri_file = open(xcri_file)
+        reader = CountingReader(xcri_file)
+        try:
+            for presentation in self.metrics.measure_iter(
+                    'parse', self.handler.iter_presentations(reader, self.buffer_size)):
+                yield presentation
+        finally:
+            self.metrics.stages['parse'].bytes += reader.bytes
+
+    def transform(self, presentations):
+        """Transform parsed presentations to documents to be indexed,
+        presentations that can't be transformed are skipped
+        :param presentations: iterable of presentations from the handler
+        :return generator of documents
+        """
+        for p in presentations:
             try:
-                p['provider_title'] = p['provider_title'][0]
-                p['course_title'] = p['course_title'][0]
-                p['course_identifier'] = self._get_identifier(p['course_identifier'])
-                p['course_description'] = ''.join(p['course_description'])
-                presentation_id = self._get_identifier(p['presentation_identifier'])
-                if not presentation_id:
-                    # Presentation identifier is the main ID for a document
-                    # if there is no ID, we do not want to import it
-                    raise Exception("Presentation with no ID")
-                p['presentation_identifier'] = presentation_id
-                if 'presentation_start' in p:
-                    p['presentation_start'] = self._date_to_solr_format(p['presentation_start'][0])
-                if 'presentation_end' in p:
-                    p['presentation_end'] = self._date_to_solr_format(p['presentation_end'][0])
-                if 'presentation_applyFrom' in p:
-                    p['presentation_applyFrom'] = self._date_to_solr_format(p['presentation_applyFrom'][0])
-                if 'presentation_applyUntil' in p:
-                    p['presentation_applyUntil'] = self._date_to_solr_format(p['presentation_applyUntil'][0])
-                if 'presentation_bookingEndpoint' in p:
-                    p['presentation_bookingEndpoint'] = p['presentation_bookingEndpoint'][0]
-                if 'presentation_memberApplyTo' in p:
-                    p['presentation_memberApplyTo'] = p['presentation_memberApplyTo'][0]
-                if 'presentation_attendanceMode' in p:
-                    p['presentation_attendanceMode'] = p['presentation_attendanceMode'][0]
-                if 'presentation_attendancePattern' in p:
-                    p['presentation_attendancePattern'] = p['presentation_attendancePattern'][0]
-                if 'presentation_venue_identifier' in p:
-                    # we're only interested by OxPoints ID atm
-                    oxpoints = self._get_identifier(p['presentation_venue_identifier'],
-                        uri_base="http://oxpoints.oucs.ox.ac.uk/id/")
-                    if oxpoints:
-                        p['presentation_venue_identifier'] = 'oxpoints:{id}'.format(id=oxpoints)
-                    else:
-                        del p['presentation_venue_identifier']
-
-                p['course_subject'] = [subject for subject in p['course_subject'] if subject not in self.ignore_subjects]
-
-                self.presentations.append(p)
+                with self.metrics.measure('transform'):
+                    document = self._transform_presentation(p)
             except Exception as e:
                 logger.warning("Couldn't transform presentation", exc_info=True,
                     extra={'presentation': p})
+                self.metrics.skipped[getattr(e, 'reason', type(e).__name__)] += 1
+            else:
+                self.metrics.stages['transform'].count += 1
+                yield document
+
+    def with_courses(self, documents):
+        """Mark documents as presentations and add a course document for
+        each course once all presentations have been read (see course_document)
+        :param documents: iterable of presentation documents
+        :return generator of presentation documents then course documents
+        """
+        courses = OrderedDict()     # course identifier -> (presentation, starts)
+        for document in documents:
+            document['doc_type'] = 'presentation'
+            course = courses.get(document['course_identifier'])
+            if course is None:
+                course = courses[document['course_identifier']] = (document, [])
+            course[1].append(document.get('presentation_start'))
+            yield document
+        for presentation, starts in courses.values():
+            yield course_document(presentation, starts)
+        self.metrics.counts['courses'] = len(courses)
+
+    def _transform_presentation(self, p):
+        p['provider_title'] = p['provider_title'][0]
+        p['course_title'] = p['course_title'][0]
+        p['course_identifier'] = self._get_identifier(p['course_identifier'])
+        p['course_description'] = ''.join(p['course_description'])
+        presentation_id = self._get_identifier(p['presentation_identifier'])
+        if not presentation_id:
+            # Presentation identifier is the main ID for a document
+            # if there is no ID, we do not want to import it
+            raise SkippedPresentation("Presentation with no ID", 'no_identifier')
+        p['presentation_identifier'] = presentation_id
+        if 'presentation_start' in p:
+            p['presentation_start'] = self._date_to_solr_format(p['presentation_start'][0])
+        if 'presentation_end' in p:
+            p['presentation_end'] = self._date_to_solr_format(p['presentation_end'][0])
+        if 'presentation_applyFrom' in p:
+            p['presentation_applyFrom'] = self._date_to_solr_format(p['presentation_applyFrom'][0])
+        if 'presentation_applyUntil' in p:
+            p['presentation_applyUntil'] = self._date_to_solr_format(p['presentation_applyUntil'][0])
+        if 'presentation_bookingEndpoint' in p:
+            p['presentation_bookingEndpoint'] = p['presentation_bookingEndpoint'][0]
+        if 'presentation_memberApplyTo' in p:
+            p['presentation_memberApplyTo'] = p['presentation_memberApplyTo'][0]
+        if 'presentation_attendanceMode' in p:
+            p['presentation_attendanceMode'] = p['presentation_attendanceMode'][0]
+        if 'presentation_attendancePattern' in p:
+            p['presentation_attendancePattern'] = p['presentation_attendancePattern'][0]
+        if 'presentation_venue_identifier' in p:
+            # we're only interested by OxPoints ID atm
+            oxpoints = self._get_identifier(p['presentation_venue_identifier'],
+                uri_base="http://oxpoints.oucs.ox.ac.uk/id/")
+            if oxpoints:
+                p['presentation_venue_identifier'] = 'oxpoints:{id}'.format(id=oxpoints)
+            else:
+                del p['presentation_venue_identifier']
+
+        p['course_subject'] = [subject for subject in p['course_subject'] if subject not in self.ignore_subjects]
+        return p
+
+    def _batches(self, items):
+        """Group documents (or identifiers) in lists of at most batch_size items
+        :param items: iterable of documents
+        :return generator of lists
+        """
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _changed_documents(self, documents, previous, current):
+        """Filter out documents that have not changed since the previous import
+        :param documents: iterable of documents
+        :param previous: fingerprints from the previous import
+        :param current: dict updated with fingerprints of all documents seen
+        :return generator of new or modified documents
+        """
+        for document in documents:
+            identifier = document['presentation_identifier']
+            current[identifier] = fingerprint(document)
+            if previous.get(identifier) == current[identifier]:
+                self.unchanged += 1
+            else:
+                yield document
+
+    def _delete_vanished(self, previous, current, keep=()):
+        """Delete documents from the index that are not in the feed anymore
+        :param previous: fingerprints from the previous import
+        :param current: fingerprints of the documents in the feed, updated
+                        with documents that couldn't be deleted
+        :param keep: identifiers not to delete
+        """
+        vanished = [identifier for identifier in previous
+                    if identifier not in current and identifier not in keep]
+        if vanished and not current:
+            # most likely an empty or broken feed rather than an empty catalog
+            logger.error("No presentations in the feed, not deleting {0} presentations".format(
+                len(vanished)))
+            current.update(previous)
+            return
+        for batch in self._batches(vanished):
+            try:
+                with self.metrics.measure('delete'):
+                    self.indexer.delete_by_ids(batch)
+            except SearchServerException:
+                logger.error("Couldn't delete batch of courses", exc_info=True,
+                    extra={'size': len(batch)})
+                self.metrics.failed['delete_error'] += len(batch)
+                for identifier in batch:
+                    current[identifier] = previous[identifier]
+            else:
+                self.deleted += len(batch)
+                self.metrics.stages['delete'].count += len(batch)
+
+    def _index_batch(self, batch):
+        """Send one batch of documents to the indexer, retrying it
+        if the search server fails
+        :param batch: list of documents
+        :return True if the batch has been indexed else False
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with self.metrics.measure('index'):
+                    self.indexer.index(batch)
+            except SearchServerException:
+                logger.warning("Error when indexing batch (attempt {0})".format(attempt + 1),
+                    exc_info=True)
+            else:
+                self.indexed += len(batch)
+                self.metrics.stages['index'].count += len(batch)
+                return True
+        self.failed_batches += 1
+        self.metrics.failed['index_error'] += len(batch)
+        logger.error("Couldn't index batch of courses", extra={
+            'first_presentation': batch[0]['presentation_identifier'],
+            'size': len(batch)})
+        return False
 
     @classmethod
     def _date_to_solr_format(cls, date):
@@ -240,7 +642,7 @@ class XcriOxImporter(object):
         :param date: date to format
         :return date formatted as 2008-01-01T00:00:00Z
         """
-        return parser.parse(date).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return xcri_to_solr(date)
 
     @classmethod
     def _get_identifier(cls, identifiers, uri_base="https://course.data.ox.ac.uk/id/"):
@@ -260,10 +662,71 @@ def main():
     import argparse
     args = argparse.ArgumentParser()
     args.add_argument('xcri_file', type=argparse.FileType('r'))
+    args.add_argument('--batch-size', type=int, default=500)
+    args.add_argument('--parser', choices=HANDLERS.keys(), default='sax')
+    args.add_argument('--snapshot', help="File to keep a snapshot of the parsed catalog in")
+    args.add_argument('--fingerprints', help="File to keep fingerprints between imports "
+                                             "and only index changes (delta mode)")
+    ns = args.parse_args()
+    solr = SolrSearch('courses', 'http://33.33.33.10:8080/solr/')
+    fingerprints = FingerprintStore(ns.fingerprints) if ns.fingerprints else None
+    xcri_importer = XcriOxImporter(solr, ns.xcri_file, batch_size=ns.batch_size,
+                                   handler=HANDLERS[ns.parser],
+                                   fingerprints=fingerprints, snapshot=ns.snapshot)
+    metrics = xcri_importer.run()
+    print(json.dumps(metrics.as_dict(), indent=2, sort_keys=True))
+
+
+def index_snapshots(indexer, paths, batch_size=500, on_commit=None):
+    """Index documents from snapshots of parsed catalogs, e.g. after
+    rebuilding the index, without fetching and parsing feeds again
+    :param indexer: search service
+    :param paths: paths of the snapshots
+    :param batch_size: (optional) number of documents sent to the indexer at once
+    :param on_commit: (optional) function called once documents have been committed
+    :return XcriOxImporter used to index documents
+    """
+    importer = XcriOxImporter(indexer, None, batch_size=batch_size)
+    try:
+        # course documents are rebuilt from the presentations of all snapshots
+        importer.index(importer.with_courses(
+            chain.from_iterable(read_snapshot(path) for path in paths)))
+    finally:
+        with importer.metrics.measure('commit'):
+            indexer.commit()
+        if on_commit is not None:
+            on_commit()
+    importer.report()
+    logger.info("Indexed {0} presentations from snapshots ({1} batches failed)".format(
+        importer.indexed, importer.failed_batches))
+    return importer
+
+
+def reindex_from_snapshot():
+    logging.basicConfig(level=logging.DEBUG)
+    import argparse
+    args = argparse.ArgumentParser(description="Index snapshots written by the importer")
+    args.add_argument('snapshots', nargs='+')
+    args.add_argument('--batch-size', type=int, default=500)
+    ns = args.parse_args()
+    solr = SolrSearch('courses', 'http://33.33.33.10:8080/solr/')
+    index_snapshots(solr, ns.snapshots, batch_size=ns.batch_size)
+
+
+def export_catalog():
+    logging.basicConfig(level=logging.INFO)
+    import argparse
+    import sys
+    from moxie_courses.export import export_courses
+    from moxie_courses.representations import course_lines
+    args = argparse.ArgumentParser(description="Export all courses with their "
+                                               "presentations as newline-delimited JSON")
+    args.add_argument('--output', type=argparse.FileType('w'), default=sys.stdout)
+    args.add_argument('--page-size', type=int, default=1000)
     ns = args.parse_args()
     solr = SolrSearch('courses', 'http://33.33.33.10:8080/solr/')
-    xcri_importer = XcriOxImporter(solr, ns.xcri_file)
-    xcri_importer.run()
+    for line in course_lines(export_courses(solr, page_size=ns.page_size)):
+        ns.output.write(line)
 
 
 if __name__ == '__main__':
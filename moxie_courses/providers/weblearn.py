@@ -10,11 +10,14 @@ logger = logging.getLogger(__name__)
 
 class WebLearnProvider(object):
 
-    def __init__(self, endpoint, supported_hostnames=[]):
+    def __init__(self, endpoint, supported_hostnames=[], timeout=30, name=None):
         self.endpoint = endpoint
+        # time in seconds to wait for WebLearn to answer
+        self.timeout = timeout
 
         endpoint_hostname = urlparse.urlparse(endpoint).hostname
         self.supported_hostnames = supported_hostnames or [endpoint_hostname]
+        self.name = name or endpoint_hostname
 
         self.description_url = endpoint + 'course/cobomo/%s'
         # Authenticated user endpoints
@@ -33,7 +36,7 @@ class WebLearnProvider(object):
         :return: presentation from WL
         """
         _, _, course_id = presentation.booking_endpoint.rpartition('/')
-        response = requests.get(self.description_url % course_id)
+        response = requests.get(self.description_url % course_id, timeout=self.timeout)
         if response.ok:
             return self._parse_course_response(response.json)
         else:
@@ -55,7 +58,7 @@ class WebLearnProvider(object):
         if supervisor_email:
             payload['email'] = supervisor_email
         response = requests.post(self.booking_url, data=payload,
-                                 auth=signer)
+                                 auth=signer, timeout=self.timeout)
         if response.ok:
             return self._parse_course_response(response.json)
         else:
@@ -71,19 +74,25 @@ class WebLearnProvider(object):
         :param booking_id: WebLearn specific ID to represent the booking
         :param signer: oAuth signer
         """
-        response = requests.post(self.withdraw_url % booking_id, auth=signer)
+        response = requests.post(self.withdraw_url % booking_id, auth=signer,
+                                 timeout=self.timeout)
         if response.status_code == 200:
             return True
         else:
             logger.warning(response.text)
             return False
 
-    def user_courses(self, signer):
+    def user_courses(self, signer, timeout=None):
         """List the courses and presentations a user is signed up to attend.
         :param signer: oAuth signer
+        :param timeout: (optional) time in seconds left to the caller,
+                        caps the timeout of the provider
         :return [Course()...]
         """
-        response = requests.get(self.user_courses_url, auth=signer)
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        response = requests.get(self.user_courses_url, auth=signer,
+                                timeout=timeout)
         if response.ok:
             return self._parse_list_response(response.json)
         else:
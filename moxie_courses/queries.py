@@ -0,0 +1,173 @@
+"""Build the queries sent to Solr. The text of the user goes in `q` and
+restrictions in separate filter queries (`fq`), which Solr caches
+independently of `q` (filterCache). The restriction to future presentations
+uses NOW rounded to a configurable unit (e.g. NOW/HOUR) so that it stays
+the same, and is cached, until the next rounding: presentations having
+started since then are still listed.
+"""
+import calendar
+import re
+import time
+
+FUTURE_PRESENTATIONS = 'NOT presentation_start:[* TO {now}]'
+# courses with a presentation in the future (see importers.xcri_ox.course_document)
+FUTURE_COURSES = 'course_last_start:{{{now} TO *] OR course_presentations_undated:[1 TO *]'
+# the index has a document per presentation and per course, documents
+# indexed before course documents existed have no doc_type
+PRESENTATIONS = 'NOT doc_type:course'
+COURSES = 'doc_type:course'
+# number of fields of a UTC time tuple kept when rounding to a unit
+ROUNDING_FIELDS = {'YEAR': 1, 'MONTH': 2, 'DAY': 3, 'HOUR': 4, 'MINUTE': 5, 'SECOND': 6}
+EPOCH = (1970, 1, 1, 0, 0, 0)
+# terms of a text query, phrases ("...") included
+SEARCH_TERM = re.compile(r'(?:[^\s"]+|"[^"]*"?)+')
+OPERATORS = frozenset(['AND', 'OR', 'NOT', 'TO'])
+
+
+def solr_now(rounding=None):
+    """Solr's date math for the current time
+    :param rounding: (optional) unit NOW is rounded down to (e.g. HOUR),
+                     not rounded by default (millisecond resolution)
+    :return e.g. NOW/HOUR
+    """
+    if rounding:
+        return 'NOW/{0}'.format(rounding)
+    return 'NOW'
+
+
+def rounded_now(rounding=None, now=None):
+    """Time NOW stands for in Solr's date math (see solr_now)
+    :param rounding: (optional) see solr_now
+    :param now: (optional) current time, seconds since the epoch
+    :return seconds since the epoch
+    """
+    if now is None:
+        now = time.time()
+    if not rounding:
+        return now
+    size = ROUNDING_FIELDS[rounding]
+    return calendar.timegm(tuple(time.gmtime(now)[:size]) + EPOCH[size:])
+
+
+def future_presentations_filter(rounding=None):
+    """Filter query restricting to presentations starting in the future
+    (or without a start)
+    :param rounding: (optional) see solr_now
+    """
+    return FUTURE_PRESENTATIONS.format(now=solr_now(rounding))
+
+
+def future_courses_filter(rounding=None):
+    """Filter query restricting course documents to courses having
+    presentations in the future (or without a start)
+    :param rounding: (optional) see solr_now
+    """
+    return FUTURE_COURSES.format(now=solr_now(rounding))
+
+
+class SolrQuery(object):
+    """Parameters of a query: text query, filter queries and other
+    parameters (e.g. facets)
+    """
+
+    def __init__(self, q='*:*', **params):
+        """
+        :param q: text query
+        :param params: other parameters of the query
+        """
+        self.q = q
+        self.filters = []
+        self.params = params
+
+    def filter(self, fq):
+        """Add a filter query
+        :param fq: filter query
+        :return self
+        """
+        self.filters.append(fq)
+        return self
+
+    def as_dict(self):
+        """Parameters as expected by the search service, filter queries are
+        repeated `fq` parameters
+        """
+        query = dict(self.params)
+        query['q'] = self.q
+        if len(self.filters) == 1:
+            query['fq'] = self.filters[0]
+        elif self.filters:
+            query['fq'] = list(self.filters)
+        return query
+
+
+def normalise_search(search):
+    """Normalise a text query so that equivalent queries are the same:
+    whitespace is collapsed and, in queries of the default field only,
+    terms are lower cased as text fields are (see the schema). Operators
+    and phrases are kept as they are. Queries naming a field (e.g.
+    course_subject:(Modern History)) may query case sensitive string
+    fields, their case is kept.
+    :param search: text query
+    :return normalised text query
+    """
+    terms = SEARCH_TERM.findall(search)
+    if ':' in search:
+        return ' '.join(terms)
+    return ' '.join(term if '"' in term or term.strip('()') in OPERATORS else term.lower()
+                    for term in terms)
+
+
+def search_courses_query(search, all=False, rounding=None, fields=None):
+    """Full-text search of course documents
+    :param search: text query
+    :param all: (optional) all courses even starting in the past
+    :param rounding: (optional) see solr_now
+    :param fields: (optional) fields returned, all stored fields by default
+    """
+    query = SolrQuery(search).filter(COURSES)
+    if fields:
+        query.params['fl'] = ','.join(fields)
+    if not all:
+        query.filter(future_courses_filter(rounding))
+    return query.as_dict()
+
+
+def subjects_query(all=False, rounding=None):
+    """Subjects of courses with their number of presentations
+    :param all: (optional) count ALL presentations, by default only
+                presentations that start in the future
+    :param rounding: (optional) see solr_now
+    """
+    query = SolrQuery(rows='0',     # we don't need any actual document
+                      facet='true',
+                      **{'facet.field': 'course_subject',
+                         'facet.mincount': '1',
+                         'facet.sort': 'index'})    # Sort alphabetically
+    query.filter(PRESENTATIONS)
+    if not all:
+        query.filter(future_presentations_filter(rounding))
+    return query.as_dict()
+
+
+def course_presentations_query(course_identifier):
+    """All presentations of a course sorted by start
+    :param course_identifier: ID of the course
+    """
+    query = SolrQuery(sort='presentation_start asc').filter(PRESENTATIONS)
+    query.filter('course_identifier:{id}'.format(id=course_identifier))
+    return query.as_dict()
+
+
+def all_presentations_query():
+    """All presentations sorted by identifier (e.g. to page through them)"""
+    return SolrQuery(sort='presentation_identifier asc').filter(PRESENTATIONS).as_dict()
+
+
+def export_query(cursor='*'):
+    """A page of all presentations grouped by course, for cursor paging
+    (cursorMark, Solr 4.7+): the sort ends with the unique key
+    :param cursor: (optional) cursor returned by the previous page (nextCursorMark)
+    """
+    query = SolrQuery(sort='course_identifier asc,presentation_identifier asc',
+                      cursorMark=cursor)
+    return query.filter(PRESENTATIONS).as_dict()
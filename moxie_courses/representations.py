@@ -1,29 +1,133 @@
+import json
 import logging
+import re
 
 from flask import url_for, jsonify
 
+from moxie.core.exceptions import ApplicationException
 from moxie.core.service import ProviderException
 from moxie.core.representations import Representation, HALRepresentation, get_nav_links
 from moxie_courses.services import CourseService
 
 logger = logging.getLogger(__name__)
 
+NDJSON = 'application/x-ndjson'
+
+# values that url_for (werkzeug's converters) does not quote, whatever its version
+URL_SAFE_VALUE = re.compile(r'^[A-Za-z0-9_.:/-]+$')
+
+# fields of courses and presentations that can be requested (sparse fieldsets)
+COURSE_RESPONSE_FIELDS = frozenset(['id', 'title', 'description', 'provider', 'subjects',
+                                    'next_start', 'future_presentations', 'presentations'])
+PRESENTATION_RESPONSE_FIELDS = frozenset(['id', 'location', 'apply_link', 'start', 'end',
+                                          'apply_from', 'apply_until', 'attendance_mode',
+                                          'attendance_pattern', 'study_mode', 'booking_status'])
+
+
+def sparse(response, fields):
+    """Fields of a response restricted to the fields requested, the
+    identifier is always kept
+    :param response: dict
+    :param fields: names of fields, None for all fields
+    :return dict
+    """
+    if fields is None:
+        return response
+    return dict((name, value) for name, value in response.items()
+                if name in fields or name == 'id')
+
+
+def with_presentations(fields):
+    """True if presentations are requested (see sparse)"""
+    return fields is None or 'presentations' in fields
+
+
+def course_values(course, presentations, fields=None):
+    """Fields of a course
+    :param course: Course object
+    :param presentations: presentations already represented (None if not requested)
+    :param fields: (optional) fields requested, all by default
+    :return dict
+    """
+    response = {
+        'id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'provider': course.provider,
+        'subjects': course.subjects,
+        'presentations': presentations
+    }
+    # summary of courses found by searching (see LazyCourse)
+    next_start = getattr(course, 'next_start', None)
+    if next_start:
+        response['next_start'] = next_start.isoformat()
+    future_presentations = getattr(course, 'future_presentations', None)
+    if future_presentations is not None:
+        response['future_presentations'] = future_presentations
+    return sparse(response, fields)
+
+
+def presentation_values(presentation, fields=None):
+    """Fields of a presentation
+    :param presentation: Presentation object
+    :param fields: (optional) fields requested, all by default
+    :return dict
+    """
+    response = {
+        'id': presentation.id,
+        'location': presentation.location,
+        'apply_link': presentation.apply_link,
+        }
+    for name in ('start', 'end', 'apply_from', 'apply_until'):
+        date = presentation.isoformat(name)
+        if date:
+            response[name] = date
+    if presentation.attendance_mode:
+        response['attendance_mode'] = presentation.attendance_mode
+    if presentation.attendance_pattern:
+        response['attendance_pattern'] = presentation.attendance_pattern
+    if presentation.study_mode:
+        response['study_mode'] = presentation.study_mode
+    if presentation.booking_status:
+        response['booking_status'] = presentation.booking_status
+    return sparse(response, fields)
+
+
+class URLTemplate(object):
+    """URL of an endpoint taking one argument, built once with url_for and
+    then completed by concatenating the value of the argument. Values that
+    url_for would quote are given to url_for.
+    """
+    PLACEHOLDER = 'url-template-value'
+
+    def __init__(self, endpoint, argument):
+        """
+        :param endpoint: endpoint (as given to url_for)
+        :param argument: name of the argument
+        """
+        self.endpoint = endpoint
+        self.argument = argument
+        url = url_for(endpoint, **{argument: self.PLACEHOLDER})
+        self.prefix, _, self.suffix = url.partition(self.PLACEHOLDER)
+
+    def __call__(self, value):
+        if URL_SAFE_VALUE.match(value):
+            return self.prefix + value + self.suffix
+        return url_for(self.endpoint, **{self.argument: value})
+
 
 class CourseRepresentation(Representation):
 
-    def __init__(self, course):
+    def __init__(self, course, fields=None):
         self.course = course
-        self.presentations = [PresentationRepresentation(p) for p in course.presentations]
+        self.fields = fields
+        self.presentations = [PresentationRepresentation(p, fields) for p in course.presentations]
 
     def as_dict(self):
-        return {
-            'id': self.course.id,
-            'title': self.course.title,
-            'description': self.course.description,
-            'provider': self.course.provider,
-            'subjects': self.course.subjects,
-            'presentations': [p.as_dict() for p in self.presentations]
-        }
+        presentations = None
+        if with_presentations(self.fields):
+            presentations = [p.as_dict() for p in self.presentations]
+        return course_values(self.course, presentations, self.fields)
 
     def as_json(self):
         return jsonify(self.as_dict())
@@ -31,48 +135,39 @@ class CourseRepresentation(Representation):
 
 class PresentationRepresentation(Representation):
 
-    def __init__(self, presentation):
+    def __init__(self, presentation, fields=None):
         self.presentation = presentation
+        self.fields = fields
 
     def as_dict(self):
-        response = {
-            'id': self.presentation.id,
-            'location': self.presentation.location,
-            'apply_link': self.presentation.apply_link,
-            }
-        if self.presentation.start:
-            response['start'] = self.presentation.start.isoformat()
-        if self.presentation.end:
-            response['end'] = self.presentation.end.isoformat()
-        if self.presentation.apply_from:
-            response['apply_from'] = self.presentation.apply_from.isoformat()
-        if self.presentation.apply_until:
-            response['apply_until'] = self.presentation.apply_until.isoformat()
-        if self.presentation.attendance_mode:
-            response['attendance_mode'] = self.presentation.attendance_mode
-        if self.presentation.attendance_pattern:
-            response['attendance_pattern'] = self.presentation.attendance_pattern
-        if self.presentation.study_mode:
-            response['study_mode'] = self.presentation.study_mode
-        if self.presentation.booking_status:
-            response['booking_status'] = self.presentation.booking_status
-        return response
+        return presentation_values(self.presentation, self.fields)
 
 
 class HALPresentationRepresentation(PresentationRepresentation):
-    def __init__(self, presentation):
-        super(HALPresentationRepresentation, self).__init__(presentation)
+    def __init__(self, presentation, bookable=None, fields=None):
+        """
+        :param presentation: Presentation object
+        :param bookable: (optional) True if a provider can book the
+                         presentation, asked to the service by default
+        :param fields: (optional) fields requested, all by default
+        """
+        super(HALPresentationRepresentation, self).__init__(presentation, fields)
+        self.bookable = bookable
 
     def as_dict(self):
         base = super(HALPresentationRepresentation, self).as_dict()
         representation = HALRepresentation(base)
-        courses_service = CourseService.from_context()
-        try:
-            courses_service.get_provider(self.presentation)
-        except ProviderException:
-            logger.debug('No single provider found for: %s'
-                    % self.presentation.id)
-        else:
+        bookable = self.bookable
+        if bookable is None:
+            try:
+                CourseService.from_context().get_provider(self.presentation)
+            except ProviderException:
+                logger.debug('No single provider found for: %s'
+                        % self.presentation.id)
+                bookable = False
+            else:
+                bookable = True
+        if bookable:
             representation.add_link('book', url_for('.presentation_booking',
                 id=self.presentation.id))
         if self.presentation.location:
@@ -83,16 +178,30 @@ class HALPresentationRepresentation(PresentationRepresentation):
 
 class HALCourseRepresentation(CourseRepresentation):
 
-    def __init__(self, course, endpoint):
-        super(HALCourseRepresentation, self).__init__(course)
-        self.presentations = [HALPresentationRepresentation(p) for p in course.presentations]
+    def __init__(self, course, endpoint, bookable=None, fields=None):
+        """
+        :param course: Course object
+        :param endpoint: endpoint of the course
+        :param bookable: (optional) set of identifiers of presentations
+                         that can be booked (see CourseService.bookable),
+                         asked to the service by default
+        :param fields: (optional) fields requested, all by default
+        """
+        super(HALCourseRepresentation, self).__init__(course, fields)
+        if not with_presentations(fields):
+            bookable = ()
+        elif bookable is None:
+            bookable = CourseService.from_context().bookable(course.presentations)
+        self.presentations = [HALPresentationRepresentation(p, p.id in bookable, fields)
+                              for p in course.presentations]
         self.endpoint = endpoint
 
     def as_dict(self):
         base = super(HALCourseRepresentation, self).as_dict()
-        presentations = base.pop('presentations')
+        presentations = base.pop('presentations', None)
         representation = HALRepresentation(base)
-        representation.add_embed('presentations', presentations)
+        if presentations is not None:
+            representation.add_embed('presentations', presentations)
         representation.add_link('self', url_for(self.endpoint, id=self.course.id))
         return representation.as_dict()
 
@@ -100,6 +209,53 @@ class HALCourseRepresentation(CourseRepresentation):
         return jsonify(self.as_dict())
 
 
+class HALCoursesSerializer(object):
+    """Serialize courses and their presentations to HAL in one pass, with
+    the same output as HALCourseRepresentation but without intermediate
+    representations and with URLs built from templates (see URLTemplate)
+    resolved once per request. HALRepresentation still assembles each
+    object, the order of keys of the dicts (thus the JSON) depends on it.
+    """
+
+    def __init__(self, endpoint, fields=None):
+        """
+        :param endpoint: endpoint of courses
+        :param fields: (optional) fields requested, all by default
+        """
+        self.fields = fields
+        self.course_url = URLTemplate(endpoint, 'id')
+        self.booking_url = URLTemplate('.presentation_booking', 'id')
+        self.poi_url = URLTemplate('places.poidetail', 'ident')
+
+    def course(self, course, bookable):
+        """HAL dict of a course
+        :param course: Course object
+        :param bookable: set of identifiers of presentations that can be booked
+        """
+        presentations = None
+        if with_presentations(self.fields):
+            presentations = [self.presentation(p, p.id in bookable) for p in course.presentations]
+        response = course_values(course, presentations, self.fields)
+        presentations = response.pop('presentations', None)
+        representation = HALRepresentation(response)
+        if presentations is not None:
+            representation.add_embed('presentations', presentations)
+        representation.add_link('self', self.course_url(course.id))
+        return representation.as_dict()
+
+    def presentation(self, presentation, bookable):
+        """HAL dict of a presentation
+        :param presentation: Presentation object
+        :param bookable: True if a provider can book the presentation
+        """
+        representation = HALRepresentation(presentation_values(presentation, self.fields))
+        if bookable:
+            representation.add_link('book', self.booking_url(presentation.id))
+        if presentation.location:
+            representation.add_link('poi', self.poi_url(presentation.location))
+        return representation.as_dict()
+
+
 class CoursesRepresentation(object):
 
     def __init__(self, courses, query=None):
@@ -118,29 +274,79 @@ class CoursesRepresentation(object):
 
 class HALCoursesRepresentation(CoursesRepresentation):
 
-    def __init__(self, courses, start, count, size, endpoint, query=None):
+    def __init__(self, courses, start, count, size, endpoint, query=None, fields=None):
         super(HALCoursesRepresentation, self).__init__(courses, query)
         self.start = start
         self.count = count
         self.size = size
         self.endpoint = endpoint
+        self.fields = fields
 
     def as_dict(self):
         response = {
             'query': self.query,
         }
         # Need to have the '.' before 'course' to correctly pick the URL
-        courses = [HALCourseRepresentation(r, '.course').as_dict() for r in self.courses]
+        # providers of all presentations of the page are resolved at once
+        bookable = CourseService.from_context().bookable(
+            p for course in self.courses for p in course.presentations)
+        serializer = HALCoursesSerializer('.course', self.fields)
+        courses = [serializer.course(course, bookable) for course in self.courses]
         representation = HALRepresentation(response)
         representation.add_embed('courses', courses)
-        representation.add_link('self', url_for(self.endpoint, q=self.query))
-        representation.add_links(get_nav_links(self.endpoint, self.start, self.count, self.size, q=self.query))
+        # links keep the fields requested
+        arguments = {'q': self.query}
+        if self.fields is not None:
+            arguments['fields'] = ','.join(sorted(self.fields))
+        representation.add_link('self', url_for(self.endpoint, **arguments))
+        representation.add_links(get_nav_links(self.endpoint, self.start, self.count, self.size,
+                                               **arguments))
         return representation.as_dict()
 
     def as_json(self):
         return jsonify(self.as_dict())
 
 
+class HALBookingsRepresentation(HALCoursesRepresentation):
+    """Courses booked by a user, with the status of each provider (see
+    UserCourses) so that clients know when some bookings are missing
+    """
+
+    def __init__(self, courses, endpoint):
+        count = len(courses)
+        super(HALBookingsRepresentation, self).__init__(courses, 0, count, count, endpoint)
+
+    def as_dict(self):
+        response = super(HALBookingsRepresentation, self).as_dict()
+        response['providers'] = getattr(self.courses, 'providers', {})
+        return response
+
+
+def course_lines(courses):
+    """Courses with their presentations as newline-delimited JSON, followed
+    by a trailer telling whether the export is complete:
+    {"complete": true, "count": N}, or {"complete": false, "count": N,
+    "error": "..."} if reading courses fails once lines have been sent
+    (before, the exception is raised and can be reported as such)
+    :param courses: iterable of courses
+    :return generator of lines (one course per line)
+    """
+    count = 0
+    try:
+        for course in courses:
+            presentations = [presentation_values(p) for p in course.presentations]
+            yield json.dumps(course_values(course, presentations), sort_keys=True) + '\n'
+            count += 1
+    except ApplicationException:
+        if not count:
+            raise
+        logger.error("Export interrupted after {0} courses".format(count))
+        yield json.dumps({'complete': False, 'count': count,
+                          'error': "Export interrupted"}, sort_keys=True) + '\n'
+        return
+    yield json.dumps({'complete': True, 'count': count}, sort_keys=True) + '\n'
+
+
 class SubjectRepresentation(object):
     def __init__(self, subject):
         self.subject = subject
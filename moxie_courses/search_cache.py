@@ -0,0 +1,104 @@
+"""Results of searches cached in the memory of the process. Entries are
+fresh for a time to live, the least recently used are evicted beyond a
+maximum number of entries, and entries of another version of the index
+(see CourseService.search_courses) are never served. Once expired, an
+entry is still served for a while (stale-while-revalidate) and refreshed
+in the background, so that users do not wait for popular searches.
+"""
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCache(object):
+    """LRU cache of results with a time to live, shared by the threads of
+    a process
+    """
+    _instances = {}
+    _instances_lock = Lock()
+
+    def __init__(self, ttl=60, maxsize=1000, stale=300):
+        """
+        :param ttl: (optional) time in seconds results are fresh for
+        :param maxsize: (optional) maximum number of entries
+        :param stale: (optional) time in seconds results are still served
+                      for once expired, while they are refreshed
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale = stale
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.lock = Lock()
+
+    @classmethod
+    def get_instance(cls, **kwargs):
+        """Cache shared by all the services of the process
+        (one per configuration)
+        """
+        key = tuple(sorted(kwargs.items()))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(**kwargs)
+            return cls._instances[key]
+
+    def get(self, key, compute, version=None):
+        """Result for a key, computed if it is not cached, refreshed in
+        the background if it is stale
+        :param key: normalised parameters of the search
+        :param compute: function computing the result, called without
+                        the context of the request when refreshing
+        :param version: (optional) version of the index
+        :return result
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                # most recently used
+                self.entries[key] = entry
+        if entry is not None and entry[0] == version:
+            age = now - entry[1]
+            if age < self.ttl:
+                return entry[2]
+            if age < self.ttl + self.stale:
+                self._refresh(key, compute, version)
+                return entry[2]
+        result = compute()
+        self._set(key, version, now, result)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _set(self, key, version, computed, result):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (version, computed, result)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def _refresh(self, key, compute, version):
+        """Recompute a stale entry in a thread, once at a time per key"""
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        thread = Thread(target=self._recompute, args=(key, compute, version))
+        thread.daemon = True
+        thread.start()
+
+    def _recompute(self, key, compute, version):
+        computed = time.time()
+        try:
+            self._set(key, version, computed, compute())
+        except Exception:
+            # the stale entry is served until it is too old
+            logger.warning("Couldn't refresh search results", exc_info=True)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
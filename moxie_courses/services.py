@@ -1,51 +1,317 @@
+import hashlib
 import logging
+import time
+import urlparse
+from datetime import datetime
+from multiprocessing.pool import ThreadPool, TimeoutError
+from threading import BoundedSemaphore, Lock
 
-from itertools import chain
-
+from moxie.core.cache import cache
 from moxie.core.service import ProviderService, ProviderException
 from moxie.core.search import searcher, SearchServerException
-from moxie.core.exceptions import ApplicationException
+from moxie.core.exceptions import ApplicationException, NotFound
 
-from moxie_courses.solr import (presentations_to_course_object,
-        presentation_to_presentation_object, subjects_facet_to_subjects_domain)
+from moxie_courses.catalog import CatalogReplica, future_presentations, solr_now
+from moxie_courses.export import export_courses
+from moxie_courses.generation import current_generation, last_import
+from moxie_courses.queries import (search_courses_query, subjects_query,
+        course_presentations_query, rounded_now)
+from moxie_courses.search_cache import SearchCache
+from moxie_courses.solr import (presentations_to_lazy_course, course_document_to_course,
+        presentation_to_presentation_object, subjects_facet_to_subjects_domain,
+        course_summary_fields)
 
 logger = logging.getLogger(__name__)
 
+# thread pools calling providers concurrently, by number of threads
+_pools = {}
+_pools_lock = Lock()
+
+
+def _get_pool(size):
+    """Thread pool shared by the services of the process, created on first
+    use (i.e. after web workers have been forked), with a slot per thread:
+    calls are only submitted when a slot is free so that they never wait
+    in the queue of the pool
+    :param size: number of threads
+    :return tuple (ThreadPool, BoundedSemaphore)
+    """
+    with _pools_lock:
+        if size not in _pools:
+            _pools[size] = (ThreadPool(size), BoundedSemaphore(size))
+        return _pools[size]
+
+
+def _call_provider(slots, deadline, func, *args, **kwargs):
+    """Call a method of a provider in a thread of the pool, given the time
+    left before the deadline as timeout, and free the slot of the call
+    :param slots: semaphore of the pool (see _get_pool)
+    :param deadline: time the caller stops waiting for the result
+    :return tuple (result, time in seconds)
+    :raise TimeoutError: if the deadline has passed
+    """
+    try:
+        start = time.time()
+        if start >= deadline:
+            raise TimeoutError()
+        result = func(*args, timeout=deadline - start, **kwargs)
+        return result, time.time() - start
+    finally:
+        slots.release()
+
+
+def bookings_key(signer):
+    """Cache key of the bookings of a user, from the OAuth access token
+    of the signer (hashed, as it is a credential)
+    :param signer: OAuth signer token of the user
+    :return key or None if the user cannot be identified
+    """
+    token = getattr(getattr(signer, 'client', None), 'resource_owner_key', None)
+    if not token:
+        return None
+    if isinstance(token, unicode):
+        token = token.encode('utf-8')
+    return 'moxie_courses.bookings.{0}'.format(hashlib.sha1(token).hexdigest())
+
+
+def provider_name(provider):
+    """Name identifying a provider in responses and logs"""
+    return getattr(provider, 'name', provider.__class__.__name__)
+
+
+class UserCourses(list):
+    """Courses of a user from all providers. `providers` tells, for each
+    provider, if it answered ('ok'), timed out ('timeout'), failed
+    ('error') or was not asked as all threads were busy ('busy'), and
+    after how long (in seconds).
+    """
+
+    def __init__(self, courses=()):
+        super(UserCourses, self).__init__(courses)
+        self.providers = {}
+
 
 class CourseService(ProviderService):
     default_search = '*'
 
+    def __init__(self, providers={}, catalog=None, cache_timeout=86400,
+                 negative_cache_timeout=600, providers_timeout=10,
+                 providers_pool_size=10, bookings_cache_timeout=60,
+                 now_rounding='HOUR', search_cache=None, search_max_count=100):
+        """
+        :param providers: providers of courses
+        :param catalog: (optional) dict of arguments of CatalogReplica
+                        (e.g. max_age), subjects and presentations of
+                        courses are then listed from an in-memory copy of
+                        the catalog rather than from Solr
+        :param cache_timeout: (optional) time in seconds courses and
+                              presentations are cached for, the cache is
+                              invalidated by imports anyway
+        :param negative_cache_timeout: (optional) time in seconds unknown
+                                       identifiers are cached for
+        :param providers_timeout: (optional) time in seconds given to each
+                                  provider to list the courses of a user
+        :param providers_pool_size: (optional) number of threads calling providers
+        :param bookings_cache_timeout: (optional) time in seconds the
+                                       bookings of a user are cached for
+        :param now_rounding: (optional) unit the current time is rounded
+                             down to when querying presentations in the
+                             future, so that Solr caches the restriction
+                             (None to not round it)
+        :param search_cache: (optional) dict of arguments of SearchCache
+                             (e.g. ttl, maxsize, stale), results of
+                             searches are then cached in memory
+        :param search_max_count: (optional) maximum number of courses
+                                 returned by a search
+        """
+        super(CourseService, self).__init__(providers)
+        self.catalog = None
+        if catalog is not None:
+            self.catalog = CatalogReplica.get_instance(searcher, generation=current_generation,
+                                                       **catalog)
+        self.cache_timeout = cache_timeout
+        self.negative_cache_timeout = negative_cache_timeout
+        self.providers_timeout = providers_timeout
+        self.providers_pool_size = providers_pool_size
+        self.bookings_cache_timeout = bookings_cache_timeout
+        self.now_rounding = now_rounding
+        self.search_cache = None
+        if search_cache is not None:
+            self.search_cache = SearchCache.get_instance(**search_cache)
+        self.search_max_count = search_max_count
+        self._build_routes()
+
+    def _build_routes(self):
+        """Routing table of providers by hostname of the booking endpoint,
+        from their supported_hostnames (first provider wins, as in
+        get_provider). Providers without supported_hostnames are asked
+        if they handle a presentation when no route matches.
+        """
+        self.routes = {}
+        self.unrouted_providers = []
+        for provider in self.providers:
+            hostnames = getattr(provider, 'supported_hostnames', None)
+            if hostnames is None:
+                self.unrouted_providers.append(provider)
+            else:
+                for hostname in hostnames:
+                    self.routes.setdefault(hostname, provider)
+
+    def _route(self, presentation):
+        """Provider of a presentation
+        :param presentation: Presentation object
+        :return provider or None
+        """
+        endpoint = presentation.booking_endpoint
+        if endpoint:
+            provider = self.routes.get(urlparse.urlsplit(endpoint).hostname)
+            if provider is not None:
+                return provider
+        for provider in self.unrouted_providers:
+            if provider.handles(presentation):
+                return provider
+        return None
+
+    def get_provider(self, presentation):
+        """Provider able to book a presentation
+        :param presentation: Presentation object
+        :return provider
+        :raise ProviderException: if no provider handles the presentation
+        """
+        provider = self._route(presentation)
+        if provider is None:
+            raise ProviderException()
+        return provider
+
+    def bookable(self, presentations):
+        """Presentations that have a provider, resolved in one pass (each
+        booking endpoint is routed once)
+        :param presentations: iterable of Presentation objects
+        :return set of identifiers of presentations
+        """
+        routes = {}
+        identifiers = set()
+        for presentation in presentations:
+            endpoint = presentation.booking_endpoint
+            if endpoint not in routes:
+                routes[endpoint] = self._route(presentation)
+            if routes[endpoint] is not None:
+                identifiers.add(presentation.id)
+        return identifiers
+
     def my_courses(self, signer):
-        """List all courses booked by an user
+        """List all courses booked by an user, cached for a short time
+        (only if all providers answered) and until the user books or
+        withdraws from a presentation
         :param signer: OAuth signer token of the user
-        :return list of Course objects
+        :return UserCourses (list of Course objects), courses of providers
+                that failed or didn't answer in time are missing
         """
-        return list(chain(*[p.user_courses(signer=signer) for p in self.providers]))
+        key = bookings_key(signer)
+        if key:
+            courses = cache.get(key)
+            if courses is not None:
+                return courses
+        courses = self._user_courses(signer)
+        if key and all(p['status'] == 'ok' for p in courses.providers.values()):
+            cache.set(key, courses, timeout=self.bookings_cache_timeout)
+        return courses
 
-    def search_courses(self, search, start, count, all=False):
-        """Search for courses
-        :param search: search query (FTS)
+    def _user_courses(self, signer):
+        """Ask all providers for the courses booked by an user, concurrently
+        :param signer: OAuth signer token of the user
+        :return UserCourses
+        """
+        pool, slots = _get_pool(self.providers_pool_size)
+        start = time.time()
+        deadline = start + self.providers_timeout
+        calls = []
+        for provider in self.providers:
+            call = None
+            if slots.acquire(False):
+                # providers are given the time left as timeout of their requests
+                call = pool.apply_async(_call_provider, (slots, deadline, provider.user_courses),
+                                        {'signer': signer})
+            calls.append((provider, call))
+        courses = UserCourses()
+        for provider, call in calls:
+            name = provider_name(provider)
+            if call is None:
+                logger.warning("No thread available to list courses of the user",
+                               extra={'provider': name})
+                courses.providers[name] = {'status': 'busy', 'latency': 0}
+                continue
+            try:
+                provider_courses, latency = call.get(timeout=max(deadline - time.time(), 0))
+            except TimeoutError:
+                status, latency = 'timeout', time.time() - start
+                logger.warning("Provider didn't list courses of the user in time",
+                               extra={'provider': name})
+            except Exception:
+                status, latency = 'error', time.time() - start
+                logger.error("Provider couldn't list courses of the user",
+                             exc_info=True, extra={'provider': name})
+            else:
+                status = 'ok'
+                courses.extend(provider_courses)
+            courses.providers[name] = {'status': status, 'latency': latency}
+        logger.debug("Listed courses of the user", extra={'providers': courses.providers})
+        return courses
+
+    def _rounded_now(self):
+        """Current time as rounded in queries (see now_rounding), which
+        responses derived from the index depend on
+        :return seconds since the epoch, None if the current time is not
+                rounded: responses are then considered to only change with
+                imports, rather than on every request
+        """
+        if self.now_rounding:
+            return rounded_now(self.now_rounding)
+        return None
+
+    def validators(self, *parts):
+        """Validators of a response derived from the index, known without
+        querying it: the response changes with imports and when the current
+        time, rounded as in queries (see now_rounding), changes
+        :param parts: what else the response depends on (e.g. parameters)
+        :return tuple (ETag, Last-Modified as a UTC datetime)
+        """
+        now = self._rounded_now()
+        etag = hashlib.sha1(repr((current_generation(), now) + parts)).hexdigest()
+        modified = max(last_import(), now)
+        return etag, datetime.utcfromtimestamp(int(modified))
+
+    def search_courses(self, search, start, count, all=False, fields=None):
+        """Search for courses (course documents, see importers.xcri_ox.course_document)
+        :param search: search query (FTS), see queries.normalise_search
+        :param start: first result
+        :param count: number of results
         :param all: (optional) all courses even starting in the past
-        :return list of courses (titles and identifiers)
-        """
-        # TODO search parameters for Solr. Should be made generic. Discuss.
-        q = {'q': search,
-             'group': 'true',
-             'group.field': 'course_identifier',
-             'group.count': '1',
-             'group.ngroups': 'true',
-             # 'fl': 'course_title,course_identifier,course_description',
-             }
-        if not all:
-            q['q'] += ' AND NOT presentation_start:[* TO NOW]'
+        :param fields: (optional) attributes of courses needed, only their
+                       fields are fetched from Solr (all by default)
+        :return tuple (list of courses without presentations, number of courses found)
+        """
+        fl = course_summary_fields(fields) if fields is not None else None
+        q = search_courses_query(search, all=all, rounding=self.now_rounding, fields=fl)
+        if self.search_cache is None:
+            return self._search_courses(searcher, q, start, count)
+        # resolved here as results may be refreshed outside of the request
+        search_service = getattr(searcher, '_get_current_object', lambda: searcher)()
+        # results depend on the import and on NOW as rounded in the query
+        version = (current_generation(), self._rounded_now())
+        return self.search_cache.get((search, start, count, all, fl and tuple(fl)),
+            lambda: self._search_courses(search_service, q, start, count), version)
+
+    def _search_courses(self, search_service, q, start, count):
         try:
-            results = searcher.search(q, start=start, count=count)
+            results = search_service.search(q, start=start, count=count)
         except SearchServerException:
             raise ApplicationException()
-        courses = []
-        for group in results.as_dict['grouped']['course_identifier']['groups']:
-            courses.append(presentations_to_course_object(group['doclist']['docs']))
-        return courses, results.as_dict['grouped']['course_identifier']['ngroups']
+        # same time as NOW in the query
+        now = solr_now(self.now_rounding)
+        courses = [course_document_to_course(document, now=now)
+                   for document in results.results]
+        return courses, results.as_dict['response']['numFound']
 
     def list_courses_subjects(self, all=False):
         """List all subjects from courses
@@ -53,16 +319,9 @@ class CourseService(ProviderService):
                     that have actual presentations in the future
         :return dict with subject, count of presentations for this subject
         """
-        q = {'facet': 'true',
-              'facet.field': 'course_subject',
-              'facet.mincount': '1',
-              'facet.sort': 'index',    # Sort alphabetically
-              'rows': '0',  # we don't need any actual document
-              }
-        if all:
-            q['q'] = '*:*'
-        else:
-            q['q'] = 'NOT presentation_start:[* TO NOW]'
+        if self.catalog is not None:
+            return self.catalog.get().subjects(all=all, now=solr_now(self.now_rounding))
+        q = subjects_query(all=all, rounding=self.now_rounding)
         results = searcher.search(q, start=0, count=1000)   # Do not paginate
         subjects = subjects_facet_to_subjects_domain(results)
         return subjects
@@ -72,17 +331,23 @@ class CourseService(ProviderService):
         :param course_identifier: ID of the course
         :param all: (optional) list ALL presentations, by default only
                     presentations that start in the future
-        :return list of presentations
+        :return course with its presentations or None if there is none
         """
-        q = {'fq': 'course_identifier:{id}'.format(id=course_identifier),
-                'sort': 'presentation_start asc'}
-        if all:
-            q['q'] = '*:*'
+        # presentations are filtered as in queries, against NOW rounded
+        now = solr_now(self.now_rounding)
+        if self.catalog is not None:
+            presentations = self.catalog.get().presentations(course_identifier,
+                                                             all=all, now=now)
         else:
-            q['q'] = 'NOT presentation_start:[* TO NOW]'
-        results = searcher.search(q, start=0, count=1000)   # Do not paginate
-        if results.results:
-            course = presentations_to_course_object(results.results)
+            # all presentations are cached, past ones are filtered out here
+            q = course_presentations_query(course_identifier)
+            presentations = self._cached_documents('course', course_identifier,
+                # Do not paginate
+                lambda: searcher.search(q, start=0, count=1000).results)
+            if not all:
+                presentations = future_presentations(presentations, now=now)
+        if presentations:
+            course = presentations_to_lazy_course(presentations)
             reference = course.presentations[0]
             # "augmenting" our results with "live" information from providers
             try:
@@ -95,9 +360,24 @@ class CourseService(ProviderService):
                 if provider_information:
                     pass
                 # TODO augment data // or replace?
+            return course
         else:
             return None
 
+    def export_courses(self, page_size=1000):
+        """All courses with all their presentations, read from Solr as
+        they are consumed (see export.export_courses)
+        :param page_size: (optional) number of documents fetched per query
+        :return generator of courses
+        :raise ApplicationException: if the search server fails
+        """
+        try:
+            for course in export_courses(searcher, page_size):
+                yield course
+        except SearchServerException:
+            logger.error("Couldn't export the catalog", exc_info=True)
+            raise ApplicationException()
+
     def book_presentation(self, id, message, user_signer,
             supervisor_email=None):
         """Book a presentation
@@ -107,8 +387,7 @@ class CourseService(ProviderService):
         :param supervisor_email: (optional) email of the supervisor
         :return True if booking succeeded else False
         """
-        result = searcher.get_by_ids([id])
-        course = presentation_to_presentation_object(result.results[0])
+        course = self._get_presentation(id)
         presentation = course.presentations[0]
         try:
             provider = self.get_provider(presentation)
@@ -117,8 +396,10 @@ class CourseService(ProviderService):
                     extra={'presentation_id': id})
             return False
         else:
-            return provider.book(presentation, message, user_signer,
+            booked = provider.book(presentation, message, user_signer,
                     supervisor_email)
+            self._forget_bookings(user_signer)
+            return booked
 
     def withdraw(self, id, user_signer):
         """Withdraw the authenticated from a presentation they're enrolled on.
@@ -131,8 +412,7 @@ class CourseService(ProviderService):
         :param user_signer: oAuth token of the user
         :return True if withdrawing from the course succeeded else False
         """
-        result = searcher.get_by_ids([id])
-        course = presentation_to_presentation_object(result.results[0])
+        course = self._get_presentation(id)
         presentation = course.presentations[0]
         user_courses = self.my_courses(user_signer)
         try:
@@ -149,4 +429,48 @@ class CourseService(ProviderService):
                     extra={'presentation_id': id})
             return False
         else:
-            return provider.withdraw(upres.booking_id, user_signer)
+            withdrawn = provider.withdraw(upres.booking_id, user_signer)
+            self._forget_bookings(user_signer)
+            return withdrawn
+
+    def _forget_bookings(self, signer):
+        """Remove the bookings of a user from the cache, after they have
+        (or might have) changed
+        :param signer: OAuth signer token of the user
+        """
+        key = bookings_key(signer)
+        if key:
+            cache.delete(key)
+
+    def _get_presentation(self, id):
+        """Get a presentation by its identifier
+        :param id: unique identifier of the presentation
+        :return Presentation/Course object
+        :raise NotFound: if there is no such presentation
+        """
+        documents = self._cached_documents('presentation', id,
+            lambda: [document for document in searcher.get_by_ids([id]).results
+                     if document.get('doc_type') != 'course'])
+        if not documents:
+            raise NotFound()
+        return presentation_to_presentation_object(documents[0])
+
+    def _cached_documents(self, kind, id, query):
+        """Documents from Solr, cached until the next import (the import
+        generation is part of the key). Unknown identifiers are cached too,
+        for a shorter time, so that they don't hit Solr every time.
+        :param kind: kind of identifier (e.g. course)
+        :param id: identifier
+        :param query: function returning the documents from Solr
+        :return list of documents, empty if the identifier is unknown
+        """
+        if isinstance(id, unicode):
+            id = id.encode('utf-8')
+        key = 'moxie_courses.{kind}.{generation}.{id}'.format(kind=kind,
+            generation=current_generation(), id=hashlib.sha1(id).hexdigest())
+        documents = cache.get(key)
+        if documents is None:
+            documents = query()
+            cache.set(key, documents, timeout=self.cache_timeout if documents
+                      else self.negative_cache_timeout)
+        return documents
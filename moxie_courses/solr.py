@@ -1,49 +1,139 @@
-from datetime import datetime
+from bisect import bisect_right
 from itertools import izip
 
-from moxie_courses.domain import Course, Presentation, Subject
+from moxie_courses.catalog import solr_now
+from moxie_courses.dates import solr_to_datetime
+from moxie_courses.domain import (Course, Presentation, Subject, LazyCourse,
+        LazyPresentation)
 
-SOLR_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Fields of a Course: (Solr field, attribute, function decoding the value).
+# Fields missing from a document keep the default value of the attribute.
+COURSE_FIELDS = (
+    ('course_title', 'title', None),
+    ('course_description', 'description', None),
+    ('provider_title', 'provider', None),
+    ('course_subject', 'subjects', None),
+)
+
+# Fields of course documents (doc_type course) needed, in addition to
+# COURSE_FIELDS, for attributes computed when the document is read
+# (see course_document_to_course)
+COURSE_SUMMARY_FIELDS = {
+    'next_start': ('course_starts',),
+    'future_presentations': ('course_starts', 'course_presentations_undated'),
+}
+
+# Fields of a Presentation, see COURSE_FIELDS
+PRESENTATION_FIELDS = (
+    ('presentation_start', 'start', solr_to_datetime),
+    ('presentation_end', 'end', solr_to_datetime),
+    ('presentation_applyFrom', 'apply_from', solr_to_datetime),
+    ('presentation_applyUntil', 'apply_until', solr_to_datetime),
+    ('presentation_bookingEndpoint', 'booking_endpoint', None),
+    ('presentation_memberApplyTo', 'apply_link', None),
+    ('presentation_attendanceMode', 'attendance_mode', None),
+    ('presentation_attendancePattern', 'attendance_pattern', None),
+    ('presentation_studyMode', 'study_mode', None),
+    ('presentation_venue_identifier', 'location', None),
+)
+
+
+def compile_decoder(fields, name='decode'):
+    """Compile a field map into a function setting attributes of an object
+    from a Solr document. The function is generated once with one branch
+    per field, so decoding a document does not loop over the field map.
+    :param fields: sequence of (Solr field, attribute, function decoding the value or None)
+    :param name: (optional) name of the function
+    :return function(document, obj) returning obj
+    """
+    namespace = {}
+    lines = ['def {name}(document, obj):'.format(name=name)]
+    for i, (field, attribute, decoder) in enumerate(fields):
+        value = 'document[{field!r}]'.format(field=field)
+        if decoder is not None:
+            namespace['decoder_{0}'.format(i)] = decoder
+            value = 'decoder_{0}({1})'.format(i, value)
+        lines.append('    if {field!r} in document:'.format(field=field))
+        lines.append('        obj.{attribute} = {value}'.format(attribute=attribute, value=value))
+    lines.append('    return obj')
+    exec('\n'.join(lines), namespace)
+    return namespace[name]
+
+
+decode_course = compile_decoder(COURSE_FIELDS, 'decode_course')
+decode_presentation = compile_decoder(PRESENTATION_FIELDS, 'decode_presentation')
+
+# LazyPresentation: fields without a decoder are copied when the object is
+# created, other fields are decoded on first access (attribute -> (field, decoder))
+copy_presentation = compile_decoder([(field, attribute, decoder) for field, attribute, decoder
+                                     in PRESENTATION_FIELDS if decoder is None], 'copy_presentation')
+PRESENTATION_LAZY_ATTRIBUTES = dict((attribute, (field, decoder)) for field, attribute, decoder
+                                    in PRESENTATION_FIELDS if decoder is not None)
+
+
+def course_summary_fields(attributes):
+    """Fields of course documents needed to decode some attributes of
+    courses, e.g. to restrict the fields returned by Solr (fl)
+    :param attributes: names of attributes (see COURSE_FIELDS and COURSE_SUMMARY_FIELDS)
+    :return list of fields, with the identifier of the course
+    """
+    fields = ['course_identifier'] + [field for field, attribute, decoder in COURSE_FIELDS
+                                      if attribute in attributes]
+    for attribute, summary_fields in sorted(COURSE_SUMMARY_FIELDS.items()):
+        if attribute in attributes:
+            fields.extend(field for field in summary_fields if field not in fields)
+    return fields
 
 
 def presentations_to_course_object(solr_response):
     """Transform a list of presentations from Solr to a Course object
-    :param solr_response: dict from Solr
+    :param solr_response: list of documents from Solr (presentations of the same course)
     :return Course object
     """
     reference = solr_response[0]
-    course = Course(reference['course_identifier'])
-    course.title = reference['course_title']
-    course.description = reference['course_description']
-    course.provider = reference['provider_title']
-    if 'course_subject' in reference:
-        course.subjects = reference['course_subject']
-    else:
-        course.subjects = []
-    for result in solr_response:
-        presentation = Presentation(result['presentation_identifier'], course)
-        if 'presentation_start' in result:
-            presentation.start = datetime.strptime(result['presentation_start'], SOLR_DATE_FORMAT)
-        if 'presentation_end' in result:
-            presentation.end = datetime.strptime(result['presentation_end'], SOLR_DATE_FORMAT)
-        if 'presentation_applyFrom' in result:
-            presentation.apply_from = datetime.strptime(result['presentation_applyFrom'], SOLR_DATE_FORMAT)
-        if 'presentation_applyUntil' in result:
-            presentation.apply_until = datetime.strptime(result['presentation_applyUntil'], SOLR_DATE_FORMAT)
-        if 'presentation_bookingEndpoint' in result:
-            presentation.booking_endpoint = result['presentation_bookingEndpoint']
-        if 'presentation_memberApplyTo' in result:
-            presentation.apply_link = result['presentation_memberApplyTo']
-        if 'presentation_attendanceMode' in result:
-            presentation.attendance_mode = result['presentation_attendanceMode']
-        if 'presentation_attendancePattern' in result:
-            presentation.attendance_pattern = result['presentation_attendancePattern']
-        if 'presentation_studyMode' in result:
-            presentation.study_mode = result['presentation_studyMode']
-        if 'presentation_venue_identifier' in result:
-            presentation.location = result['presentation_venue_identifier']
-
-        course.presentations.append(presentation)
+    course = decode_course(reference, Course(reference['course_identifier']))
+    course.presentations = [decode_presentation(result, Presentation(result['presentation_identifier'], course))
+                            for result in solr_response]
+    return course
+
+
+def presentations_to_lazy_course(solr_response):
+    """Transform a list of presentations from Solr to a LazyCourse object,
+    fields are only decoded when they are accessed
+    :param solr_response: list of documents from Solr (presentations of the same course)
+    :return LazyCourse object
+    """
+    reference = solr_response[0]
+    course = decode_course(reference, LazyCourse(reference['course_identifier'], reference))
+    course.presentations = [copy_presentation(result, LazyPresentation(
+                                result['presentation_identifier'], course, result,
+                                PRESENTATION_LAZY_ATTRIBUTES))
+                            for result in solr_response]
+    return course
+
+
+def course_document_to_course(solr_response, now=None):
+    """Transform a course document (doc_type course) from Solr to a
+    LazyCourse object, without presentations. The start of the next
+    presentation and the number of presentations in the future are
+    computed from the starts of all presentations (course_starts, sorted)
+    against now, as catalog.future_presentations does.
+    :param solr_response: document from Solr
+    :param now: (optional) current time formatted as in Solr
+    :return LazyCourse object
+    """
+    course = decode_course(solr_response, LazyCourse(solr_response['course_identifier'],
+                                                     solr_response))
+    starts = solr_response.get('course_starts')
+    if starts is None and 'course_presentations_undated' not in solr_response:
+        return course
+    starts = starts or []
+    first_future = bisect_right(starts, now or solr_now())
+    if first_future < len(starts):
+        course.next_start = solr_to_datetime(starts[first_future])
+    course.future_presentations = (len(starts) - first_future
+                                   + solr_response.get('course_presentations_undated', 0))
     return course
 
 
@@ -52,35 +142,7 @@ def presentation_to_presentation_object(solr_response):
     :param solr_response: document from Solr
     :return Presentation/Course object
     """
-    course = Course(solr_response['course_identifier'])
-    course.title = solr_response['course_title']
-    course.description = solr_response['course_description']
-    course.provider = solr_response['provider_title']
-    course.subjects = solr_response['course_subject']
-    presentation = Presentation(solr_response['presentation_identifier'], course)
-    if 'presentation_start' in solr_response:
-        presentation.start = datetime.strptime(solr_response['presentation_start'], SOLR_DATE_FORMAT)
-    if 'presentation_end' in solr_response:
-        presentation.end = datetime.strptime(solr_response['presentation_end'], SOLR_DATE_FORMAT)
-    if 'presentation_applyFrom' in solr_response:
-        presentation.apply_from = datetime.strptime(solr_response['presentation_applyFrom'], SOLR_DATE_FORMAT)
-    if 'presentation_applyUntil' in solr_response:
-        presentation.apply_until = datetime.strptime(solr_response['presentation_applyUntil'], SOLR_DATE_FORMAT)
-    if 'presentation_bookingEndpoint' in solr_response:
-        presentation.booking_endpoint = solr_response['presentation_bookingEndpoint']
-    if 'presentation_memberApplyTo' in solr_response:
-        presentation.apply_link = solr_response['presentation_memberApplyTo']
-    if 'presentation_attendanceMode' in solr_response:
-        presentation.attendance_mode = solr_response['presentation_attendanceMode']
-    if 'presentation_attendancePattern' in solr_response:
-        presentation.attendance_pattern = solr_response['presentation_attendancePattern']
-    if 'presentation_studyMode' in solr_response:
-        presentation.study_mode = solr_response['presentation_studyMode']
-    if 'presentation_venue_identifier' in solr_response:
-        presentation.location = solr_response['presentation_venue_identifier']
-
-    course.presentations.append(presentation)
-    return course
+    return presentations_to_course_object([solr_response])
 
 
 def subjects_facet_to_subjects_domain(solr_response):
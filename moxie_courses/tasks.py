@@ -1,10 +1,16 @@
+import json
 import logging
+import os
 
 from moxie import create_app
-from moxie.core.tasks import get_resource
 from moxie.core.search import searcher
 from moxie.worker import celery
-from moxie_courses.importers.xcri_ox import XcriOxImporter
+from moxie_courses.generation import bump_generation
+from moxie_courses.importers.xcri_ox import HANDLERS, index_snapshots
+from moxie_courses.importers.delta import feed_path
+from moxie_courses.importers.fetch import FeedState
+from moxie_courses.importers.multi import XcriOxMultiImporter
+from moxie_courses.importers.swap import SolrCoreSwap
 
 logger = logging.getLogger(__name__)
 BLUEPRINT_NAME = 'courses'
@@ -12,9 +18,83 @@ BLUEPRINT_NAME = 'courses'
 
 @celery.task
 def import_xcri_ox(force_update=False):
+    """Import XCRI feeds. If XCRI_IMPORT_STAGING is configured (dict with
+    server_url, core and staging_core) the whole catalog is indexed in the
+    staging core, which is swapped with the live core if it is complete.
+    :return metrics of the import as a dict (see ImportMetrics), also
+            appended to XCRI_IMPORT_METRICS_FILE if configured
+    """
     app = create_app()
-    url = app.config['XCRI_IMPORT_URL']
+    urls = app.config.get('XCRI_IMPORT_URLS') or [app.config['XCRI_IMPORT_URL']]
     with app.blueprint_context(BLUEPRINT_NAME):
-        xcri = get_resource(url, force_update)
-        xcri_importer = XcriOxImporter(searcher, xcri, timeout=600)
-        xcri_importer.run()
+        state_path = app.config.get('XCRI_IMPORT_STATE_FILE')
+        state = FeedState(state_path) if state_path else None
+        staging = app.config.get('XCRI_IMPORT_STAGING')
+        fingerprints = None
+        on_commit = None
+        if staging:
+            # the staging core is rebuilt from all feeds
+            swap = SolrCoreSwap(**staging)
+            indexer = swap.staging_searcher()
+            force_update = True
+        else:
+            indexer = searcher
+            on_commit = bump_generation
+            if not force_update:
+                fingerprints = app.config.get('XCRI_FINGERPRINTS_FILE')
+        importer = XcriOxMultiImporter(indexer, urls,
+                processes=app.config.get('XCRI_IMPORT_PROCESSES'),
+                timeout=app.config.get('XCRI_IMPORT_TIMEOUT', 3600),
+                handler=HANDLERS[app.config.get('XCRI_IMPORT_PARSER', 'sax')],
+                batch_size=app.config.get('XCRI_IMPORT_BATCH_SIZE', 500),
+                state=state, fingerprints=fingerprints,
+                snapshots=app.config.get('XCRI_SNAPSHOT_FILE'), force_update=force_update,
+                on_commit=on_commit)
+        try:
+            metrics = importer.run().as_dict()
+            logger.info("Import finished in {0:.1f}s".format(metrics['wall']),
+                        extra={'metrics': metrics})
+            metrics_path = app.config.get('XCRI_IMPORT_METRICS_FILE')
+            if metrics_path:
+                # one JSON document per line, to follow imports over time
+                with open(metrics_path, 'a') as f:
+                    f.write(json.dumps(metrics, sort_keys=True) + '\n')
+            if staging:
+                if not importer.complete:
+                    logger.error("Import incomplete, not swapping the staging core")
+                    return metrics
+                swap.validate(indexer, len(importer.identifiers))
+                swap.swap()
+                bump_generation()
+            # snapshots of a rejected import don't replace the previous ones
+            importer.promote_snapshots()
+        finally:
+            importer.discard_snapshots()
+        return metrics
+
+
+@celery.task
+def rollback_xcri_ox():
+    """Swap back the previous index built by import_xcri_ox in staging mode
+    """
+    app = create_app()
+    with app.blueprint_context(BLUEPRINT_NAME):
+        SolrCoreSwap(**app.config['XCRI_IMPORT_STAGING']).rollback()
+        bump_generation()
+
+
+@celery.task
+def reindex_xcri_ox_from_snapshots():
+    """Index the snapshots kept by import_xcri_ox (XCRI_SNAPSHOT_FILE),
+    e.g. after the index has been rebuilt or its schema has changed
+    """
+    app = create_app()
+    urls = app.config.get('XCRI_IMPORT_URLS') or [app.config['XCRI_IMPORT_URL']]
+    with app.blueprint_context(BLUEPRINT_NAME):
+        paths = [feed_path(app.config['XCRI_SNAPSHOT_FILE'], url) for url in urls]
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            logger.warning("No snapshot for some feeds", extra={'paths': missing})
+        index_snapshots(searcher, [path for path in paths if path not in missing],
+                        batch_size=app.config.get('XCRI_IMPORT_BATCH_SIZE', 500),
+                        on_commit=bump_generation)
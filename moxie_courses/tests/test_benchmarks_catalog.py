@@ -0,0 +1,32 @@
+import unittest
+from StringIO import StringIO
+
+from mock import Mock
+from moxie.core.search import SearchService
+
+from moxie_courses.benchmarks.catalog import generate_catalog
+from moxie_courses.importers.xcri_ox import XcriOxImporter
+
+
+class GenerateCatalogTestCase(unittest.TestCase):
+
+    def test_generate_catalog(self):
+        catalog = StringIO()
+        generate_catalog(catalog, 10, providers=2, presentations_per_course=3)
+        catalog.seek(0)
+        mock_index = Mock(spec=SearchService)
+        importer = XcriOxImporter(mock_index, catalog, batch_size=100)
+        importer.run()
+        documents = [d for d in mock_index.index.call_args[0][0]
+                     if d['doc_type'] == 'presentation']
+        self.assertEqual(len(documents), 10)
+        self.assertEqual(len(set(d['course_identifier'] for d in documents)), 3)
+        self.assertEqual(len(set(d['provider_title'] for d in documents)), 2)
+        self.assertEqual(documents[-1]['presentation_identifier'],
+                         'synthetic-presentation-9')
+        for field in ['presentation_start', 'presentation_end', 'presentation_applyFrom',
+                      'presentation_applyUntil', 'presentation_venue_identifier',
+                      'presentation_bookingEndpoint', 'presentation_memberApplyTo',
+                      'presentation_attendanceMode', 'presentation_attendancePattern',
+                      'presentation_studyMode', 'course_description', 'course_subject']:
+            self.assertTrue(field in documents[0], field)
@@ -0,0 +1,20 @@
+import unittest
+from datetime import datetime
+
+from moxie_courses.benchmarks.queries import (legacy_query, replay, resolve,
+                                              rounded_query, synthetic_log)
+
+
+class ReplayQueriesTestCase(unittest.TestCase):
+
+    def test_resolve(self):
+        now = datetime(2013, 1, 14, 9, 42, 10, 5000)
+        self.assertEqual(resolve('[* TO NOW/HOUR]', now), '[* TO 2013-01-14T09:00:00]')
+        self.assertEqual(resolve('[* TO NOW]', now), '[* TO 2013-01-14T09:42:10.005000]')
+
+    def test_replay(self):
+        log = synthetic_log(200, hours=1)
+        self.assertEqual(len(log), 200)
+        legacy = replay(log, legacy_query, 512, 512)
+        rounded = replay(log, rounded_query('HOUR'), 512, 512)
+        self.assertTrue(rounded.result_cache.hit_rate > legacy.result_cache.hit_rate)
@@ -0,0 +1,96 @@
+import unittest
+
+from mock import Mock, patch
+from moxie.core.search import SearchService, SearchResponse, SearchServerException
+
+from moxie_courses.catalog import Catalog, CatalogReplica, solr_now
+
+
+def document(presentation, course, start=None, subjects=()):
+    document = {'presentation_identifier': presentation, 'course_identifier': course,
+                'course_subject': list(subjects)}
+    if start:
+        document['presentation_start'] = start
+    return document
+
+
+DOCUMENTS = [
+    document('p1', 'c1', '2012-06-15T00:00:00Z', ['Languages']),
+    document('p2', 'c1', '2012-01-15T00:00:00Z', ['Languages']),
+    document('p3', 'c1', None, ['Languages']),
+    document('p4', 'c2', '2012-09-01T00:00:00Z', ['Languages', 'Research Methods']),
+    document('p5', 'c3', '2011-09-01T00:00:00Z', ['Digital Humanities']),
+]
+NOW = '2012-03-01T10:00:00Z'
+
+
+class CatalogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = Catalog(DOCUMENTS)
+
+    def test_presentations(self):
+        self.assertEqual([d['presentation_identifier']
+                          for d in self.catalog.presentations('c1', all=True)],
+                         ['p2', 'p1', 'p3'])
+        # presentations without a start are considered in the future
+        self.assertEqual([d['presentation_identifier']
+                          for d in self.catalog.presentations('c1', now=NOW)],
+                         ['p1', 'p3'])
+        self.assertEqual(self.catalog.presentations('c3', now=NOW), [])
+        self.assertEqual(self.catalog.presentations('unknown'), [])
+
+    def test_subjects(self):
+        subjects = self.catalog.subjects(now=NOW)
+        self.assertEqual([(s.title, s.count) for s in subjects],
+                         [('Languages', 3), ('Research Methods', 1)])
+        subjects = self.catalog.subjects(all=True)
+        self.assertEqual([(s.title, s.count) for s in subjects],
+                         [('Digital Humanities', 1), ('Languages', 4), ('Research Methods', 1)])
+
+    def test_courses_for_subject(self):
+        self.assertEqual(self.catalog.courses_for_subject('Languages'), set(['c1', 'c2']))
+        self.assertEqual(self.catalog.courses_for_subject('unknown'), set())
+
+    @patch('time.time', Mock(return_value=1339752600.5))
+    def test_solr_now(self):
+        self.assertEqual(solr_now(), '2012-06-15T09:30:00Z')
+        self.assertEqual(solr_now('HOUR'), '2012-06-15T09:00:00Z')
+
+    def test_count_presentations(self):
+        self.assertEqual(self.catalog.count_presentations(all=True), 5)
+        self.assertEqual(self.catalog.count_presentations(now=NOW), 3)
+
+
+class CatalogReplicaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.searcher = Mock(spec=SearchService)
+        self.searcher.search.side_effect = lambda q, start, count: SearchResponse(
+            {}, q, DOCUMENTS[start:start + count])
+
+    def test_load_by_pages(self):
+        replica = CatalogReplica(self.searcher, page_size=2)
+        self.assertEqual(replica.get().size, 5)
+        self.assertEqual(self.searcher.search.call_count, 3)
+        # loaded once
+        replica.get()
+        self.assertEqual(self.searcher.search.call_count, 3)
+
+    def test_reload_failure(self):
+        replica = CatalogReplica(self.searcher, max_age=-1)
+        catalog = replica.get()
+        self.searcher.search.side_effect = SearchServerException()
+        self.assertTrue(replica.get() is catalog)
+
+    def test_load_failure(self):
+        self.searcher.search.side_effect = SearchServerException()
+        self.assertRaises(SearchServerException, CatalogReplica(self.searcher).get)
+
+    def test_reload_on_new_generation(self):
+        generation = Mock(return_value='1')
+        replica = CatalogReplica(self.searcher, generation=generation, check_interval=-1)
+        catalog = replica.get()
+        self.assertTrue(replica.get() is catalog)
+        generation.return_value = '2'
+        self.assertFalse(replica.get() is catalog)
@@ -1,7 +1,9 @@
+import pickle
 import unittest
 from datetime import datetime
 
 from moxie_courses.domain import Course, Presentation
+from moxie_courses.solr import course_document_to_course, presentations_to_lazy_course
 
 
 class CourseTestCase(unittest.TestCase):
@@ -28,3 +30,42 @@ class CourseTestCase(unittest.TestCase):
         self.assertEqual(p2.bookable, False)
         self.assertEqual(p3.bookable, False)
         self.assertEqual(p4.bookable, False)
+
+    def test_presentation_date_apply(self):
+        course = Course("c")
+        presentation = Presentation("p", course)
+        self.assertEqual(presentation._date_apply, None)
+        date_apply = presentation.date_apply
+        self.assertTrue(isinstance(date_apply, datetime))
+        self.assertEqual(presentation.date_apply, date_apply)
+        presentation.date_apply = datetime(2012, 12, 10)
+        self.assertEqual(presentation.date_apply, datetime(2012, 12, 10))
+
+    def test_slots(self):
+        course = Course("c")
+        self.assertRaises(AttributeError, setattr, course, 'unknown', 1)
+        self.assertRaises(AttributeError, setattr, Presentation("p", course), 'unknown', 1)
+
+    def test_pickle(self):
+        course = Course("c", title="Course")
+        course.presentations = [Presentation("p", course, start=datetime(2012, 12, 10))]
+        for protocol in (0, 2):
+            copy = pickle.loads(pickle.dumps(course, protocol))
+            self.assertEqual(copy.title, "Course")
+            self.assertEqual(copy.presentations[0].start, datetime(2012, 12, 10))
+            self.assertTrue(copy.presentations[0].course is copy)
+
+    def test_pickle_lazy(self):
+        document = {'course_identifier': 'c', 'course_title': "Course",
+                    'presentation_identifier': 'p', 'presentation_start': '2099-12-10T00:00:00Z'}
+        course = presentations_to_lazy_course([document])
+        summary = course_document_to_course(dict(document, course_starts=['2099-12-10T00:00:00Z']))
+        for protocol in (0, 2):
+            copy = pickle.loads(pickle.dumps(course, protocol))
+            self.assertEqual(copy.title, "Course")
+            self.assertEqual(copy.presentations[0].isoformat('start'), '2099-12-10T00:00:00')
+            self.assertEqual(copy.presentations[0].start, datetime(2099, 12, 10))
+            self.assertTrue(copy.presentations[0].course is copy)
+            copy = pickle.loads(pickle.dumps(summary, protocol))
+            self.assertEqual(copy.next_start, summary.next_start)
+            self.assertEqual(copy.future_presentations, 1)
@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime
+
+from moxie_courses.dates import (memoize, xcri_to_solr, solr_to_datetime,
+        solr_to_isoformat)
+
+
+class DatesTestCase(unittest.TestCase):
+
+    def test_xcri_to_solr(self):
+        self.assertEqual(xcri_to_solr("2012-06-15"), "2012-06-15T00:00:00Z")
+        self.assertEqual(xcri_to_solr("2012-06-15T09:30:00"), "2012-06-15T09:30:00Z")
+        self.assertEqual(xcri_to_solr("2012-06-15T09:30:00Z"), "2012-06-15T09:30:00Z")
+
+    def test_xcri_to_solr_fallback(self):
+        self.assertEqual(xcri_to_solr("15 June 2012"), "2012-06-15T00:00:00Z")
+        self.assertEqual(xcri_to_solr("2012-06-15 09:30"), "2012-06-15T09:30:00Z")
+
+    def test_xcri_to_solr_invalid(self):
+        self.assertRaises(ValueError, xcri_to_solr, "2012-02-30")
+
+    def test_solr_to_datetime(self):
+        self.assertEqual(solr_to_datetime("2012-06-15T09:30:00Z"),
+            datetime(2012, 6, 15, 9, 30))
+        self.assertEqual(solr_to_datetime("2012-06-15T09:30:00.250Z"),
+            datetime(2012, 6, 15, 9, 30, 0, 250000))
+        self.assertRaises(ValueError, solr_to_datetime, "2012-13-15T09:30:00Z")
+
+    def test_solr_to_isoformat(self):
+        for value in ["2012-06-15T09:30:00Z", "2012-06-15T09:30:00.250Z"]:
+            self.assertEqual(solr_to_isoformat(value), solr_to_datetime(value).isoformat())
+
+    def test_memoize(self):
+        calls = []
+
+        @memoize(maxsize=4)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        self.assertEqual(double(1), 2)
+        self.assertEqual(double(1), 2)
+        self.assertEqual(calls, [1])
+        for value in range(2, 10):
+            double(value)
+        # 1 has not been used for a while, it has been discarded
+        double(1)
+        self.assertEqual(calls.count(1), 2)
+        # 9 has been used recently
+        double(9)
+        self.assertEqual(calls.count(9), 1)
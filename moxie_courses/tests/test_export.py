@@ -0,0 +1,65 @@
+import json
+import unittest
+
+from mock import Mock
+from moxie.core.exceptions import ApplicationException
+from moxie.core.search import SearchService, SearchResponse
+
+from moxie_courses.domain import Course
+from moxie_courses.export import export_courses, export_documents
+from moxie_courses.representations import course_lines
+
+
+def presentation(course, id):
+    return {'course_identifier': course, 'course_title': course.upper(),
+            'presentation_identifier': id, 'presentation_start': '2012-06-15T00:00:00Z'}
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # a course spans the two pages
+        self.pages = {
+            '*': SearchResponse({'nextCursorMark': 'A'}, None,
+                                [presentation('c1', 'p1'), presentation('c2', 'p2')]),
+            'A': SearchResponse({'nextCursorMark': 'B'}, None,
+                                [presentation('c2', 'p3'), presentation('c3', 'p4')]),
+            'B': SearchResponse({'nextCursorMark': 'B'}, None, []),
+        }
+        self.searcher = Mock(spec=SearchService)
+        self.searcher.search.side_effect = lambda query, start, count: self.pages[query['cursorMark']]
+
+    def test_documents(self):
+        documents = list(export_documents(self.searcher, page_size=2))
+        self.assertEqual([d['presentation_identifier'] for d in documents], ['p1', 'p2', 'p3', 'p4'])
+        self.assertEqual(self.searcher.search.call_count, 3)
+        query = self.searcher.search.call_args[0][0]
+        self.assertEqual(query['sort'], 'course_identifier asc,presentation_identifier asc')
+        self.assertEqual(self.searcher.search.call_args[1], {'start': 0, 'count': 2})
+
+    def test_courses(self):
+        courses = list(export_courses(self.searcher, page_size=2))
+        self.assertEqual([(c.id, [p.id for p in c.presentations]) for c in courses],
+                         [('c1', ['p1']), ('c2', ['p2', 'p3']), ('c3', ['p4'])])
+
+    def test_lines(self):
+        lines = list(course_lines(export_courses(self.searcher)))
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(all(line.endswith('\n') and line.count('\n') == 1 for line in lines))
+        self.assertEqual(json.loads(lines[-1]), {'complete': True, 'count': 3})
+        course = json.loads(lines[1])
+        self.assertEqual(course['title'], 'C2')
+        self.assertEqual([p['start'] for p in course['presentations']],
+                         ['2012-06-15T00:00:00'] * 2)
+
+    def test_lines_interrupted(self):
+        def courses(count):
+            for id in range(count):
+                yield Course('c{0}'.format(id))
+            raise ApplicationException()
+        lines = list(course_lines(courses(1)))
+        self.assertEqual(json.loads(lines[0])['id'], 'c0')
+        self.assertEqual(json.loads(lines[1]),
+                         {'complete': False, 'count': 1, 'error': "Export interrupted"})
+        # nothing sent yet, the error is raised
+        self.assertRaises(ApplicationException, list, course_lines(courses(0)))
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+from moxie_courses.importers.fetch import fetch_feed, FeedState
+
+
+class FetchFeedTestCase(unittest.TestCase):
+
+    url = 'http://example.org/xcri.xml'
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.state = FeedState(os.path.join(tmp_dir, 'state.json'))
+        self.body = open('moxie_courses/tests/data/xcri.xml').read()
+
+    def _response(self, status_code=200, headers=None):
+        response = Mock(status_code=status_code, headers=headers or {})
+        response.iter_content.return_value = [self.body[:1000], self.body[1000:]]
+        return response
+
+    @patch('moxie_courses.importers.fetch.requests.get')
+    def test_fetch_feed(self, get):
+        get.return_value = self._response(headers={'ETag': '"v1"'})
+        feed = fetch_feed(self.url, self.state)
+        self.addCleanup(feed.close)
+        self.assertEqual(feed.open().read(), self.body)
+        self.assertEqual(get.call_args[1]['headers'], {})
+        self.assertTrue(get.call_args[1]['stream'])
+        get.return_value.close.assert_called_once_with()
+        self.state.update(feed)
+        self.assertEqual(self.state.get(self.url)['etag'], '"v1"')
+
+    @patch('moxie_courses.importers.fetch.requests.get')
+    def test_fetch_feed_not_modified(self, get):
+        self.state.save({self.url: {'etag': '"v1"', 'last_modified': None, 'sha256': 'abc'}})
+        get.return_value = self._response(status_code=304)
+        self.assertEqual(fetch_feed(self.url, self.state), None)
+        self.assertEqual(get.call_args[1]['headers'], {'If-None-Match': '"v1"'})
+        get.return_value.close.assert_called_once_with()
+
+    @patch('moxie_courses.importers.fetch.requests.get')
+    def test_fetch_feed_identical(self, get):
+        # server not supporting conditional requests
+        get.return_value = self._response()
+        feed = fetch_feed(self.url, self.state)
+        self.state.update(feed)
+        feed.close()
+        get.return_value = self._response()
+        self.assertEqual(fetch_feed(self.url, self.state), None)
+        get.return_value.close.assert_called_once_with()
+        # unless forced
+        feed = fetch_feed(self.url, self.state, force_update=True)
+        self.assertNotEqual(feed, None)
+        feed.close()
+        self.assertFalse(os.path.exists(feed.path))
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import Mock, patch
+from moxie.core.search import SearchService
+
+from moxie_courses.importers.delta import feed_path
+from moxie_courses.importers.fetch import Feed, FeedState
+from moxie_courses.importers.snapshot import read_snapshot
+from moxie_courses.importers.multi import XcriOxMultiImporter
+
+
+class SlowFeed(Feed):
+    """Feed taking too long to parse"""
+
+    def open(self):
+        time.sleep(10)
+
+
+class XcriOxMultiImporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.mock_index = Mock(spec=SearchService)
+
+    def fake_fetch_feed(self, url, state, force_update):
+        if 'broken' in url:
+            raise IOError("Feed not available")
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        shutil.copy('moxie_courses/tests/data/xcri.xml', path)
+        if 'slow' in url:
+            return SlowFeed(url, path, etag=url)
+        return Feed(url, path, etag=url)
+
+    def test_multi_importer(self):
+        state = FeedState(os.path.join(self.tmp_dir, 'state.json'))
+        urls = ['http://example.org/broken.xml', 'http://example.org/xcri.xml']
+        with patch('moxie_courses.importers.multi.fetch_feed', self.fake_fetch_feed):
+            importer = XcriOxMultiImporter(self.mock_index, urls, processes=2, state=state,
+                                           snapshots=os.path.join(self.tmp_dir, 'snapshot'))
+            metrics = importer.run()
+        snapshot = feed_path(os.path.join(self.tmp_dir, 'snapshot'), 'http://example.org/xcri.xml')
+        # snapshots are kept once the import has been accepted
+        self.assertFalse(os.path.exists(snapshot))
+        importer.promote_snapshots()
+        self.assertEqual(importer.failed, ['http://example.org/broken.xml'])
+        self.assertEqual(importer.importers.keys(), ['http://example.org/xcri.xml'])
+        documents = self.mock_index.index.call_args[0][0]
+        # 4 presentations and 3 courses
+        self.assertEqual(len(documents), 7)
+        self.assertEqual(documents[0]['course_title'], "Monograph Publishing Workshop")
+        self.mock_index.commit.assert_called_once_with()
+        # only the feed that has been imported is recorded
+        self.assertEqual(state.load().keys(), ['http://example.org/xcri.xml'])
+        self.assertEqual([d['presentation_identifier'] for d in read_snapshot(snapshot)],
+                         [d['presentation_identifier'] for d in documents[:4]])
+        self.assertEqual(len(importer.identifiers), 7)
+        self.assertEqual(metrics.counts['feeds_failed'], 1)
+        self.assertEqual(metrics.counts['indexed'], 7)
+        self.assertEqual(metrics.stages['parse'].count, 4)
+        self.assertEqual(metrics.stages['index'].count, 7)
+        feed = metrics.feeds['http://example.org/xcri.xml']
+        self.assertEqual(feed['stages']['fetch']['bytes'],
+                         os.path.getsize('moxie_courses/tests/data/xcri.xml'))
+        self.assertFalse(feed['unchanged'])
+        self.assertTrue(metrics.feeds['http://example.org/broken.xml']['error'])
+
+    def test_discard_snapshots(self):
+        url = 'http://example.org/xcri.xml'
+        snapshot = feed_path(os.path.join(self.tmp_dir, 'snapshot'), url)
+        with open(snapshot, 'w') as f:
+            f.write('previous')
+        with patch('moxie_courses.importers.multi.fetch_feed', self.fake_fetch_feed):
+            importer = XcriOxMultiImporter(self.mock_index, [url], processes=1,
+                                           snapshots=os.path.join(self.tmp_dir, 'snapshot'))
+            importer.run()
+        path = importer.new_snapshots[url]
+        # e.g. the staging core has been rejected
+        importer.discard_snapshots()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(importer.tmp_dir))
+        self.assertEqual(open(snapshot).read(), 'previous')
+
+    def test_timeout_removes_snapshots(self):
+        urls = ['http://example.org/xcri.xml', 'http://example.org/slow.xml']
+        with patch('moxie_courses.importers.multi.fetch_feed', self.fake_fetch_feed):
+            importer = XcriOxMultiImporter(self.mock_index, urls, processes=2, timeout=1,
+                                           snapshots=os.path.join(self.tmp_dir, 'snapshot'))
+            importer.run()
+        self.assertEqual(importer.failed, ['http://example.org/slow.xml'])
+        # only the snapshot of the indexed feed is left
+        self.assertEqual(os.listdir(importer.tmp_dir),
+                         [os.path.basename(importer.new_snapshots['http://example.org/xcri.xml'])])
+        importer.promote_snapshots()
+        importer.discard_snapshots()
+        self.assertFalse(os.path.exists(importer.tmp_dir))
+
+    def test_identifiers_across_feeds(self):
+        # the same presentations in two feeds are indexed once by Solr
+        urls = ['http://example.org/xcri.xml', 'http://example.org/copy.xml']
+        with patch('moxie_courses.importers.multi.fetch_feed', self.fake_fetch_feed):
+            importer = XcriOxMultiImporter(self.mock_index, urls, processes=2)
+            importer.run()
+        self.assertEqual(importer.parsed, 8)
+        self.assertEqual(len(importer.identifiers), 7)
+
+    def test_delta_needs_deletes(self):
+        # fails before fetching feeds if vanished presentations can't be deleted
+        self.assertRaises(ValueError, XcriOxMultiImporter, self.mock_index,
+                          ['http://example.org/xcri.xml'],
+                          fingerprints=os.path.join(self.tmp_dir, 'fingerprints'))
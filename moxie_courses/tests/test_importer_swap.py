@@ -0,0 +1,31 @@
+import unittest
+
+from mock import Mock, patch
+from moxie.core.search import SearchService, SearchServerException
+
+from moxie_courses.importers.swap import SolrCoreSwap, StagingValidationError
+
+
+class SolrCoreSwapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.swap = SolrCoreSwap('http://127.0.0.1:8080/solr/', 'courses', 'courses_staging')
+
+    def test_validate(self):
+        searcher = Mock(spec=SearchService)
+        searcher.search.return_value = Mock(as_dict={'response': {'numFound': 4}})
+        self.swap.validate(searcher, 4)
+        self.assertRaises(StagingValidationError, self.swap.validate, searcher, 5)
+
+    @patch('moxie_courses.importers.swap.requests.get')
+    def test_swap(self, get):
+        get.return_value = Mock(ok=True)
+        self.swap.swap()
+        get.assert_called_once_with('http://127.0.0.1:8080/solr/admin/cores',
+            params={'action': 'SWAP', 'core': 'courses', 'other': 'courses_staging',
+                    'wt': 'json'}, timeout=60)
+
+    @patch('moxie_courses.importers.swap.requests.get')
+    def test_swap_error(self, get):
+        get.return_value = Mock(ok=False, status_code=400, text='No such core')
+        self.assertRaises(SearchServerException, self.swap.swap)
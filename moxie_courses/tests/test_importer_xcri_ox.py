@@ -1,18 +1,27 @@
+import os
+import shutil
+import tempfile
 import unittest
 import logging
+from collections import defaultdict
 
 from xml import sax
-from mock import Mock
-from moxie.core.search import SearchService, SearchResponse
+from mock import Mock, patch
+from moxie.core.search import SearchService, SearchResponse, SearchServerException
 
-from moxie_courses.importers.xcri_ox import XcriOxHandler, XcriOxImporter
+from moxie_courses.importers.xcri_ox import (XcriOxHandler, XcriOxImporter,
+        XcriOxIterparseHandler, course_document)
+from moxie_courses.importers.delta import FingerprintStore
+from moxie_courses.importers.snapshot import read_snapshot, SnapshotError, SnapshotWriter
+from moxie_courses.importers.xcri_ox import index_snapshots
 
 
 class XcriOxImporterTestCase(unittest.TestCase):
 
     def setUp(self):
         logging.basicConfig(level=logging.DEBUG)
-        # 1 provider, 3 courses, 4 presentations (total)
+        # 1 provider, 3 courses, 4 presentations (total), indexed as
+        # 4 presentation documents followed by 3 course documents
         self.xcri_path = 'moxie_courses/tests/data/xcri.xml'
         self.mock_index = Mock(spec=SearchService)
         #self.mock_index.search_for_ids.return_value = SearchResponse({'response': {'docs': []}}, None, [])
@@ -35,7 +44,7 @@ class XcriOxImporterTestCase(unittest.TestCase):
     def test_importer(self):
         importer = XcriOxImporter(self.mock_index, open(self.xcri_path))
         importer.run()
-        presentations = importer.presentations
+        presentations = self._indexed_documents()
 
         first = presentations[0]
         self.assertEqual(first['provider_title'], "Humanities Division")
@@ -60,6 +69,173 @@ class XcriOxImporterTestCase(unittest.TestCase):
         self.assertEqual(last['provider_title'], "Digital Humanities Division")
         self.assertEqual(last['presentation_memberApplyTo'], "http://courses.it.ox.ac.uk/detail/TRWF")
         self.assertEqual(len(last['course_subject']), 1)
+        self.assertEqual(last['doc_type'], 'presentation')
+
+    def test_importer_courses(self):
+        XcriOxImporter(self.mock_index, open(self.xcri_path)).run()
+        courses = self._indexed_documents()[4:]
+        self.assertEqual([c['doc_type'] for c in courses], ['course'] * 3)
+        course = courses[-1]
+        self.assertEqual(course['presentation_identifier'], 'course:' + course['course_identifier'])
+        self.assertEqual(course['course_title'], "Lunchtime Briefings on the Digital Humanities")
+        self.assertEqual(len(course['course_subject']), 1)
+        self.assertEqual(course['course_last_start'], "2012-05-24T00:00:00Z")
+        self.assertEqual(course['course_starts'], ["2012-05-24T00:00:00Z"])
+        self.assertEqual(course['course_presentations_undated'], 0)
+
+    def test_course_document(self):
+        presentation = {'course_identifier': 'c1', 'course_title': 'Course',
+                        'provider_title': 'Provider', 'presentation_identifier': 'p1',
+                        'presentation_start': '2012-06-15T00:00:00Z'}
+        course = course_document(presentation, ['2012-06-15T00:00:00Z', None,
+                                                '2012-01-15T00:00:00Z', '2012-09-01T00:00:00Z'])
+        self.assertEqual(course, {'course_identifier': 'c1', 'course_title': 'Course',
+                                  'provider_title': 'Provider',
+                                  'presentation_identifier': 'course:c1', 'doc_type': 'course',
+                                  'course_starts': ['2012-01-15T00:00:00Z', '2012-06-15T00:00:00Z',
+                                                    '2012-09-01T00:00:00Z'],
+                                  'course_last_start': '2012-09-01T00:00:00Z',
+                                  'course_presentations_undated': 1})
+
+    def test_iterparse_handler(self):
+        sax_presentations = XcriOxHandler().iter_presentations(open(self.xcri_path))
+        handler = XcriOxIterparseHandler()
+        presentations = handler.iter_presentations(open(self.xcri_path))
+        self.assertEqual(list(presentations), list(sax_presentations))
+        self.assertEqual(handler.count, 4)
+
+    def test_importer_iterparse_handler(self):
+        XcriOxImporter(self.mock_index, open(self.xcri_path)).run()
+        sax_documents = self._indexed_documents()
+        self.mock_index.reset_mock()
+        XcriOxImporter(self.mock_index, open(self.xcri_path),
+            handler=XcriOxIterparseHandler).run()
+        self.assertEqual(self._indexed_documents(), sax_documents)
+
+    def test_importer_batches(self):
+        importer = XcriOxImporter(self.mock_index, open(self.xcri_path),
+            buffer_size=512, batch_size=3)
+        importer.run()
+        self.assertEqual(self.mock_index.index.call_count, 3)
+        self.assertEqual(len(self._indexed_documents()), 7)
+        self.assertEqual(importer.indexed, 7)
+        self.mock_index.commit.assert_called_once_with()
+
+    def test_importer_failed_batch(self):
+        # first batch fails twice, other batches are indexed
+        self.mock_index.index.side_effect = [SearchServerException(),
+                                             SearchServerException(), None, None, None]
+        importer = XcriOxImporter(self.mock_index, open(self.xcri_path),
+            batch_size=2, retries=1)
+        importer.run()
+        self.assertEqual(self.mock_index.index.call_count, 5)
+        self.assertEqual(importer.indexed, 5)
+        self.assertEqual(importer.failed_batches, 1)
+        self.mock_index.commit.assert_called_once_with()
+
+    def test_importer_metrics(self):
+        self.mock_index.index.side_effect = [SearchServerException(),
+                                             SearchServerException(), None, None, None]
+        importer = XcriOxImporter(self.mock_index, open(self.xcri_path),
+            batch_size=2, retries=1)
+        metrics = importer.run()
+        self.assertEqual(metrics.stages['parse'].count, 4)
+        self.assertEqual(metrics.stages['parse'].bytes, os.path.getsize(self.xcri_path))
+        self.assertEqual(metrics.stages['transform'].count, 4)
+        self.assertEqual(metrics.stages['index'].count, 5)
+        self.assertEqual(metrics.failed, {'index_error': 2})
+        self.assertEqual(metrics.counts['indexed'], 5)
+        self.assertEqual(metrics.counts['courses'], 3)
+        self.assertTrue(metrics.peak_rss_kb > 0)
+        report = metrics.as_dict()
+        self.assertEqual(report['stages']['index']['count'], 5)
+        self.assertEqual(report['counts']['failed_batches'], 1)
+
+    def test_importer_metrics_skipped(self):
+        no_identifier = defaultdict(list, provider_title=['Division'], course_title=['Course'])
+        no_title = defaultdict(list)
+        importer = XcriOxImporter(self.mock_index, None)
+        self.assertEqual(list(importer.transform([no_identifier, no_title])), [])
+        self.assertEqual(importer.metrics.skipped, {'no_identifier': 1, 'IndexError': 1})
+
+    def test_handler_iter_presentations(self):
+        handler = XcriOxHandler()
+        presentations = handler.iter_presentations(open(self.xcri_path), 1024)
+        self.assertEqual(len(list(presentations)), 4)
+        self.assertEqual(handler.presentations, [])
+
+    def test_importer_delta(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        store = FingerprintStore(os.path.join(tmp_dir, 'fingerprints.json'))
+        # search service able to delete documents (not part of SearchService)
+        self.mock_index.delete_by_ids = Mock()
+        XcriOxImporter(self.mock_index, open(self.xcri_path), fingerprints=store).run()
+        self.assertEqual(len(self._indexed_documents()), 7)
+        self.assertEqual(len(store.load()), 7)
+
+        # nothing changed, nothing to index
+        self.mock_index.reset_mock()
+        importer = XcriOxImporter(self.mock_index, open(self.xcri_path), fingerprints=store)
+        importer.run()
+        self.assertEqual(self.mock_index.index.call_count, 0)
+        self.assertEqual(self.mock_index.delete_by_ids.call_count, 0)
+        self.assertEqual(importer.unchanged, 7)
+
+        # one presentation modified, one removed from the feed
+        fingerprints = store.load()
+        fingerprints['daisy-presentation-19303'] = 'outdated'
+        fingerprints['daisy-presentation-1'] = 'vanished'
+        store.save(fingerprints)
+        self.mock_index.reset_mock()
+        importer = XcriOxImporter(self.mock_index, open(self.xcri_path), fingerprints=store)
+        importer.run()
+        indexed = self._indexed_documents()
+        self.assertEqual(len(indexed), 1)
+        self.assertEqual(indexed[0]['presentation_identifier'], 'daisy-presentation-19303')
+        self.mock_index.delete_by_ids.assert_called_once_with(['daisy-presentation-1'])
+        self.assertFalse('daisy-presentation-1' in store.load())
+        self.assertEqual(len(store.load()), 7)
+
+    def test_importer_delta_needs_deletes(self):
+        store = FingerprintStore(os.path.join(tempfile.gettempdir(), 'fingerprints.json'))
+        self.assertRaises(ValueError, XcriOxImporter, Mock(spec=SearchService),
+                          open(self.xcri_path), fingerprints=store)
+
+    def test_importer_snapshot(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'snapshot')
+        XcriOxImporter(self.mock_index, open(self.xcri_path), snapshot=path).run()
+        documents = self._indexed_documents()
+        # only presentations, course documents are rebuilt when reindexing
+        self.assertEqual([d['presentation_identifier'] for d in read_snapshot(path)],
+                         [d['presentation_identifier'] for d in documents[:4]])
+
+        self.mock_index.reset_mock()
+        importer = index_snapshots(self.mock_index, [path], batch_size=3)
+        self.assertEqual(self.mock_index.index.call_count, 3)
+        self.assertEqual(self._indexed_documents(), documents)
+        self.assertEqual(importer.indexed, 7)
+        self.mock_index.commit.assert_called_once_with()
+
+    def test_read_snapshot_invalid(self):
+        self.assertRaises(SnapshotError, list, read_snapshot(self.xcri_path))
+
+    def test_read_snapshot_old_version(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'snapshot')
+        with patch('moxie_courses.importers.snapshot.SNAPSHOT_VERSION', 1):
+            with SnapshotWriter(path) as snapshot:
+                snapshot.write({'presentation_identifier': 'p1'})
+        self.assertRaises(SnapshotError, list, read_snapshot(path))
+
+    def _indexed_documents(self):
+        documents = []
+        for args, kwargs in self.mock_index.index.call_args_list:
+            documents.extend(args[0])
+        return documents
 
     def test_handler_split_qname(self):
         self.assertEqual(XcriOxHandler._split_qname("prefix:property"),
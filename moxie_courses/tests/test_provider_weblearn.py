@@ -1,6 +1,8 @@
 import unittest
 import time
 
+from mock import patch
+
 from moxie_courses.providers.weblearn import WebLearnProvider
 from datetime import datetime
 
@@ -24,3 +26,12 @@ class WebLearnProviderTestCase(unittest.TestCase):
                 supported_hostnames=['courses.weblearn.tld', 'foo.bar'])
         self.assertNotEqual(not_weblearn.supported_hostnames, ['definitelynotweblearn.tld'])
         self.assertTrue('courses.weblearn.tld' in not_weblearn.supported_hostnames)
+
+    def test_user_courses_timeout(self):
+        provider = WebLearnProvider('https://weblearn.ox.ac.uk/course-signup/', timeout=30)
+        with patch('moxie_courses.providers.weblearn.requests') as requests:
+            requests.get.return_value.json = []
+            provider.user_courses('signer', timeout=2.5)
+            self.assertEqual(requests.get.call_args[1]['timeout'], 2.5)
+            provider.user_courses('signer')
+            self.assertEqual(requests.get.call_args[1]['timeout'], 30)
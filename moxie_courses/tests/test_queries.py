@@ -0,0 +1,53 @@
+import unittest
+
+from moxie_courses.queries import (SolrQuery, search_courses_query, subjects_query,
+                                   course_presentations_query, rounded_now,
+                                   normalise_search)
+
+
+class QueriesTestCase(unittest.TestCase):
+
+    def test_filters(self):
+        self.assertEqual(SolrQuery().as_dict(), {'q': '*:*'})
+        self.assertEqual(SolrQuery('text').filter('a:1').as_dict(), {'q': 'text', 'fq': 'a:1'})
+        self.assertEqual(SolrQuery().filter('a:1').filter('b:2').as_dict()['fq'], ['a:1', 'b:2'])
+
+    def test_search_courses(self):
+        query = search_courses_query('history', rounding='HOUR')
+        # the text query is kept apart from the time restriction
+        self.assertEqual(query['q'], 'history')
+        self.assertEqual(query['fq'], ['doc_type:course',
+            'course_last_start:{NOW/HOUR TO *] OR course_presentations_undated:[1 TO *]'])
+        self.assertFalse('group' in query)
+        self.assertEqual(search_courses_query('history')['fq'][1],
+            'course_last_start:{NOW TO *] OR course_presentations_undated:[1 TO *]')
+        self.assertEqual(search_courses_query('history', all=True)['fq'], 'doc_type:course')
+
+    def test_subjects(self):
+        query = subjects_query(rounding='DAY')
+        self.assertEqual(query['q'], '*:*')
+        self.assertEqual(query['fq'], ['NOT doc_type:course',
+                                       'NOT presentation_start:[* TO NOW/DAY]'])
+        self.assertEqual(subjects_query(all=True)['fq'], 'NOT doc_type:course')
+
+    def test_course_presentations(self):
+        query = course_presentations_query('c1')
+        self.assertEqual(query, {'q': '*:*', 'fq': ['NOT doc_type:course', 'course_identifier:c1'],
+                                 'sort': 'presentation_start asc'})
+
+    def test_rounded_now(self):
+        now = 1349877723.5     # 2012-10-10T14:02:03.5Z
+        self.assertEqual(rounded_now(now=now), now)
+        self.assertEqual(rounded_now('HOUR', now), 1349877600)
+        self.assertEqual(rounded_now('DAY', now), 1349827200)
+        self.assertEqual(rounded_now('MONTH', now), 1349049600)
+
+    def test_normalise_search(self):
+        self.assertEqual(normalise_search('  Modern\tHISTORY  '), 'modern history')
+        self.assertEqual(normalise_search('History AND Maths'), 'history AND maths')
+        self.assertEqual(normalise_search('course_subject:"Modern  History" Europe'),
+                         'course_subject:"Modern  History" Europe')
+        self.assertEqual(normalise_search('"Unclosed phrase'), '"Unclosed phrase')
+        self.assertEqual(normalise_search('History (NOT Maths)'), 'history (NOT maths)')
+        self.assertEqual(normalise_search('course_subject:(Modern  History) OR Europe'),
+                         'course_subject:(Modern History) OR Europe')
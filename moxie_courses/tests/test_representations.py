@@ -0,0 +1,46 @@
+import json
+import unittest
+
+from moxie_courses.benchmarks.hal import create_app, objects_page, page_courses, serializer_page
+from moxie_courses.representations import (HALCourseRepresentation, HALCoursesSerializer,
+                                           URLTemplate)
+
+
+class HALCoursesSerializerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app, self.service = create_app()
+        self.courses = page_courses(5)
+        # not bookable, location that has to be quoted
+        presentation = self.courses[0].presentations[0]
+        presentation.booking_endpoint = ""
+        presentation.location = "oxpoints:AB CD"
+        self.courses[1].presentations[0].location = ""
+
+    def test_same_output(self):
+        with self.app.test_request_context('/courses/search?q=history'):
+            bookable = self.service.bookable(p for c in self.courses for p in c.presentations)
+            expected = objects_page(self.courses, bookable)
+            self.assertEqual(json.dumps(serializer_page(self.courses, bookable)),
+                             json.dumps(expected))
+        presentation = expected[0]['_embedded']['presentations'][0]
+        self.assertEqual(presentation['_links'], {'poi': {'href': '/places/oxpoints:AB%20CD'}})
+
+    def test_url_template(self):
+        with self.app.test_request_context('/courses/search'):
+            template = URLTemplate('.course', 'id')
+            self.assertEqual(template('daisy-course-1'), '/courses/course/daisy-course-1')
+            self.assertEqual(template(u'caf\xe9'), '/courses/course/caf%C3%A9')
+
+    def test_fields(self):
+        course = self.courses[2]
+        fields = frozenset(['title', 'presentations', 'start'])
+        with self.app.test_request_context('/courses/course/c1'):
+            bookable = self.service.bookable(course.presentations)
+            response = HALCourseRepresentation(course, '.course', bookable, fields).as_dict()
+        self.assertEqual(sorted(response), ['_embedded', '_links', 'id', 'title'])
+        for presentation in response['_embedded']['presentations']:
+            self.assertEqual(sorted(presentation), ['_links', 'id', 'start'])
+        with self.app.test_request_context('/courses/search'):
+            response = HALCoursesSerializer('.course', frozenset(['title'])).course(course, bookable)
+        self.assertEqual(sorted(response), ['_links', 'id', 'title'])
@@ -0,0 +1,50 @@
+import time
+import unittest
+
+from mock import Mock, patch
+
+from moxie_courses.search_cache import SearchCache
+
+
+class SearchCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SearchCache(ttl=60, maxsize=2, stale=300)
+        self.compute = Mock(return_value='results')
+
+    def test_fresh(self):
+        self.assertEqual(self.cache.get('history', self.compute, 1), 'results')
+        self.assertEqual(self.cache.get('history', self.compute, 1), 'results')
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_new_version(self):
+        self.cache.get('history', self.compute, 1)
+        self.cache.get('history', self.compute, 2)
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_least_recently_used(self):
+        self.cache.get('a', self.compute)
+        self.cache.get('b', self.compute)
+        self.cache.get('a', self.compute)
+        self.cache.get('c', self.compute)
+        self.assertEqual(list(self.cache.entries), ['a', 'c'])
+
+    def test_stale_while_revalidate(self):
+        self.cache.get('history', self.compute)
+        self.compute.return_value = 'new results'
+        with patch('moxie_courses.search_cache.Thread') as thread:
+            with patch('time.time', return_value=time.time() + 120):
+                # stale results are served while refreshed in the background
+                self.assertEqual(self.cache.get('history', self.compute), 'results')
+                self.cache.get('history', self.compute)
+        self.assertEqual(thread.call_count, 1)
+        self.assertEqual(self.compute.call_count, 1)
+        self.cache._recompute(*thread.call_args[1]['args'])
+        self.assertEqual(self.cache.get('history', self.compute), 'new results')
+        self.assertFalse(self.cache.refreshing)
+
+    def test_expired(self):
+        self.cache.get('history', self.compute)
+        with patch('time.time', return_value=time.time() + 400):
+            self.cache.get('history', self.compute)
+        self.assertEqual(self.compute.call_count, 2)
@@ -0,0 +1,253 @@
+import time
+import unittest
+
+from mock import Mock, patch
+from moxie.core.exceptions import NotFound
+from moxie.core.search import SearchService, SearchResponse
+from moxie.core.service import ProviderException
+
+from moxie_courses.domain import Course, Presentation
+from moxie_courses.generation import bump_generation, current_generation
+from moxie_courses.providers.weblearn import WebLearnProvider
+from moxie_courses.services import CourseService
+
+
+class DictCache(object):
+    """Cache keeping everything in a dict, timeouts are ignored"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+
+    def add(self, key, value, timeout=None):
+        self.values.setdefault(key, value)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+DOCUMENT = {'course_identifier': 'c1', 'course_title': "Course",
+            'presentation_identifier': 'p1', 'presentation_start': '2012-06-15T00:00:00Z'}
+
+
+class CourseServiceCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        cache = DictCache()
+        for module in ['moxie_courses.services', 'moxie_courses.generation']:
+            patcher = patch(module + '.cache', cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.searcher = Mock(spec=SearchService)
+        patcher = patch('moxie_courses.services.searcher', self.searcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = CourseService()
+
+    def test_generation(self):
+        generation = current_generation()
+        self.assertEqual(current_generation(), generation)
+        bump_generation()
+        self.assertNotEqual(current_generation(), generation)
+
+    def test_course_cached_until_import(self):
+        self.searcher.search.return_value = SearchResponse({}, None, [DOCUMENT])
+        course = self.service.list_presentations_for_course('c1', all=True)
+        self.assertEqual(course.title, "Course")
+        self.service.list_presentations_for_course('c1', all=True)
+        # past presentations are filtered from the cached documents
+        self.assertEqual(self.service.list_presentations_for_course('c1'), None)
+        self.assertEqual(self.searcher.search.call_count, 1)
+        bump_generation()
+        self.service.list_presentations_for_course('c1', all=True)
+        self.assertEqual(self.searcher.search.call_count, 2)
+
+    @patch('time.time', Mock(return_value=1339752600))    # 2012-06-15T09:30:00Z
+    def test_presentations_filtered_against_rounded_now(self):
+        # started since NOW/HOUR, still listed as in search results
+        document = dict(DOCUMENT, presentation_start='2012-06-15T09:15:00Z')
+        self.searcher.search.return_value = SearchResponse({}, None, [document])
+        course = self.service.list_presentations_for_course('c1')
+        self.assertEqual([p.id for p in course.presentations], ['p1'])
+        service = CourseService(now_rounding=None)
+        self.assertEqual(service.list_presentations_for_course('c1'), None)
+
+    def test_search_courses(self):
+        course = {'doc_type': 'course', 'presentation_identifier': 'course:c1',
+                  'course_identifier': 'c1', 'course_title': "Course"}
+        self.searcher.search.return_value = SearchResponse(
+            {'response': {'numFound': 36}}, None, [course])
+        courses, size = self.service.search_courses('history', 35, 35)
+        self.assertEqual([c.title for c in courses], ["Course"])
+        self.assertEqual(size, 36)
+        query = self.searcher.search.call_args[0][0]
+        self.assertEqual(query['q'], 'history')
+        self.assertTrue('doc_type:course' in query['fq'])
+
+    def test_search_courses_cached_until_import(self):
+        self.searcher.search.return_value = SearchResponse(
+            {'response': {'numFound': 1}}, None, [{'course_identifier': 'c1'}])
+        service = CourseService(search_cache={'ttl': 60, 'maxsize': 10, 'stale': 0})
+        service.search_cache.clear()
+        service.search_courses('history', 0, 35)
+        courses, size = service.search_courses('history', 0, 35)
+        self.assertEqual(size, 1)
+        self.assertEqual(self.searcher.search.call_count, 1)
+        bump_generation()
+        service.search_courses('history', 0, 35)
+        self.assertEqual(self.searcher.search.call_count, 2)
+
+    def test_not_rounded(self):
+        # the current time is not rounded, responses only change with imports
+        self.searcher.search.return_value = SearchResponse(
+            {'response': {'numFound': 1}}, None, [{'course_identifier': 'c1'}])
+        service = CourseService(now_rounding=None,
+                                search_cache={'ttl': 60, 'maxsize': 10, 'stale': 0})
+        service.search_cache.clear()
+        with patch('time.time', Mock(return_value=1339752600.5)):
+            validators = service.validators('subjects')
+            service.search_courses('history', 0, 35)
+        with patch('time.time', Mock(return_value=1339752610.25)):
+            self.assertEqual(service.validators('subjects'), validators)
+            service.search_courses('history', 0, 35)
+        self.assertEqual(self.searcher.search.call_count, 1)
+        bump_generation()
+        self.assertNotEqual(service.validators('subjects')[0], validators[0])
+
+    def test_course_document_is_not_a_presentation(self):
+        self.searcher.get_by_ids.return_value = SearchResponse({}, None, [
+            {'doc_type': 'course', 'presentation_identifier': 'course:c1', 'course_identifier': 'c1'}])
+        self.assertRaises(NotFound, self.service._get_presentation, 'course:c1')
+
+    def test_unknown_presentation(self):
+        self.searcher.get_by_ids.return_value = SearchResponse({}, None, [])
+        self.assertRaises(NotFound, self.service._get_presentation, 'unknown')
+        self.assertRaises(NotFound, self.service._get_presentation, 'unknown')
+        self.assertEqual(self.searcher.get_by_ids.call_count, 1)
+
+    def test_presentation(self):
+        self.searcher.get_by_ids.return_value = SearchResponse({}, None, [DOCUMENT])
+        self.assertEqual(self.service._get_presentation(u'p1').presentations[0].id, 'p1')
+        self.service._get_presentation(u'p1')
+        self.searcher.get_by_ids.assert_called_once_with([u'p1'])
+
+
+class MyCoursesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('moxie_courses.services.cache', DictCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.course = Mock()
+        self.fast = Mock()
+        self.fast.name = 'fast'
+        self.fast.user_courses.return_value = [self.course]
+        self.slow = Mock()
+        self.slow.name = 'slow'
+        self.slow.user_courses.side_effect = lambda signer, timeout: time.sleep(0.5) or [Mock()]
+        self.failing = Mock()
+        self.failing.name = 'failing'
+        self.failing.user_courses.side_effect = ValueError()
+
+    def test_partial_results(self):
+        service = CourseService(providers_timeout=0.1)
+        service.providers = [self.slow, self.fast, self.failing]
+        start = time.time()
+        courses = service.my_courses(signer='signer')
+        self.assertTrue(time.time() - start < 0.4)
+        self.assertEqual(courses, [self.course])
+        self.assertEqual(dict((name, p['status']) for name, p in courses.providers.items()),
+                         {'fast': 'ok', 'slow': 'timeout', 'failing': 'error'})
+        self.assertTrue(courses.providers['fast']['latency'] < 0.1)
+        kwargs = self.fast.user_courses.call_args[1]
+        self.assertEqual(kwargs['signer'], 'signer')
+        # providers are given the time left
+        self.assertTrue(0 < kwargs['timeout'] <= 0.1)
+
+    def test_busy(self):
+        service = CourseService(providers_pool_size=1)
+        service.providers = [self.slow, self.fast]
+        courses = service.my_courses(signer='signer')
+        # the only thread is busy with the slow provider
+        self.assertEqual(courses.providers['fast']['status'], 'busy')
+        self.assertFalse(self.fast.user_courses.called)
+
+    def test_bookings_cached(self):
+        service = CourseService()
+        service.providers = [self.fast]
+        signer = Mock()
+        signer.client.resource_owner_key = u'token'
+        self.assertEqual(service.my_courses(signer), [self.course])
+        self.assertEqual(service.my_courses(signer), [self.course])
+        self.assertEqual(self.fast.user_courses.call_count, 1)
+        # another user
+        other = Mock()
+        other.client.resource_owner_key = u'other'
+        service.my_courses(other)
+        self.assertEqual(self.fast.user_courses.call_count, 2)
+        service._forget_bookings(signer)
+        service.my_courses(signer)
+        self.assertEqual(self.fast.user_courses.call_count, 3)
+
+    def test_partial_bookings_not_cached(self):
+        service = CourseService()
+        service.providers = [self.fast, self.failing]
+        signer = Mock()
+        signer.client.resource_owner_key = u'token'
+        service.my_courses(signer)
+        service.my_courses(signer)
+        self.assertEqual(self.fast.user_courses.call_count, 2)
+
+    def test_withdraw_forgets_bookings(self):
+        presentation = Mock(id='p1')
+        course = Mock(id='c1', presentations=[presentation])
+        self.fast.user_courses.return_value = [course]
+        self.fast.withdraw.return_value = True
+        service = CourseService()
+        service.providers = [self.fast]
+        service._get_presentation = Mock(return_value=course)
+        service.get_provider = Mock(return_value=self.fast)
+        signer = Mock()
+        signer.client.resource_owner_key = u'token'
+        service.my_courses(signer)
+        self.assertTrue(service.withdraw('p1', signer))
+        # bookings already cached are used to check the enrolment
+        self.assertEqual(self.fast.user_courses.call_count, 1)
+        service.my_courses(signer)
+        self.assertEqual(self.fast.user_courses.call_count, 2)
+
+
+class ProviderRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.weblearn = WebLearnProvider('https://weblearn.ox.ac.uk/')
+        self.other = Mock(spec=['handles'])
+        self.other.handles.side_effect = lambda p: 'other' in p.booking_endpoint
+        self.service = CourseService()
+        self.service.providers = [self.weblearn, self.other]
+        self.service._build_routes()
+        course = Course('c1')
+        self.presentations = [
+            Presentation('p1', course, booking_endpoint='https://weblearn.ox.ac.uk/course/1'),
+            Presentation('p2', course, booking_endpoint='https://other.ox.ac.uk/course/2'),
+            Presentation('p3', course, booking_endpoint='https://other.ox.ac.uk/course/2'),
+            Presentation('p4', course, booking_endpoint='https://unknown.ox.ac.uk/course/4'),
+            Presentation('p5', course),
+        ]
+
+    def test_get_provider(self):
+        self.assertTrue(self.service.get_provider(self.presentations[0]) is self.weblearn)
+        self.assertFalse(self.other.handles.called)
+        self.assertTrue(self.service.get_provider(self.presentations[1]) is self.other)
+        self.assertRaises(ProviderException, self.service.get_provider, self.presentations[3])
+        self.assertRaises(ProviderException, self.service.get_provider, self.presentations[4])
+
+    def test_bookable(self):
+        self.assertEqual(self.service.bookable(self.presentations), set(['p1', 'p2', 'p3']))
+        # once per booking endpoint not routed by hostname
+        self.assertEqual(self.other.handles.call_count, 3)
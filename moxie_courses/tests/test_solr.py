@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime
+
+from moxie_courses.domain import Course
+from moxie_courses.representations import CourseRepresentation
+from moxie_courses.solr import (compile_decoder, presentations_to_course_object,
+        presentation_to_presentation_object, presentations_to_lazy_course,
+        course_document_to_course)
+
+
+class SolrMapperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.document = {
+            'course_identifier': 'daisy-course-1',
+            'course_title': "Monograph Publishing Workshop",
+            'course_description': "Description",
+            'provider_title': "Humanities Division",
+            'course_subject': ["Research Methods"],
+            'presentation_identifier': 'daisy-presentation-1',
+            'presentation_start': '2012-06-15T00:00:00Z',
+            'presentation_applyUntil': '2012-06-01T10:30:00Z',
+            'presentation_bookingEndpoint': 'https://weblearn.ox.ac.uk/course-signup/rest/course/1',
+            'presentation_venue_identifier': 'oxpoints:ABCD',
+        }
+
+    def test_presentation_to_presentation_object(self):
+        course = presentation_to_presentation_object(self.document)
+        self.assertEqual(course.id, 'daisy-course-1')
+        self.assertEqual(course.title, "Monograph Publishing Workshop")
+        self.assertEqual(course.provider, "Humanities Division")
+        self.assertEqual(course.subjects, ["Research Methods"])
+        presentation = course.presentations[0]
+        self.assertEqual(presentation.id, 'daisy-presentation-1')
+        self.assertTrue(presentation.course is course)
+        self.assertEqual(presentation.start, datetime(2012, 6, 15))
+        self.assertEqual(presentation.apply_until, datetime(2012, 6, 1, 10, 30))
+        self.assertEqual(presentation.end, None)
+        self.assertEqual(presentation.location, 'oxpoints:ABCD')
+        self.assertEqual(presentation.apply_link, "")
+
+    def test_missing_subjects(self):
+        del self.document['course_subject']
+        self.assertEqual(presentation_to_presentation_object(self.document).subjects, [])
+        self.assertEqual(presentations_to_course_object([self.document]).subjects, [])
+
+    def test_presentations_to_course_object(self):
+        second = dict(self.document, presentation_identifier='daisy-presentation-2')
+        course = presentations_to_course_object([self.document, second])
+        self.assertEqual([p.id for p in course.presentations],
+                         ['daisy-presentation-1', 'daisy-presentation-2'])
+
+    def test_compile_decoder(self):
+        decode = compile_decoder([('course_title', 'title', None),
+                                  ('course_description', 'description', len)])
+        course = decode({'course_description': 'abc'}, Course('c'))
+        self.assertEqual(course.title, "")
+        self.assertEqual(course.description, 3)
+
+    def test_lazy_course(self):
+        second = dict(self.document, presentation_identifier='daisy-presentation-2',
+                      presentation_start='2012-06-15T09:30:00.250Z')
+        del second['course_subject']
+        course = presentations_to_lazy_course([self.document, second])
+        eager = presentations_to_course_object([self.document, second])
+        self.assertEqual(CourseRepresentation(course).as_dict(),
+                         CourseRepresentation(eager).as_dict())
+        # dates are formatted without being decoded
+        self.assertFalse('start' in course.presentations[0].__dict__)
+        self.assertEqual(course.presentations[0].start, datetime(2012, 6, 15))
+        self.assertEqual(course.presentations[1].end, None)
+        self.assertFalse(course.presentations[0].bookable)
+
+    def test_lazy_course_missing_fields(self):
+        course = presentations_to_lazy_course([{'course_identifier': 'c',
+                                                'presentation_identifier': 'p'}])
+        self.assertEqual(course.subjects, [])
+        self.assertEqual(course.title, "")
+        self.assertEqual(course.presentations[0].location, "")
+        self.assertEqual(course.presentations[0].isoformat('start'), None)
+        self.assertRaises(AttributeError, getattr, course, 'unknown')
+
+    def test_course_document_to_course(self):
+        document = {
+            'doc_type': 'course', 'presentation_identifier': 'course:daisy-course-1',
+            'course_identifier': 'daisy-course-1', 'course_title': "Monograph Publishing Workshop",
+            'course_subject': ["Research Methods"], 'course_presentations_undated': 1,
+            'course_starts': ['2012-03-01T00:00:00Z', '2012-06-15T00:00:00Z']}
+        course = course_document_to_course(document, now='2012-04-01T00:00:00Z')
+        self.assertEqual(course.id, 'daisy-course-1')
+        self.assertEqual(course.presentations, [])
+        representation = CourseRepresentation(course).as_dict()
+        self.assertEqual(representation['title'], "Monograph Publishing Workshop")
+        self.assertEqual(representation['next_start'], '2012-06-15T00:00:00')
+        self.assertEqual(representation['future_presentations'], 2)
+        self.assertFalse('next_start' in CourseRepresentation(Course('c')).as_dict())
+        # computed against the current time, not frozen at import time
+        course = course_document_to_course(document, now='2012-07-01T00:00:00Z')
+        self.assertEqual(course.next_start, None)
+        self.assertEqual(course.future_presentations, 1)
@@ -0,0 +1,116 @@
+import json
+import unittest
+
+from mock import patch
+from moxie.core.exceptions import ApplicationException
+from moxie.core.search import SearchService, SearchResponse
+
+from moxie_courses.benchmarks.hal import create_app
+from moxie_courses.generation import bump_generation
+from moxie_courses.representations import COURSE_RESPONSE_FIELDS
+from moxie_courses.views import requested_fields
+from moxie_courses.tests.test_services import DictCache
+
+
+COURSE = {'doc_type': 'course', 'presentation_identifier': 'course:c1',
+          'course_identifier': 'c1', 'course_title': "Course",
+          'course_starts': ['2099-06-15T00:00:00Z']}
+
+
+class ConditionalRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app, self.service = create_app()
+        patcher = patch('moxie_courses.generation.cache', DictCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('moxie_courses.services.searcher', spec=SearchService)
+        self.searcher = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.searcher.search.return_value = SearchResponse(
+            {'response': {'numFound': 1}}, None, [COURSE])
+        patcher = patch('moxie_courses.views.CourseService.from_context',
+                        return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = self.app.test_client()
+
+    def test_not_modified(self):
+        response = self.client.get('/courses/search?q=history')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(response.headers['Last-Modified'])
+        response = self.client.get('/courses/search?q=history',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        # answered without querying Solr
+        self.assertEqual(self.searcher.search.call_count, 1)
+
+    def test_parameters(self):
+        etag = self.client.get('/courses/search?q=history').headers['ETag']
+        response = self.client.get('/courses/search?q=maths',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_import(self):
+        response = self.client.get('/courses/search?q=history')
+        bump_generation()
+        response = self.client.get('/courses/search?q=history',
+                                   headers={'If-None-Match': response.headers['ETag'],
+                                            'If-Modified-Since': response.headers['Last-Modified']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_since(self):
+        last_modified = self.client.get('/courses/search?q=history').headers['Last-Modified']
+        response = self.client.get('/courses/search?q=history',
+                                   headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_search_parameters(self):
+        self.client.get('/courses/search?q=Modern++History&start=-5&count=1000')
+        args, kwargs = self.searcher.search.call_args
+        self.assertEqual(args[0]['q'], 'modern history')
+        self.assertEqual(kwargs, {'start': 0, 'count': 100})
+        self.client.get('/courses/search?q=history&count=many')
+        self.assertEqual(self.searcher.search.call_args[1]['count'], 35)
+
+    def test_fields(self):
+        response = self.client.get('/courses/search?q=history&fields=title,next_start')
+        self.assertEqual(self.searcher.search.call_args[0][0]['fl'],
+                         'course_identifier,course_title,course_starts')
+        course = json.loads(response.data)['_embedded']['courses'][0]
+        self.assertEqual(sorted(course), ['_links', 'id', 'next_start', 'title'])
+        self.assertEqual(json.loads(response.data)['_links']['self']['href'],
+                         '/courses/search?q=history&fields=next_start%2Ctitle')
+
+    def test_unknown_fields(self):
+        with self.app.test_request_context('/courses/search?fields=title,password'):
+            self.assertRaises(ApplicationException, requested_fields, COURSE_RESPONSE_FIELDS)
+        with self.app.test_request_context('/courses/search?fields='):
+            self.assertEqual(requested_fields(COURSE_RESPONSE_FIELDS), None)
+
+    def test_export(self):
+        self.searcher.search.return_value = SearchResponse(
+            {'nextCursorMark': '*'}, None, [COURSE])
+        response = self.client.get('/courses/export')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual([line.get('id') for line in lines], ['c1', None])
+        self.assertEqual(lines[-1], {'complete': True, 'count': 1})
+
+    def test_subjects_after_import(self):
+        self.searcher.search.return_value = SearchResponse(
+            {'facet_counts': {'facet_fields': {'course_subject': ['History', 2]}}}, None, [])
+        response = self.client.get('/courses/subjects')
+        self.assertEqual(response.status_code, 200)
+        bump_generation()
+        self.searcher.search.return_value = SearchResponse(
+            {'facet_counts': {'facet_fields': {'course_subject': ['History', 3]}}}, None, [])
+        response = self.client.get('/courses/subjects',
+                                   headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+        subjects = json.loads(response.data)['_links']['courses:subject']
+        self.assertEqual(subjects[0]['count'], 3)
@@ -1,26 +1,85 @@
 import logging
+from itertools import chain
 
-from flask import request
+from flask import request, current_app, make_response, stream_with_context
 
 from moxie.core.views import ServiceView, accepts
 from moxie.oauth.services import OAuth1Service
-from moxie.core.cache import cache
 from moxie.core.representations import JSON, HAL_JSON
 from moxie.core.exceptions import ApplicationException, NotFound
 from .representations import (HALSubjectsRepresentation,
                               HALCoursesRepresentation,
-                              HALCourseRepresentation)
+                              HALCourseRepresentation,
+                              HALBookingsRepresentation,
+                              COURSE_RESPONSE_FIELDS,
+                              PRESENTATION_RESPONSE_FIELDS,
+                              NDJSON, course_lines)
+from .queries import normalise_search
 from .services import CourseService
 
 logger = logging.getLogger(__name__)
 
 
-class ListAllSubjects(ServiceView):
+def not_modified(etag, last_modified):
+    """Whether the client already has the response (conditional GET),
+    If-Modified-Since is ignored when If-None-Match is given
+    :param etag: ETag of the response
+    :param last_modified: Last-Modified of the response (datetime)
+    """
+    if request.if_none_match:
+        return etag in request.if_none_match
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def requested_fields(available):
+    """Fields requested with the `fields` parameter (sparse fieldsets),
+    e.g. ?fields=title,next_start
+    :param available: names of fields that can be requested
+    :return set of names, None if all fields are requested
+    :raise ApplicationException: if a field is unknown
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = frozenset(name.strip() for name in value.split(',') if name.strip())
+    unknown = fields - available
+    if unknown:
+        raise ApplicationException(message="Unknown fields: {0}".format(
+            ', '.join(sorted(unknown))), status_code=400)
+    return fields
+
+
+class ConditionalServiceView(ServiceView):
+    """View of data derived from the index sending an ETag and
+    Last-Modified (see CourseService.validators), conditional requests are
+    answered with 304 before querying the index
+    """
+
+    def dispatch_request(self, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super(ConditionalServiceView, self).dispatch_request(*args, **kwargs)
+        service = CourseService.from_context()
+        etag, last_modified = service.validators(request.url_rule.endpoint,
+            sorted(kwargs.items()), sorted(request.args.items(multi=True)))
+        if not_modified(etag, last_modified):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(
+                super(ConditionalServiceView, self).dispatch_request(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+
+class ListAllSubjects(ConditionalServiceView):
     """List all courses subjects
     """
     methods = ['GET', 'OPTIONS']
 
-    @cache.cached(timeout=600)
     def handle_request(self):
         courses = CourseService.from_context()
         return courses.list_courses_subjects()
@@ -31,31 +90,37 @@ class ListAllSubjects(ServiceView):
                 request.url_rule.endpoint).as_json()
 
 
-class SearchCourses(ServiceView):
+class SearchCourses(ConditionalServiceView):
     """Search for courses by full-text search
     """
     methods = ['GET', 'OPTIONS']
 
     def handle_request(self):
-        self.query = request.args.get('q', '')
-        self.start = request.args.get('start', 0)
-        self.count = request.args.get('count', 35)
         service = CourseService.from_context()
-        courses, self.size = service.search_courses(self.query, self.start, self.count)
+        self.query = normalise_search(request.args.get('q', ''))
+        self.start = max(request.args.get('start', 0, type=int), 0)
+        self.count = min(max(request.args.get('count', 35, type=int), 1),
+                         service.search_max_count)
+        self.fields = requested_fields(COURSE_RESPONSE_FIELDS)
+        courses, self.size = service.search_courses(self.query, self.start, self.count,
+                                                    fields=self.fields)
         return courses
 
     @accepts(HAL_JSON, JSON)
     def as_hal_json(self, response):
         return HALCoursesRepresentation(response, self.start, self.count, self.size,
-            request.url_rule.endpoint, query=self.query).as_json()
+            request.url_rule.endpoint, query=self.query, fields=self.fields).as_json()
 
 
-class CourseDetails(ServiceView):
+class CourseDetails(ConditionalServiceView):
     """Details of a course
     """
     methods = ['GET', 'OPTIONS']
 
     def handle_request(self, id):
+        # presentations of courses are cached whole, fields only
+        # restrict the representation
+        self.fields = requested_fields(COURSE_RESPONSE_FIELDS | PRESENTATION_RESPONSE_FIELDS)
         service = CourseService.from_context()
         course = service.list_presentations_for_course(id)
         if course:
@@ -65,8 +130,20 @@ class CourseDetails(ServiceView):
 
     @accepts(HAL_JSON, JSON)
     def as_hal_json(self, response):
-        return HALCourseRepresentation(response,
-                request.url_rule.endpoint).as_json()
+        return HALCourseRepresentation(response, request.url_rule.endpoint,
+                                       fields=self.fields).as_json()
+
+
+def export_catalog():
+    """All courses with all their presentations as newline-delimited JSON,
+    streamed while paging through Solr
+    """
+    service = CourseService.from_context()
+    lines = course_lines(service.export_courses())
+    # errors of the search server before anything is sent are reported
+    first = next(lines, '')
+    return current_app.response_class(stream_with_context(chain([first], lines)),
+                                      mimetype=NDJSON)
 
 
 class PresentationBooking(ServiceView):
@@ -127,7 +204,5 @@ class Bookings(ServiceView):
 
     @accepts(HAL_JSON, JSON)
     def as_hal_json(self, response):
-        count = len(response)
-        return HALCoursesRepresentation(response,
-                                        0, count, count,
-                                        request.url_rule.endpoint).as_json()
\ No newline at end of file
+        return HALBookingsRepresentation(response,
+                                         request.url_rule.endpoint).as_json()
\ No newline at end of file
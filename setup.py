@@ -14,4 +14,10 @@ setup(name='moxie-courses',
         setup_requires=["setuptools"],
         install_requires=install_requires,
         test_suite="moxie_courses.tests",
+        entry_points={
+            'console_scripts': [
+                'reindex-from-snapshot = moxie_courses.importers.xcri_ox:reindex_from_snapshot',
+                'export-catalog = moxie_courses.importers.xcri_ox:export_catalog',
+            ],
+        },
 )